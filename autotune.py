@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+import cv2
+import numpy as np
+from config_manager import config_manager
+from inference import letterbox, parse_yolo_result, load_model, box_iou, top_detection, load_sample_crops
+from speed_camera import find_motion
+
+def grab_frames(rtsp_url, count=20, area=None, timeout=15.0):
+    """Consecutive frames straight from the stream, cropped to the detection area"""
+    cap = cv2.VideoCapture(rtsp_url, cv2.CAP_FFMPEG)
+    frames = []
+    deadline = time.time() + timeout
+    try:
+        while len(frames) < count and time.time() < deadline:
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                continue
+            if area:
+                left, top, right, bottom = area
+                frame = frame[top:bottom, left:right]
+            frames.append(frame.copy())
+    finally:
+        cap.release()
+    return frames
+
+def config_detection_area(config=None):
+    config = config or config_manager
+    return (config.get('detection_zones.detection_area_left', 100),
+            config.get('detection_zones.detection_area_top', 300),
+            config.get('detection_zones.detection_area_right', 1820),
+            config.get('detection_zones.detection_area_bottom', 590))
+
+def blob_recall(reference, boxes, iou_threshold=0.3):
+    """Fraction of reference (full resolution) blobs that a downscaled run also found"""
+    if not reference:
+        return 1.0
+    if not boxes:
+        return 0.0
+    to_xyxy = lambda b: [b[0], b[1], b[0] + b[2], b[1] + b[3]]
+    iou = box_iou([to_xyxy(b) for b in reference], [to_xyxy(b) for b in boxes])
+    return float((iou.max(axis=1) >= iou_threshold).mean())
+
+class AutoTuner:
+    """Fits model, backend, motion downscale and analysis rate to a latency and CPU budget.
+    
+    Every candidate is measured on the same recent frames: motion detection per
+    downscale factor, and classification per model/backend on vehicle crops cut
+    from those frames. Accuracy is estimated against the most accurate
+    candidate - label agreement with the largest model and blob recall against
+    full-resolution motion - and the most accurate combination whose per-frame
+    latency and CPU use fit the budget is chosen.
+    """
+    
+    def __init__(self, config=None):
+        self.config = config or config_manager
+        self.lock = threading.Lock()
+        self.running = False
+        self.last_report = None
+    
+    def settings(self):
+        return {
+            'models': self.config.get('autotune.models', ['yolov8n.pt', 'yolov8s.pt', 'yolov8m.pt']),
+            'backends': self.config.get('autotune.backends', ['pytorch', 'openvino']),
+            'motion_downscales': self.config.get('autotune.motion_downscales', [1, 2, 3]),
+            'analysis_fps': self.config.get('autotune.analysis_fps', [25, 15, 10]),
+            'target_frame_ms': self.config.get('autotune.target_frame_ms', 40),
+            'cpu_budget_cores': self.config.get('autotune.cpu_budget_cores', 2.0),
+            'vehicles_per_second': self.config.get('autotune.vehicles_per_second', 0.5),
+            'crops': self.config.get('autotune.crops', 16),
+            'repeats': self.config.get('autotune.repeats', 2)
+        }
+    
+    def benchmark_motion(self, frames, downscale, blur_size, min_area, repeats=2):
+        """Wall and CPU milliseconds per frame, and the blobs found in each frame"""
+        blobs = []
+        wall, cpu = 0.0, 0.0
+        for _ in range(repeats):
+            bg_subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=True)
+            blobs = []
+            start, start_cpu = time.perf_counter(), time.process_time()
+            for frame in frames:
+                blobs.append(find_motion(bg_subtractor, frame, blur_size, min_area, downscale))
+            wall += time.perf_counter() - start
+            cpu += time.process_time() - start_cpu
+        count = len(frames) * repeats
+        return wall * 1000 / count, cpu * 1000 / count, blobs
+    
+    def benchmark_model(self, model_path, backend, images, imgsz, int8, device, confidence_threshold, repeats=2):
+        """Load time, wall and CPU milliseconds per crop, and the top label of each crop"""
+        start = time.time()
+        model = load_model(model_path, backend, imgsz, int8)
+        model(images[0], imgsz=imgsz, device=device, verbose=False)
+        load_seconds = time.time() - start
+        
+        outputs = []
+        start, start_cpu = time.perf_counter(), time.process_time()
+        for _ in range(repeats):
+            outputs = [parse_yolo_result(model(image, imgsz=imgsz, device=device, verbose=False)[0],
+                                         model.names, confidence_threshold) for image in images]
+        count = len(images) * repeats
+        wall_ms = (time.perf_counter() - start) * 1000 / count
+        cpu_ms = (time.process_time() - start_cpu) * 1000 / count
+        
+        labels = [(top_detection(detections) or (None,))[0] for detections in outputs]
+        return load_seconds, wall_ms, cpu_ms, labels
+    
+    def sample_crops(self, frames, blobs, count):
+        """The largest moving blobs in the frames, topped up with saved detections"""
+        candidates = []
+        for frame, boxes in zip(frames, blobs):
+            for x, y, w, h in boxes:
+                if w >= 32 and h >= 32:
+                    candidates.append((w * h, frame[y:y + h, x:x + w]))
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        crops = [crop for _, crop in candidates[:count]]
+        if len(crops) < count:
+            crops += load_sample_crops(count - len(crops))
+        return crops
+    
+    def run(self, frames, report_file=None):
+        """Benchmark every candidate on frames and return the report"""
+        with self.lock:
+            if self.running:
+                raise RuntimeError("Auto-tune already running")
+            self.running = True
+        
+        try:
+            return self.measure(frames, report_file)
+        finally:
+            self.running = False
+    
+    def measure(self, frames, report_file=None):
+        if len(frames) < 2:
+            raise ValueError("Auto-tune needs at least two frames")
+        
+        settings = self.settings()
+        blur_size = self.config.get('detection_settings.blur_size', 10)
+        min_area = self.config.get('detection_settings.min_area', 500)
+        imgsz = self.config.get('detection_settings.batch_imgsz', 320)
+        int8 = self.config.get('detection_settings.inference_int8', False)
+        confidence_threshold = self.config.get('detection_settings.confidence_threshold', 0.5)
+        device = 'cpu'
+        if self.config.get('detection_settings.use_gpu', True):
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    device = 'cuda'
+            except ImportError:
+                pass
+        
+        print(f"🎛️ Auto-tune: {len(frames)} frames {frames[0].shape[1]}x{frames[0].shape[0]} on {device}")
+        
+        # Motion detection per downscale factor, recall measured against full resolution
+        motion = []
+        reference_blobs = self.benchmark_motion(frames, 1, blur_size, min_area, 1)[2]
+        for downscale in settings['motion_downscales']:
+            wall_ms, cpu_ms, blobs = self.benchmark_motion(frames, int(downscale), blur_size, min_area,
+                                                           settings['repeats'])
+            recall = np.mean([blob_recall(ref, found) for ref, found in zip(reference_blobs, blobs)])
+            motion.append({
+                'downscale': int(downscale),
+                'frame_ms': round(wall_ms, 2),
+                'cpu_ms': round(cpu_ms, 2),
+                'blobs_per_frame': round(sum(len(b) for b in blobs) / len(blobs), 2),
+                'recall': round(float(recall), 3)
+            })
+            print(f"   motion x{downscale}: {wall_ms:.1f} ms/frame | recall {recall * 100:.0f}%")
+        
+        # Classification per model and backend on the same crops
+        crops = self.sample_crops(frames, reference_blobs, settings['crops'])
+        images = [letterbox(crop, imgsz) for crop in crops]
+        models = []
+        for model_index, model_name in enumerate(settings['models']):
+            model_path = os.path.join('models', model_name)
+            for backend_index, backend in enumerate(settings['backends']):
+                entry = {'model': model_name, 'backend': backend, 'rank': (model_index, -backend_index)}
+                models.append(entry)
+                if not os.path.exists(model_path):
+                    entry['error'] = 'model file not found'
+                    continue
+                if device != 'cpu' and backend != 'pytorch':
+                    entry['error'] = 'CPU backend skipped on GPU'
+                    continue
+                try:
+                    load_seconds, wall_ms, cpu_ms, labels = self.benchmark_model(
+                        model_path, backend, images, imgsz, int8, device, confidence_threshold,
+                        settings['repeats'])
+                except Exception as e:
+                    entry['error'] = str(e)
+                    print(f"   {model_name} ({backend}): ⚠️ {e}")
+                    continue
+                entry.update({'load_seconds': round(load_seconds, 2), 'crop_ms': round(wall_ms, 2),
+                              'cpu_ms': round(cpu_ms, 2), 'labels': labels})
+                print(f"   {model_name} ({backend}): {wall_ms:.1f} ms/crop")
+        
+        measured = [m for m in models if 'labels' in m]
+        if measured:
+            reference = max(measured, key=lambda m: m['rank'])['labels']
+            for entry in measured:
+                labels = entry.pop('labels')
+                entry['agreement'] = round(sum(a == b for a, b in zip(labels, reference)) / len(reference), 3)
+        for entry in models:
+            entry.pop('rank')
+            entry.pop('labels', None)
+        
+        combinations = self.combine(motion, measured, settings)
+        feasible = [c for c in combinations if c['feasible']]
+        choice = max(feasible, key=lambda c: (c['accuracy'], c['analysis_fps'], -c['cpu_cores']), default=None)
+        
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'device': device,
+            'frames': len(frames),
+            'frame_size': [int(frames[0].shape[1]), int(frames[0].shape[0])],
+            'crops': len(crops),
+            'cpu_count': os.cpu_count(),
+            'budget': {k: settings[k] for k in ('target_frame_ms', 'cpu_budget_cores', 'vehicles_per_second')},
+            'motion': motion,
+            'models': models,
+            'combinations': combinations,
+            'choice': choice
+        }
+        
+        if choice:
+            print(f"✅ Auto-tune choice: {choice['model']} ({choice['backend']}) | motion x{choice['motion_downscale']} | "
+                  f"{choice['analysis_fps']} fps | {choice['frame_ms']:.1f} ms/frame | {choice['cpu_cores']:.2f} cores")
+        else:
+            print("⚠️ Auto-tune: no configuration fits the latency and CPU budget")
+        
+        report_file = report_file or self.config.get('autotune.report_file', 'autotune_report.json')
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Auto-tune report written to {report_file}")
+        
+        self.last_report = report
+        return report
+    
+    def combine(self, motion, models, settings):
+        """Every motion/model/rate combination with its cost, accuracy and whether it fits the budget"""
+        combinations = []
+        for m in motion:
+            for model in models:
+                for fps in settings['analysis_fps']:
+                    # CPU seconds spent per wall second: motion on every analysed frame plus one crop per vehicle
+                    cpu_cores = (fps * m['cpu_ms'] + settings['vehicles_per_second'] * model['cpu_ms']) / 1000
+                    frame_budget_ms = min(settings['target_frame_ms'], 1000 / fps)
+                    combinations.append({
+                        'model': model['model'],
+                        'backend': model['backend'],
+                        'motion_downscale': m['downscale'],
+                        'analysis_fps': fps,
+                        'frame_ms': m['frame_ms'],
+                        'crop_ms': model['crop_ms'],
+                        'cpu_cores': round(cpu_cores, 3),
+                        'accuracy': round(model['agreement'] * m['recall'], 3),
+                        'feasible': m['frame_ms'] <= frame_budget_ms and cpu_cores <= settings['cpu_budget_cores']
+                    })
+        return combinations
+    
+    def apply(self, choice):
+        """Write the chosen settings to config.json (model and backend take effect on restart)"""
+        self.config.update_section('detection_settings', {
+            'yolo_model': choice['model'],
+            'inference_backend': choice['backend'],
+            'motion_downscale': choice['motion_downscale'],
+            'analysis_fps': choice['analysis_fps']
+        })
+        return self.config.save_config()
+    
+    def get_status(self):
+        report = self.last_report
+        if report is None:
+            report_file = self.config.get('autotune.report_file', 'autotune_report.json')
+            if os.path.exists(report_file):
+                with open(report_file) as f:
+                    report = json.load(f)
+        return {'running': self.running, 'report': report}
+
+# Global auto-tuner instance
+autotuner = AutoTuner()
+
+def tune_from_stream(apply=None, count=None):
+    """Calibrate on frames read from the first RTSP stream (used at startup, before the camera runs)"""
+    rtsp_urls = config_manager.get('camera_settings.rtsp_urls', [])
+    if not rtsp_urls:
+        print("❌ Auto-tune: no RTSP URLs configured")
+        return None
+    
+    frames = grab_frames(rtsp_urls[0], count or config_manager.get('autotune.frames', 20), config_detection_area())
+    if len(frames) < 2:
+        print("❌ Auto-tune: could not read frames from the stream")
+        return None
+    
+    report = autotuner.run(frames)
+    if report['choice'] and (config_manager.get('autotune.apply', True) if apply is None else apply):
+        autotuner.apply(report['choice'])
+        print("💾 Auto-tune settings saved to config.json")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark candidate settings and pick the most accurate one within budget")
+    parser.add_argument('--frames', type=int, default=config_manager.get('autotune.frames', 20))
+    parser.add_argument('--apply', action='store_true', help="write the chosen settings to config.json")
+    args = parser.parse_args()
+    
+    tune_from_stream(args.apply, args.frames)
+
+if __name__ == "__main__":
+    main()
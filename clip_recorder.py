@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+import os
+import math
+import time
+import queue
+import shutil
+import tempfile
+import threading
+import subprocess
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from config_manager import config_manager
+from detection_output import image_relpath
+
+@dataclass
+class ClipJob:
+    """One clip to cut from the ring once its post-roll has been recorded"""
+    output_dir: str
+    filename: str
+    event_time: float
+    pre_seconds: float
+    post_seconds: float
+    on_done: Optional[Callable[[bool], None]] = None
+    submitted: float = field(default_factory=time.time)
+    
+    @property
+    def path(self):
+        return os.path.join(self.output_dir, image_relpath(self.filename))
+
+class ClipRecorder:
+    """Pre/post-roll video clips of detections, cut from a ring of encoded segments.
+    
+    An ffmpeg process reads the camera stream on its own connection and writes
+    it in clip_recorder.segment_seconds MPEG-TS segments to a ring of files
+    that wraps after ring_seconds (in /dev/shm when available), so memory and
+    disk use stay bounded. In 'copy' mode the camera's H.264 packets are
+    remuxed without decoding; 'reencode' stores a small low-bitrate H.264 copy
+    for streams that can't be copied. A clip is the segments around the
+    detection joined into an MP4, again without re-encoding, on a background
+    thread once the post-roll has been recorded. Clips start and end on segment
+    boundaries, so they are up to one segment longer than asked for.
+    """
+    
+    def __init__(self, source, config=None):
+        self.source = source
+        self.config = config or config_manager
+        self.lock = threading.Lock()
+        self.running = False
+        self.process = None
+        self.ffmpeg = None
+        self.ring_dir = None
+        self.queue = queue.Queue(maxsize=self.setting('queue_size', 16))
+        self.threads = []
+        self.stats = {
+            'requested': 0,
+            'written': 0,
+            'failed': 0,
+            'dropped': 0,
+            'restarts': 0,
+            'total_bytes': 0,
+            'total_write_ms': 0.0
+        }
+    
+    def setting(self, name, default):
+        return self.config.get(f'clip_recorder.{name}', default)
+    
+    @property
+    def enabled(self):
+        return self.setting('enabled', False)
+    
+    def start(self):
+        if not self.enabled or self.running:
+            return
+        self.ffmpeg = shutil.which('ffmpeg')
+        if self.ffmpeg is None:
+            print("⚠️ Clip recorder disabled: ffmpeg not found")
+            return
+        
+        base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        self.ring_dir = self.setting('ring_dir', '') or os.path.join(base, 'speed_camera_clips')
+        os.makedirs(self.ring_dir, exist_ok=True)
+        self.running = True
+        self.threads = [threading.Thread(target=self.record_loop, daemon=True, name='clip-ring'),
+                        threading.Thread(target=self.worker_loop, daemon=True, name='clip-writer')]
+        for thread in self.threads:
+            thread.start()
+        print(f"🎞️ Clip recorder started ({self.setting('mode', 'copy')}, ring in {self.ring_dir})")
+    
+    def segment_count(self):
+        """Files in the ring: enough for ring_seconds and always for one clip plus the segments being cut"""
+        segment_seconds = self.setting('segment_seconds', 2)
+        clip_seconds = self.setting('pre_seconds', 5) + self.setting('post_seconds', 5)
+        return max(math.ceil(self.setting('ring_seconds', 30) / segment_seconds),
+                   math.ceil(clip_seconds / segment_seconds) + 4)
+    
+    def ffmpeg_command(self):
+        segment_seconds = self.setting('segment_seconds', 2)
+        command = [self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin']
+        if str(self.source).startswith('rtsp://'):
+            command += ['-rtsp_transport', 'tcp']
+        command += ['-i', str(self.source), '-map', '0:v:0', '-an']
+        
+        if self.setting('mode', 'copy') == 'reencode':
+            # Small, cheap copy with a keyframe at every segment boundary
+            command += ['-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency',
+                        '-crf', str(self.setting('reencode_crf', 30)),
+                        '-vf', f"scale=-2:{self.setting('reencode_height', 480)}",
+                        '-force_key_frames', f"expr:gte(t,n_forced*{segment_seconds})"]
+        else:
+            # The camera's own packets; segments can only split on its keyframes
+            command += ['-c:v', 'copy']
+        
+        command += ['-f', 'segment', '-segment_time', str(segment_seconds),
+                    '-segment_wrap', str(self.segment_count()), '-segment_format', 'mpegts',
+                    '-reset_timestamps', '1', os.path.join(self.ring_dir, 'segment%03d.ts')]
+        return command
+    
+    def clear_ring(self):
+        for entry in os.scandir(self.ring_dir):
+            if entry.name.startswith('segment') and entry.name.endswith('.ts'):
+                os.remove(entry.path)
+    
+    def record_loop(self):
+        backoff = 1.0
+        while self.running:
+            # Segment times come from file times, so each run starts on an empty ring
+            self.clear_ring()
+            started = time.time()
+            try:
+                with self.lock:
+                    self.process = subprocess.Popen(self.ffmpeg_command(), stdin=subprocess.DEVNULL,
+                                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                _, stderr = self.process.communicate()
+                error = stderr.decode(errors='replace').strip().splitlines()[-1:] if stderr else []
+            except Exception as e:
+                error = [str(e)]
+            
+            if not self.running:
+                break
+            with self.lock:
+                self.stats['restarts'] += 1
+            backoff = 1.0 if time.time() - started > 60 else min(backoff * 2, 30)
+            print(f"⚠️ Clip recorder stream ended{': ' + error[0] if error else ''} (restarting in {backoff:.0f}s)")
+            time.sleep(backoff)
+    
+    def segments(self):
+        """(start, end, path) of the finished segments in the ring, oldest first"""
+        entries = []
+        for entry in os.scandir(self.ring_dir):
+            if entry.name.startswith('segment') and entry.name.endswith('.ts'):
+                entries.append((entry.stat().st_mtime, entry.path))
+        entries.sort()
+        entries = entries[:-1]  # the newest one is still being written
+        
+        segments = []
+        previous_end = None
+        for end, path in entries:
+            start = previous_end if previous_end is not None else end - self.setting('segment_seconds', 2)
+            segments.append((start, end, path))
+            previous_end = end
+        return segments
+    
+    def request(self, output_dir, filename, event_time=None, on_done=None):
+        """Queue a clip of the time around event_time; returns False (after calling on_done) if none will be written"""
+        job = ClipJob(output_dir, filename, event_time or time.time(),
+                      self.setting('pre_seconds', 5), self.setting('post_seconds', 5), on_done)
+        if not self.running:
+            self.finish(job, False)
+            return False
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                self.stats['dropped'] += 1
+            print(f"⚠️ Clip queue full, skipping clip {filename}")
+            self.finish(job, False)
+            return False
+        with self.lock:
+            self.stats['requested'] += 1
+        return True
+    
+    def worker_loop(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            
+            # Wait until the segment holding the end of the post-roll is finished
+            end = job.event_time + job.post_seconds
+            deadline = end + 3 * self.setting('segment_seconds', 2) + 10
+            while self.running and time.time() < deadline:
+                segments = self.segments()
+                if segments and segments[-1][1] >= end:
+                    break
+                time.sleep(0.5)
+            
+            success = False
+            started = time.time()
+            try:
+                success = self.write_clip(job)
+            except Exception as e:
+                print(f"❌ Error writing clip {job.filename}: {e}")
+            
+            with self.lock:
+                self.stats['written' if success else 'failed'] += 1
+                self.stats['total_write_ms'] += (time.time() - started) * 1000
+                if success:
+                    self.stats['total_bytes'] += os.path.getsize(job.path)
+            self.finish(job, success)
+    
+    def finish(self, job, success):
+        if job.on_done is None:
+            return
+        try:
+            job.on_done(success)
+        except Exception as e:
+            print(f"⚠️ Clip recorder callback error: {e}")
+    
+    def write_clip(self, job):
+        start, end = job.event_time - job.pre_seconds, job.event_time + job.post_seconds
+        segments = [path for segment_start, segment_end, path in self.segments()
+                    if segment_end > start and segment_start < end]
+        if not segments:
+            print(f"⚠️ No recorded video for clip {job.filename}")
+            return False
+        
+        # Copied out first: the ring keeps overwriting its oldest files while ffmpeg joins them
+        with tempfile.TemporaryDirectory(dir=self.ring_dir) as work_dir:
+            parts = []
+            for i, path in enumerate(segments):
+                part = os.path.join(work_dir, f"part{i:03d}.ts")
+                shutil.copyfile(path, part)
+                parts.append(part)
+            list_path = os.path.join(work_dir, 'parts.txt')
+            with open(list_path, 'w') as f:
+                f.write(''.join(f"file '{part}'\n" for part in parts))
+            
+            os.makedirs(os.path.dirname(job.path), exist_ok=True)
+            tmp_path = f"{job.path}.tmp"
+            result = subprocess.run([self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+                                     '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy',
+                                     '-movflags', '+faststart', '-f', 'mp4', tmp_path],
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=60)
+            if result.returncode != 0:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                print(f"❌ Failed to join clip {job.filename}: {result.stderr.decode(errors='replace').strip()}")
+                return False
+            os.replace(tmp_path, job.path)
+        
+        print(f"🎬 Clip saved: {job.filename} ({len(segments)} segments)")
+        return True
+    
+    def stop(self, timeout=15.0):
+        """Stop recording; queued clips are cut from what the ring already holds until the timeout"""
+        if not self.running:
+            return
+        self.running = False
+        with self.lock:
+            if self.process and self.process.poll() is None:
+                self.process.terminate()
+        deadline = time.time() + timeout
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass  # the writer is stuck; its queued clips are reported below
+        for thread in self.threads:
+            thread.join(max(0.0, deadline - time.time()))
+        self.threads = []
+        
+        # Clips the writer didn't get to are reported as not written
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                with self.lock:
+                    self.stats['dropped'] += 1
+                self.finish(job, False)
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        done = stats['written'] + stats['failed']
+        total_write_ms = stats.pop('total_write_ms')
+        stats['avg_write_ms'] = round(total_write_ms / done, 1) if done else 0.0
+        stats['enabled'] = self.enabled
+        stats['running'] = self.running
+        stats['queue_depth'] = self.queue.qsize()
+        return stats
@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+import os
+import re
+import csv
+import time
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Optional, Tuple
+import cv2
+import numpy as np
+from config_manager import config_manager
+from resource_governor import resource_governor
+from live_counters import live_counters
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+
+def image_subdir(filename):
+    """YYYY/MM/DD directory of a detection image, from the date its name starts with ('' if it has none)"""
+    match = re.match(r'(\d{4})(\d{2})(\d{2})_', filename)
+    return os.path.join(*match.groups()) if match else ''
+
+def image_relpath(filename):
+    """Path of a detection image relative to the output directory"""
+    return os.path.join(image_subdir(filename), filename)
+
+def image_path(output_dir, filename):
+    """Path of a detection image, or of its flat pre-sharding copy if it hasn't been migrated yet"""
+    path = os.path.join(output_dir, image_relpath(filename))
+    if not os.path.exists(path):
+        flat_path = os.path.join(output_dir, filename)
+        if os.path.exists(flat_path):
+            return flat_path
+    return path
+
+@dataclass
+class ImageJob:
+    """One detection image to annotate, encode and store.
+    
+    image is used as-is (no copy): the caller hands over a frame or crop it no
+    longer modifies. on_done(success) runs on the writer thread once the file
+    is durable, or has failed.
+    """
+    output_dir: str
+    filename: str
+    image: np.ndarray
+    box: Tuple[int, int, int, int]
+    speed_text: str
+    info_text: str
+    footer_text: str = ''
+    quality: int = 95
+    on_done: Optional[Callable[[bool], None]] = None
+    submitted: float = field(default_factory=time.time)
+    
+    @property
+    def path(self):
+        return os.path.join(self.output_dir, image_relpath(self.filename))
+
+def annotate_detection(image, box, speed_text, info_text, footer_text=''):
+    """Copy of image with the vehicle box, speed and description drawn on it"""
+    annotated = image.copy()
+    x, y, w, h = box
+    
+    # Vehicle bounding box
+    cv2.rectangle(annotated, (x, y), (x + w, y + h), (0, 255, 0), 3)
+    
+    # Speed text
+    cv2.putText(annotated, speed_text,
+               (x, max(y - 10, 30)), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 3)
+    
+    # Object info
+    cv2.putText(annotated, info_text, (x, min(y + h + 30, annotated.shape[0] - 10)),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    
+    if footer_text:
+        cv2.putText(annotated, footer_text, (10, annotated.shape[0] - 10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+    return annotated
+
+def write_durable(path, data, fsync=True):
+    """Write bytes to a temporary file, fsync it and rename it into place"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        # The rename itself is only durable once the directory entry is flushed
+        dir_fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+# Smaller copies of every detection image, stored as <output_dir>/<kind>/YYYY/MM/DD/<image filename>
+RENDITIONS = ('thumbs', 'previews')
+
+def rendition_path(output_dir, kind, filename):
+    return os.path.join(output_dir, kind, image_relpath(filename))
+
+def rendition_size(kind, config=None):
+    """Longest side in pixels of a rendition"""
+    config = config or config_manager
+    if kind == 'thumbs':
+        return config.get('output_settings.thumbnail_size', 320)
+    return config.get('output_settings.preview_size', 1024)
+
+def encode_rendition(image, size, quality=80):
+    """JPEG bytes of image shrunk so its longest side is at most size"""
+    h, w = image.shape[:2]
+    scale = size / max(h, w)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return encoded.tobytes()
+
+def write_renditions(image, output_dir, filename, config=None, fsync=True):
+    """Store the thumbnail and preview of an (annotated) detection image"""
+    config = config or config_manager
+    quality = config.get('output_settings.rendition_quality', 80)
+    for kind in RENDITIONS:
+        path = rendition_path(output_dir, kind, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_durable(path, encode_rendition(image, rendition_size(kind, config), quality), fsync)
+
+def ensure_rendition(output_dir, kind, filename, config=None):
+    """Path of a rendition, generated from the full image for detections saved before renditions existed"""
+    path = rendition_path(output_dir, kind, filename)
+    if os.path.exists(path):
+        return path
+    image = cv2.imread(image_path(output_dir, filename))
+    if image is None:
+        return None
+    config = config or config_manager
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_durable(path, encode_rendition(image, rendition_size(kind, config),
+                                         config.get('output_settings.rendition_quality', 80)), False)
+    return path
+
+def remove_renditions(output_dir, filename):
+    for kind in RENDITIONS:
+        path = rendition_path(output_dir, kind, filename)
+        if os.path.exists(path):
+            os.remove(path)
+            remove_empty_dirs(os.path.dirname(path), os.path.join(output_dir, kind))
+
+def remove_empty_dirs(path, root):
+    """Remove path and its parents up to (not including) root while they are empty"""
+    root = os.path.abspath(root)
+    path = os.path.abspath(path)
+    while path != root and path.startswith(root + os.sep):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+        path = os.path.dirname(path)
+
+def clip_filename(image_filename):
+    """Name of the video clip recorded with a detection image"""
+    return f"{os.path.splitext(image_filename)[0]}.mp4"
+
+def remove_image(output_dir, filename):
+    """Delete a detection image, its renditions and its clip; returns the image bytes freed (0 if it didn't exist)"""
+    path = image_path(output_dir, filename)
+    if not os.path.isfile(path):
+        return 0
+    size = os.path.getsize(path)
+    clip_path = os.path.join(os.path.dirname(path), clip_filename(filename))
+    if os.path.exists(clip_path):
+        os.remove(clip_path)
+    os.remove(path)
+    remove_empty_dirs(os.path.dirname(path), output_dir)
+    remove_renditions(output_dir, filename)
+    image_index(output_dir).remove(filename)
+    live_counters.add('images', -1)
+    live_counters.add('image_bytes', -size)
+    return size
+
+def migrate_flat_images(output_dir):
+    """Move images (and renditions) saved flat in output_dir into its YYYY/MM/DD directories"""
+    moved = 0
+    for root in [output_dir] + [os.path.join(output_dir, kind) for kind in RENDITIONS]:
+        if not os.path.isdir(root):
+            continue
+        for entry in os.scandir(root):
+            if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            subdir = image_subdir(entry.name)
+            if not subdir:
+                continue  # No date in the name: it stays where it is
+            os.makedirs(os.path.join(root, subdir), exist_ok=True)
+            os.replace(entry.path, os.path.join(root, subdir, entry.name))
+            moved += root == output_dir
+    if moved:
+        print(f"📂 Moved {moved} detection images into {output_dir}/YYYY/MM/DD")
+    return moved
+
+class ImageIndex:
+    """In-memory list of the detection images in an output directory, oldest first.
+    
+    Built by one directory walk (migrating flat images first); after that the
+    image writer and remove_image() keep it current, so listing, paging and
+    sizing never touch the disk. Changes made while a walk is running are
+    replayed on top of it.
+    """
+    
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.entries = None  # filename -> (size, mtime), in mtime order
+        self.total_bytes = 0
+        self.building = False
+        self.changes = []
+    
+    def build(self, rescan=False):
+        """Walk the folder (once, unless rescan: then again, to pick up changes made behind its back)"""
+        with self.build_lock:
+            if self.entries is not None and not rescan:
+                return
+            started = time.time()
+            with self.lock:
+                self.building = True
+            migrate_flat_images(self.output_dir)
+            
+            scanned = []
+            skip = {os.path.join(self.output_dir, kind) for kind in RENDITIONS}
+            for root, dirs, files in os.walk(self.output_dir):
+                dirs[:] = [d for d in dirs if os.path.join(root, d) not in skip]
+                for name in files:
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        try:
+                            stat = os.stat(os.path.join(root, name))
+                        except OSError:
+                            continue
+                        scanned.append((name, stat.st_size, stat.st_mtime))
+            scanned.sort(key=lambda entry: entry[2])
+            
+            with self.lock:
+                self.entries = OrderedDict((name, (size, mtime)) for name, size, mtime in scanned)
+                self.total_bytes = sum(size for _, size, _ in scanned)
+                for change in self.changes:
+                    self.apply(*change)
+                self.changes = []
+                self.building = False
+            if not rescan:
+                print(f"🗂️ Indexed {len(self.entries)} detection images "
+                      f"({self.total_bytes / (1024 * 1024):.1f} MB) in {time.time() - started:.1f}s")
+    
+    def ensure_built(self):
+        if self.entries is None:
+            self.build()
+    
+    def apply(self, filename, entry):
+        old = self.entries.pop(filename, None)
+        if old:
+            self.total_bytes -= old[0]
+        if entry:
+            self.entries[filename] = entry
+            self.total_bytes += entry[0]
+    
+    def update(self, filename, entry):
+        with self.lock:
+            if self.entries is not None:
+                self.apply(filename, entry)
+            if self.building:
+                self.changes.append((filename, entry))
+            # Otherwise the walk, whenever it happens, finds the file as it is on disk
+    
+    def add(self, filename, size=None, mtime=None):
+        """Record a newly written image (stat'ed if size or mtime aren't given)"""
+        if size is None or mtime is None:
+            stat = os.stat(image_path(self.output_dir, filename))
+            size, mtime = stat.st_size, stat.st_mtime
+        self.update(filename, (size, mtime))
+    
+    def remove(self, filename):
+        self.update(filename, None)
+    
+    def get(self, filename):
+        """{filename, size, modified} of an indexed image, or None"""
+        self.ensure_built()
+        with self.lock:
+            entry = self.entries.get(filename)
+        return self.describe(filename, entry) if entry else None
+    
+    def describe(self, filename, entry):
+        return {'filename': filename, 'size': entry[0], 'modified': entry[1]}
+    
+    def page(self, offset=0, limit=None):
+        """Images newest first, skipping offset and returning at most limit"""
+        self.ensure_built()
+        with self.lock:
+            newest = reversed(self.entries.items())
+            end = offset + limit if limit is not None else None
+            return [self.describe(name, entry) for name, entry in islice(newest, offset, end)]
+    
+    def older_than(self, cutoff):
+        """Filenames of images modified before the cutoff timestamp, oldest first"""
+        self.ensure_built()
+        names = []
+        with self.lock:
+            for name, (_, mtime) in self.entries.items():
+                if mtime >= cutoff:
+                    break
+                names.append(name)
+        return names
+    
+    def get_stats(self):
+        self.ensure_built()
+        with self.lock:
+            return {'count': len(self.entries), 'bytes': self.total_bytes}
+
+image_indexes = {}
+image_indexes_lock = threading.Lock()
+
+def image_index(output_dir='detections'):
+    """The process-wide image index of an output directory (built on first use)"""
+    key = os.path.abspath(output_dir)
+    with image_indexes_lock:
+        if key not in image_indexes:
+            image_indexes[key] = ImageIndex(output_dir)
+        return image_indexes[key]
+
+class ImageWriterPool:
+    """Bounded background pool that annotates, encodes and stores detection images.
+    
+    Keeps JPEG encoding and slow storage (SD cards, NFS) off the classification
+    and frame threads. When the queue stays full for output_settings.writer_block_ms
+    the image is dropped and on_done(False) is called, so the detection is still
+    logged without one.
+    """
+    
+    def __init__(self, config=None):
+        self.config = config or config_manager
+        self.queue = queue.Queue(maxsize=self.config.get('output_settings.writer_queue_size', 64))
+        self.lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'written': 0,
+            'failed': 0,
+            'dropped': 0,
+            'max_queue_depth': 0,
+            'total_wait_ms': 0.0,
+            'total_write_ms': 0.0,
+            'max_latency_ms': 0.0
+        }
+        
+        self.workers = []
+        for i in range(resource_governor.threads('encoding', self.config.get('output_settings.image_writers', 2))):
+            worker = threading.Thread(target=self.worker_loop, daemon=True, name=f'image-writer-{i}')
+            worker.start()
+            self.workers.append(worker)
+    
+    def submit(self, job):
+        """Queue a job; returns False (after calling on_done) if it had to be dropped"""
+        block_seconds = self.config.get('output_settings.writer_block_ms', 2000) / 1000.0
+        try:
+            self.queue.put(job, timeout=block_seconds)
+        except queue.Full:
+            with self.lock:
+                self.stats['dropped'] += 1
+            print(f"⚠️ Image writer queue full, dropping {job.filename}")
+            self.finish(job, False)
+            return False
+        
+        with self.lock:
+            self.stats['submitted'] += 1
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self.queue.qsize())
+        return True
+    
+    def worker_loop(self):
+        resource_governor.apply_thread('encoding')
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                return
+            try:
+                self.write(job)
+            finally:
+                self.queue.task_done()
+    
+    def write(self, job):
+        started = time.time()
+        success = False
+        try:
+            annotated = annotate_detection(job.image, job.box, job.speed_text, job.info_text, job.footer_text)
+            ok, encoded = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, job.quality])
+            if ok:
+                fsync = self.config.get('output_settings.fsync_images', True)
+                try:
+                    # Renditions first, so they exist by the time the detection is logged
+                    write_renditions(annotated, job.output_dir, job.filename, self.config, fsync)
+                except Exception as e:
+                    print(f"⚠️ Could not create thumbnail/preview for {job.filename}: {e}")
+                data = encoded.tobytes()
+                os.makedirs(os.path.dirname(job.path), exist_ok=True)
+                write_durable(job.path, data, fsync)
+                image_index(job.output_dir).add(job.filename, len(data), time.time())
+                live_counters.add('images')
+                live_counters.add('image_bytes', len(data))
+                success = True
+                print(f"✅ Image saved: {job.filename}")
+            else:
+                print(f"❌ Failed to encode image: {job.filename}")
+        except Exception as e:
+            print(f"❌ Error saving image {job.filename}: {e}")
+        
+        finished = time.time()
+        with self.lock:
+            self.stats['written' if success else 'failed'] += 1
+            self.stats['total_wait_ms'] += (started - job.submitted) * 1000
+            self.stats['total_write_ms'] += (finished - started) * 1000
+            self.stats['max_latency_ms'] = max(self.stats['max_latency_ms'], (finished - job.submitted) * 1000)
+        self.finish(job, success)
+    
+    def finish(self, job, success):
+        if job.on_done is None:
+            return
+        try:
+            job.on_done(success)
+        except Exception as e:
+            print(f"⚠️ Image writer callback error: {e}")
+    
+    def stop(self, timeout=10.0):
+        """Write everything still queued, then stop the workers"""
+        deadline = time.time() + timeout
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join(max(0.0, deadline - time.time()))
+        self.workers = []
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        done = stats['written'] + stats['failed']
+        stats['queue_depth'] = self.queue.qsize()
+        total_wait_ms, total_write_ms = stats.pop('total_wait_ms'), stats.pop('total_write_ms')
+        stats['avg_wait_ms'] = round(total_wait_ms / done, 2) if done else 0.0
+        stats['avg_write_ms'] = round(total_write_ms / done, 2) if done else 0.0
+        stats['max_latency_ms'] = round(stats['max_latency_ms'], 2)
+        return stats
+
+DETECTION_CSV_HEADERS = ['timestamp', 'object_type', 'object_color', 'direction', 'speed_kmh', 'speed_mph',
+                         'confidence', 'image_file', 'removed', 'clip_file']
+
+def upgrade_csv_header(path):
+    """Rewrite a detection CSV from an older version with the columns it lacks; True if it was changed"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return False
+    with open(path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames or []
+        missing = [column for column in DETECTION_CSV_HEADERS if column not in fieldnames]
+        if not missing:
+            return False
+        rows = list(reader)
+    
+    print(f"🔄 Adding {', '.join(missing)} column(s) to {path}...")
+    fieldnames = DETECTION_CSV_HEADERS + [column for column in fieldnames if column not in DETECTION_CSV_HEADERS]
+    for row in rows:
+        for column in missing:
+            row[column] = 'False' if column == 'removed' else ''
+    with open(f"{path}.tmp", 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(f"{path}.tmp", path)
+    print(f"✅ Migrated {len(rows)} existing records in {path}")
+    return True
+
+class DetectionLogWriter:
+    """Single owner of the detection CSV, appending rows in group commits.
+    
+    The file stays open; rows are buffered and written together every
+    output_settings.csv_flush_interval_ms (or once csv_max_batch rows are
+    waiting), followed by one fsync when csv_fsync_policy is 'commit'. A crash
+    loses at most one flush window. offset and row_count describe the committed
+    part of the file; readers go through open_committed() and stop at offset, so
+    they never see a half-written row. Anything else that rewrites the file must
+    do so inside exclusive().
+    """
+    
+    def __init__(self, path, config=None):
+        self.path = path
+        self.config = config or config_manager
+        self.lock = threading.Condition()  # guards the pending rows
+        self.io_lock = threading.RLock()  # guards the file, offset and row_count
+        self.pending = []
+        self.last_append = 0.0
+        self.file = None
+        self.offset = 0
+        self.row_count = 0
+        self.running = True
+        self.stats = {
+            'rows': 0,
+            'commits': 0,
+            'fsyncs': 0,
+            'max_batch': 0,
+            'total_commit_ms': 0.0
+        }
+        self.open()
+        self.thread = threading.Thread(target=self.flush_loop, daemon=True, name='csv-writer')
+        self.thread.start()
+    
+    def open(self):
+        with self.io_lock:
+            # Rows are written in DETECTION_CSV_HEADERS order, so a file from an older version is upgraded first
+            upgrade_csv_header(self.path)
+            self.file = open(self.path, 'a', newline='')
+            if self.file.tell() == 0:
+                csv.writer(self.file).writerow(DETECTION_CSV_HEADERS)
+                self.file.flush()
+                self.row_count = 0
+            else:
+                with open(self.path, 'r', newline='') as f:
+                    self.row_count = max(sum(1 for _ in csv.reader(f)) - 1, 0)
+            self.offset = self.file.tell()
+    
+    def append(self, row):
+        with self.lock:
+            self.last_append = time.time()
+            self.pending.append(list(row))
+            if len(self.pending) >= self.config.get('output_settings.csv_max_batch', 100):
+                self.lock.notify()
+    
+    def flush_loop(self):
+        while True:
+            with self.lock:
+                if self.running and len(self.pending) < self.config.get('output_settings.csv_max_batch', 100):
+                    self.lock.wait(self.config.get('output_settings.csv_flush_interval_ms', 1000) / 1000.0)
+                running = self.running
+            try:
+                self.commit()
+            except Exception as e:
+                print(f"❌ Detection log write failed: {e}")
+            if not running:
+                return
+    
+    def commit(self):
+        """Write every pending row and make it durable according to the fsync policy"""
+        with self.io_lock:
+            with self.lock:
+                rows, self.pending = self.pending, []
+            if not rows:
+                return 0
+            
+            start = time.time()
+            csv.writer(self.file).writerows(rows)
+            self.file.flush()
+            fsync = self.config.get('output_settings.csv_fsync_policy', 'commit') == 'commit'
+            if fsync:
+                os.fsync(self.file.fileno())
+            self.offset = self.file.tell()
+            self.row_count += len(rows)
+            
+            self.stats['rows'] += len(rows)
+            self.stats['commits'] += 1
+            self.stats['fsyncs'] += fsync
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(rows))
+            self.stats['total_commit_ms'] += (time.time() - start) * 1000
+            return len(rows)
+    
+    def open_committed(self):
+        """(file, offset): the log opened for binary reading and the end of its committed part.
+        
+        Both are taken together, so a rewrite by exclusive() after this returns
+        replaces the file without changing what the caller reads.
+        """
+        with self.io_lock:
+            return open(self.path, 'rb'), self.offset
+    
+    @contextmanager
+    def exclusive(self):
+        """Commit pending rows and hold off appends to disk while the caller rewrites the file"""
+        with self.io_lock:
+            self.commit()
+            self.file.close()
+            try:
+                yield
+            finally:
+                self.open()
+    
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.lock.notify()
+        self.thread.join(timeout=5.0)
+        with self.io_lock:
+            self.commit()
+            self.file.close()
+    
+    def get_stats(self):
+        with self.io_lock:
+            stats = dict(self.stats)
+            stats['offset'] = self.offset
+            stats['row_count'] = self.row_count
+        with self.lock:
+            stats['pending'] = len(self.pending)
+        total_commit_ms = stats.pop('total_commit_ms')
+        stats['avg_commit_ms'] = round(total_commit_ms / stats['commits'], 2) if stats['commits'] else 0.0
+        return stats
+
+detection_logs = {}
+detection_logs_lock = threading.Lock()
+
+def detection_log_writer(path, config=None):
+    """The process-wide writer for a detection CSV, shared by the camera and the web app"""
+    key = os.path.abspath(path)
+    with detection_logs_lock:
+        if key not in detection_logs:
+            detection_logs[key] = DetectionLogWriter(path, config)
+        return detection_logs[key]
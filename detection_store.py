@@ -0,0 +1,821 @@
+#!/usr/bin/env python3
+import os
+import re
+import csv
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import numpy as np
+from config_manager import config_manager
+from detection_output import DETECTION_CSV_HEADERS, DetectionLogWriter, detection_log_writer, upgrade_csv_header
+
+def parse_timestamp(value):
+    """datetime of a stored ISO timestamp, or None if it can't be parsed"""
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+def epoch_seconds(value):
+    timestamp = parse_timestamp(value)
+    return timestamp.timestamp() if timestamp else 0.0
+
+def committed_lines(f, end=None):
+    """Lines of a binary file as text, stopping at byte offset end (None: read to the end)"""
+    position = 0
+    for line in f:
+        position += len(line)
+        if end is not None and position > end:
+            return
+        yield line.decode('utf-8', errors='replace')
+
+def read_csv_rows(path, since=None, object_type=None, faster_than=None, include_removed=False, tombstones=(), log=None):
+    """Rows of a detection CSV matching the filters, in file order (image files in tombstones count as removed).
+    
+    With the file's DetectionLogWriter as log, only its committed rows are read.
+    """
+    if log is not None:
+        f, end = log.open_committed()
+    elif os.path.exists(path):
+        f, end = open(path, 'rb'), None
+    else:
+        return []
+    
+    rows = []
+    with f:
+        for row in csv.DictReader(committed_lines(f, end)):
+            try:
+                if not include_removed and (row.get('removed', 'False').lower() == 'true' or
+                                            (tombstones and row.get('image_file') in tombstones)):
+                    continue
+                if since is not None:
+                    timestamp = parse_timestamp(row['timestamp'])
+                    if timestamp is None or timestamp < since:
+                        continue
+                if object_type and row.get('object_type') != object_type:
+                    continue
+                if faster_than is not None and float(row.get('speed_kmh', 0)) <= faster_than:
+                    continue
+                rows.append(row)
+            except (ValueError, KeyError):
+                continue
+    return rows
+
+def rewrite_removed(path, image_files):
+    """Flag the rows of a set of images as removed in one rewrite of a detection CSV; returns rows changed"""
+    if not os.path.exists(path):
+        return 0
+    
+    rows = []
+    updated = 0
+    
+    with open(path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        
+        # Add 'removed' column if it doesn't exist
+        if 'removed' not in fieldnames:
+            fieldnames = list(fieldnames) + ['removed']
+        
+        for row in reader:
+            # Add 'removed' column if missing
+            if 'removed' not in row:
+                row['removed'] = 'False'
+            
+            # Mark as removed if this is one of the files being deleted
+            if row.get('image_file') in image_files and row['removed'] != 'True':
+                row['removed'] = 'True'
+                updated += 1
+            
+            rows.append(row)
+    
+    # Write back if we made changes: to a copy first, so a crash leaves the old file intact
+    if updated:
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(rows)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+    
+    return updated
+
+class TombstoneLog:
+    """Append-only list of removed image files, applied when rows are read.
+    
+    Removing detections appends their image names here (one write for any
+    number of them) instead of rewriting the detection log; the log's owner
+    folds them into the rows later and clears them with discard().
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.removed = set()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.removed = {line.rstrip('\n') for line in f if line.strip()}
+        self.file = open(path, 'a')
+    
+    def add(self, image_files):
+        """Record removals durably; returns how many weren't already recorded"""
+        with self.lock:
+            new = [name for name in dict.fromkeys(image_files) if name and name not in self.removed]
+            if new:
+                self.file.write(''.join(f"{name}\n" for name in new))
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.removed.update(new)
+            return len(new)
+    
+    def snapshot(self):
+        with self.lock:
+            return frozenset(self.removed)
+    
+    def discard(self, image_files):
+        """Forget removals that are now recorded in the log itself"""
+        with self.lock:
+            self.removed -= set(image_files)
+            with open(f"{self.path}.tmp", 'w') as f:
+                f.write(''.join(f"{name}\n" for name in self.removed))
+                f.flush()
+                os.fsync(f.fileno())
+            self.file.close()
+            os.replace(f"{self.path}.tmp", self.path)
+            self.file = open(self.path, 'a')
+    
+    def __len__(self):
+        return len(self.removed)
+
+tombstone_logs = {}
+tombstone_logs_lock = threading.Lock()
+
+def tombstone_log(path):
+    """The process-wide tombstone log at path"""
+    key = os.path.abspath(path)
+    with tombstone_logs_lock:
+        if key not in tombstone_logs:
+            tombstone_logs[key] = TombstoneLog(path)
+        return tombstone_logs[key]
+
+class CSVDetectionStore:
+    """Detections in object_detections.csv (the original layout).
+    
+    Every query scans the whole file; appends go through the shared
+    DetectionLogWriter. Removals are appended to a tombstone log and folded
+    into the CSV in one rewrite once appends have been idle for a while.
+    """
+    
+    backend = 'csv'
+    
+    def __init__(self, path, config=None):
+        self.path = path
+        self.config = config or config_manager
+        self.log = detection_log_writer(path, self.config)
+        self.tombstones = tombstone_log(f"{os.path.splitext(path)[0]}_tombstones.log")
+        threading.Thread(target=self.fold_loop, daemon=True, name='tombstone-fold').start()
+    
+    def append(self, row):
+        self.log.append(row)
+    
+    def flush(self):
+        self.log.commit()
+    
+    def count(self):
+        """Rows in the log, removed ones included"""
+        return self.log.row_count
+    
+    def query(self, since=None, object_type=None, faster_than=None, limit=None):
+        """Rows that aren't removed, newest first, as dicts keyed by CSV column"""
+        rows = read_csv_rows(self.path, since, object_type, faster_than,
+                             tombstones=self.tombstones.snapshot(), log=self.log)
+        rows.sort(key=lambda r: r['timestamp'], reverse=True)
+        return rows[:limit] if limit else rows
+    
+    def mark_removed(self, image_file):
+        return self.mark_removed_many([image_file]) > 0
+    
+    def mark_removed_many(self, image_files):
+        """Record removals in the tombstone log (the CSV itself is rewritten later by fold())"""
+        return self.tombstones.add(image_files)
+    
+    def fold(self):
+        """Write every tombstone into the CSV's removed column in a single rewrite"""
+        tombstones = self.tombstones.snapshot()
+        if not tombstones:
+            return 0
+        
+        # Rows the camera is appending are committed first and held back until the rewrite is done
+        start = time.time()
+        with self.log.exclusive():
+            changed = rewrite_removed(self.path, tombstones)
+        self.tombstones.discard(tombstones)
+        print(f"🪦 Folded {len(tombstones)} removals into {self.path} ({changed} rows) in {time.time() - start:.1f}s")
+        return changed
+    
+    def fold_loop(self):
+        while True:
+            time.sleep(self.config.get('detection_store.tombstone_fold_interval', 60))
+            idle_seconds = self.config.get('detection_store.tombstone_idle_seconds', 30)
+            if len(self.tombstones) and time.time() - self.log.last_append >= idle_seconds:
+                try:
+                    self.fold()
+                except Exception as e:
+                    print(f"⚠️ Tombstone fold failed: {e}")
+    
+    def get_stats(self):
+        return {'backend': self.backend, 'path': self.path, 'rows': self.count(),
+                'tombstones': len(self.tombstones), 'log': self.log.get_stats()}
+
+class SQLiteDetectionStore:
+    """Detections in an indexed SQLite database (WAL mode).
+    
+    Time, type, direction, speed and removed are indexed, so filtered and
+    limited queries don't touch the rest of the history. An existing CSV is
+    imported once on first use, and with detection_store.csv_mirror every new
+    row and removal is also applied to the CSV for tools that read it.
+    """
+    
+    backend = 'sqlite'
+    
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS detections (
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            ts REAL NOT NULL,
+            object_type TEXT,
+            object_color TEXT,
+            direction TEXT,
+            speed_kmh REAL,
+            speed_mph REAL,
+            confidence REAL,
+            image_file TEXT,
+            removed INTEGER NOT NULL DEFAULT 0,
+            clip_file TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections (ts);
+        CREATE INDEX IF NOT EXISTS idx_detections_type ON detections (object_type, ts);
+        CREATE INDEX IF NOT EXISTS idx_detections_direction ON detections (direction, ts);
+        CREATE INDEX IF NOT EXISTS idx_detections_speed ON detections (speed_kmh);
+        CREATE INDEX IF NOT EXISTS idx_detections_removed ON detections (removed, ts);
+        CREATE INDEX IF NOT EXISTS idx_detections_image ON detections (image_file);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    '''
+    
+    COLUMNS = ('timestamp', 'object_type', 'object_color', 'direction', 'speed_kmh', 'speed_mph',
+               'confidence', 'image_file', 'removed', 'clip_file')
+    
+    def __init__(self, path, csv_path=None, config=None):
+        self.path = path
+        self.csv_path = csv_path
+        self.config = config or config_manager
+        self.local = threading.local()  # one connection per thread
+        self.write_lock = threading.Lock()
+        
+        self.mirror = None
+        if csv_path and self.config.get('detection_store.csv_mirror', True):
+            self.mirror = CSVDetectionStore(csv_path, self.config)
+        
+        connection = self.connection()
+        connection.executescript(self.SCHEMA)
+        if 'clip_file' not in [column['name'] for column in connection.execute('PRAGMA table_info(detections)')]:
+            # Databases created before clips existed
+            connection.execute("ALTER TABLE detections ADD COLUMN clip_file TEXT NOT NULL DEFAULT ''")
+        if csv_path and os.path.exists(csv_path) and self.get_meta('csv_imported') is None:
+            self.import_csv(csv_path)
+    
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10.0)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+    
+    def get_meta(self, key):
+        row = self.connection().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+    
+    def to_record(self, row):
+        """Parameters for one INSERT from a CSV-ordered row or a CSV dict row"""
+        if isinstance(row, dict):
+            row = [row.get(column, '') for column in DETECTION_CSV_HEADERS]
+        row = list(row) + [''] * (len(DETECTION_CSV_HEADERS) - len(row))
+        timestamp, object_type, object_color, direction, speed_kmh, speed_mph, confidence, image_file, removed, clip_file = row
+        return (str(timestamp), epoch_seconds(timestamp), object_type, object_color, direction,
+                float(speed_kmh or 0), float(speed_mph or 0), float(confidence or 0), image_file or '',
+                1 if str(removed).lower() == 'true' else 0, clip_file or '')
+    
+    def insert(self, records):
+        with self.write_lock:
+            connection = self.connection()
+            with connection:
+                connection.executemany(
+                    'INSERT INTO detections (timestamp, ts, object_type, object_color, direction, speed_kmh, '
+                    'speed_mph, confidence, image_file, removed, clip_file) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    records)
+    
+    def append(self, row):
+        self.insert([self.to_record(row)])
+        if self.mirror:
+            self.mirror.append(row)
+    
+    def flush(self):
+        if self.mirror:
+            self.mirror.flush()
+    
+    def import_csv(self, csv_path, batch_size=5000):
+        """Copy every row of an existing CSV into the database (done once, recorded in meta)"""
+        print(f"🔄 Importing {csv_path} into {self.path}...")
+        start = time.time()
+        imported = 0
+        batch = []
+        with open(csv_path, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    batch.append(self.to_record(row))
+                except (ValueError, TypeError):
+                    continue
+                if len(batch) >= batch_size:
+                    self.insert(batch)
+                    imported += len(batch)
+                    batch = []
+        if batch:
+            self.insert(batch)
+            imported += len(batch)
+        
+        with self.write_lock:
+            with self.connection() as connection:
+                connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                   ('csv_imported', datetime.now().isoformat()))
+        print(f"✅ Imported {imported} detections in {time.time() - start:.1f}s")
+        return imported
+    
+    def count(self):
+        return self.connection().execute('SELECT COUNT(*) FROM detections').fetchone()[0]
+    
+    def query(self, since=None, object_type=None, faster_than=None, limit=None):
+        """Rows that aren't removed, newest first, as dicts keyed by CSV column"""
+        conditions = ['removed = 0']
+        params = []
+        if since is not None:
+            conditions.append('ts >= ?')
+            params.append(since.timestamp())
+        if object_type:
+            conditions.append('object_type = ?')
+            params.append(object_type)
+        if faster_than is not None:
+            conditions.append('speed_kmh > ?')
+            params.append(faster_than)
+        
+        sql = (f"SELECT {', '.join(self.COLUMNS)} FROM detections WHERE {' AND '.join(conditions)} "
+               f"ORDER BY ts DESC")
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        
+        rows = []
+        for record in self.connection().execute(sql, params):
+            row = dict(record)
+            row['removed'] = 'True' if row['removed'] else 'False'
+            rows.append(row)
+        return rows
+    
+    def mark_removed(self, image_file):
+        return self.mark_removed_many([image_file]) > 0
+    
+    def mark_removed_many(self, image_files):
+        image_files = list(image_files)
+        with self.write_lock:
+            with self.connection() as connection:
+                updated = connection.executemany('UPDATE detections SET removed = 1 WHERE image_file = ? AND removed = 0',
+                                                 [(name,) for name in image_files]).rowcount
+        if self.mirror:
+            self.mirror.mark_removed_many(image_files)
+        return updated
+    
+    def get_stats(self):
+        return {
+            'backend': self.backend,
+            'path': self.path,
+            'rows': self.count(),
+            'csv_imported': self.get_meta('csv_imported'),
+            'csv_mirror': self.mirror.get_stats() if self.mirror else None
+        }
+
+def empty_summary():
+    return {'rows': 0, 'min_ts': None, 'max_ts': None, 'speed_min': None, 'speed_max': None,
+            'speed_sum': 0.0, 'bytes': 0}
+
+def add_to_summary(summary, ts, speed):
+    summary['rows'] += 1
+    summary['min_ts'] = ts if summary['min_ts'] is None else min(summary['min_ts'], ts)
+    summary['max_ts'] = ts if summary['max_ts'] is None else max(summary['max_ts'], ts)
+    summary['speed_min'] = speed if summary['speed_min'] is None else min(summary['speed_min'], speed)
+    summary['speed_max'] = speed if summary['speed_max'] is None else max(summary['speed_max'], speed)
+    summary['speed_sum'] += speed
+
+def write_columnar(path, rows):
+    """Store rows as one compressed file of column arrays (type, color and direction dictionary-encoded)"""
+    columns = {
+        'timestamp': np.array([str(r['timestamp']) for r in rows], dtype=str),
+        'ts': np.array([epoch_seconds(r['timestamp']) for r in rows], dtype=np.float64),
+        'image_file': np.array([str(r.get('image_file') or '') for r in rows], dtype=str),
+        'clip_file': np.array([str(r.get('clip_file') or '') for r in rows], dtype=str),
+        'removed': np.array([str(r.get('removed')).lower() == 'true' for r in rows], dtype=bool)
+    }
+    for name in ('speed_kmh', 'speed_mph', 'confidence'):
+        columns[name] = np.array([float(r.get(name) or 0) for r in rows], dtype=np.float64)
+    for name in ('object_type', 'object_color', 'direction'):
+        values, codes = np.unique(np.array([str(r.get(name) or '') for r in rows], dtype=str), return_inverse=True)
+        columns[f'{name}_values'] = values
+        columns[f'{name}_codes'] = codes.astype(np.int32)
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, **columns)
+    os.replace(tmp_path, path)
+
+def read_columnar(path, since=None, object_type=None, faster_than=None, include_removed=False):
+    """Rows of a columnar partition matching the filters, as dicts keyed by CSV column"""
+    with np.load(path) as data:
+        columns = {name: data[name] for name in data.files}
+    
+    mask = np.ones(len(columns['ts']), dtype=bool)
+    if not include_removed:
+        mask &= ~columns['removed']
+    if since is not None:
+        mask &= columns['ts'] >= since.timestamp()
+    if object_type:
+        mask &= columns['object_type_values'][columns['object_type_codes']] == object_type
+    if faster_than is not None:
+        mask &= columns['speed_kmh'] > faster_than
+    
+    decoded = {name: columns[f'{name}_values'][columns[f'{name}_codes']] for name in ('object_type', 'object_color', 'direction')}
+    rows = []
+    for i in np.nonzero(mask)[0]:
+        rows.append({
+            'timestamp': str(columns['timestamp'][i]),
+            'object_type': str(decoded['object_type'][i]),
+            'object_color': str(decoded['object_color'][i]),
+            'direction': str(decoded['direction'][i]),
+            'speed_kmh': float(columns['speed_kmh'][i]),
+            'speed_mph': float(columns['speed_mph'][i]),
+            'confidence': float(columns['confidence'][i]),
+            'image_file': str(columns['image_file'][i]),
+            'removed': 'True' if columns['removed'][i] else 'False',
+            'clip_file': str(columns['clip_file'][i]) if 'clip_file' in columns else ''
+        })
+    return rows
+
+class PartitionedDetectionStore:
+    """Detections split into one CSV per day under detection_store.archive_dir.
+    
+    index.json holds a small summary of every partition (rows, first and last
+    time, speed min/max/sum), so range queries only open the partitions that
+    overlap the range and counts open none. Months older than
+    compact_after_days are compacted into one compressed columnar .npz file
+    per month by a background thread.
+    """
+    
+    backend = 'partitioned'
+    
+    def __init__(self, root, csv_path=None, config=None):
+        self.root = root
+        self.config = config or config_manager
+        self.lock = threading.RLock()  # guards summaries, the active writer and partition files
+        self.summaries = {}
+        self.meta = {}
+        self.active_day = None
+        self.writer = None
+        self.index_saved = 0.0
+        os.makedirs(root, exist_ok=True)
+        
+        self.mirror = None
+        if csv_path and self.config.get('detection_store.csv_mirror', True):
+            self.mirror = CSVDetectionStore(csv_path, self.config)
+        
+        self.load_index()
+        if csv_path and os.path.exists(csv_path) and 'csv_imported' not in self.meta:
+            self.import_csv(csv_path)
+        
+        threading.Thread(target=self.compaction_loop, daemon=True, name='archive-compaction').start()
+    
+    def partition_path(self, name):
+        # Days (YYYY-MM-DD) are CSV files, compacted months (YYYY-MM) columnar files
+        return os.path.join(self.root, f"{name}.csv" if len(name) == 10 else f"{name}.npz")
+    
+    def read_partition(self, name, since=None, object_type=None, faster_than=None, include_removed=False):
+        path = self.partition_path(name)
+        if not os.path.exists(path):
+            return []
+        if path.endswith('.npz'):
+            return read_columnar(path, since, object_type, faster_than, include_removed)
+        return read_csv_rows(path, since, object_type, faster_than, include_removed)
+    
+    def summarize(self, name):
+        summary = empty_summary()
+        for row in self.read_partition(name, include_removed=True):
+            try:
+                add_to_summary(summary, epoch_seconds(row['timestamp']), float(row.get('speed_kmh') or 0))
+            except (ValueError, KeyError):
+                continue
+        summary['bytes'] = os.path.getsize(self.partition_path(name))
+        return summary
+    
+    def load_index(self):
+        """Read index.json and re-summarize partitions it doesn't describe (new, changed or after a crash)"""
+        index_path = os.path.join(self.root, 'index.json')
+        if os.path.exists(index_path):
+            try:
+                with open(index_path) as f:
+                    index = json.load(f)
+                self.summaries = index.get('partitions', {})
+                self.meta = index.get('meta', {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Archive index unreadable, rebuilding: {e}")
+        
+        names = set()
+        for filename in os.listdir(self.root):
+            name, ext = os.path.splitext(filename)
+            if ext in ('.csv', '.npz'):
+                names.add(name)
+        
+        rebuilt = 0
+        for name in names:
+            summary = self.summaries.get(name)
+            if summary is None or summary.get('bytes') != os.path.getsize(self.partition_path(name)):
+                self.summaries[name] = self.summarize(name)
+                rebuilt += 1
+        for name in set(self.summaries) - names:
+            del self.summaries[name]
+        
+        if rebuilt:
+            print(f"📚 Archive index: re-summarized {rebuilt} partition(s)")
+            self.save_index()
+    
+    def save_index(self):
+        with self.lock:
+            if self.writer is not None:
+                self.summaries[self.active_day]['bytes'] = self.writer.offset
+            index = {'partitions': self.summaries, 'meta': self.meta}
+            index_path = os.path.join(self.root, 'index.json')
+            with open(f"{index_path}.tmp", 'w') as f:
+                json.dump(index, f)
+            os.replace(f"{index_path}.tmp", index_path)
+            self.index_saved = time.time()
+    
+    def append(self, row):
+        day = str(row[0])[:10]
+        with self.lock:
+            if self.active_day is None or day > self.active_day:
+                # New day: the previous day's file is finished
+                if self.writer is not None:
+                    self.writer.stop()
+                    self.summaries[self.active_day]['bytes'] = self.writer.offset
+                self.writer = DetectionLogWriter(self.partition_path(day), self.config)
+                self.active_day = day
+                self.summaries.setdefault(day, empty_summary())
+            
+            if day == self.active_day:
+                self.writer.append(row)
+            else:
+                # Late row for an earlier day (classified after midnight)
+                upgrade_csv_header(self.partition_path(day))
+                with open(self.partition_path(day), 'a', newline='') as f:
+                    if f.tell() == 0:
+                        csv.writer(f).writerow(DETECTION_CSV_HEADERS)
+                    csv.writer(f).writerow(row)
+                self.summaries.setdefault(day, empty_summary())['bytes'] = os.path.getsize(self.partition_path(day))
+            
+            add_to_summary(self.summaries[day], epoch_seconds(row[0]), float(row[4] or 0))
+            if time.time() - self.index_saved > 10:
+                self.save_index()
+        
+        if self.mirror:
+            self.mirror.append(row)
+    
+    def flush(self):
+        with self.lock:
+            if self.writer is not None:
+                self.writer.commit()
+            self.save_index()
+        if self.mirror:
+            self.mirror.flush()
+    
+    def import_csv(self, csv_path):
+        """Split an existing CSV into day partitions (done once, recorded in the index)"""
+        print(f"🔄 Importing {csv_path} into {self.root}...")
+        start = time.time()
+        imported = 0
+        handles = OrderedDict()  # a few open day files; the CSV is mostly in time order
+        try:
+            with open(csv_path, 'r', newline='') as f:
+                for row in csv.DictReader(f):
+                    day = str(row.get('timestamp', ''))[:10]
+                    if parse_timestamp(day) is None:
+                        continue
+                    if day not in handles:
+                        if len(handles) >= 32:
+                            handles.popitem(last=False)[1].close()
+                        handle = open(self.partition_path(day), 'a', newline='')
+                        if handle.tell() == 0:
+                            csv.writer(handle).writerow(DETECTION_CSV_HEADERS)
+                        handles[day] = handle
+                    handles.move_to_end(day)
+                    csv.writer(handles[day]).writerow([row.get(column, '') for column in DETECTION_CSV_HEADERS])
+                    imported += 1
+        finally:
+            for handle in handles.values():
+                handle.close()
+        
+        with self.lock:
+            self.meta['csv_imported'] = datetime.now().isoformat()
+            self.load_index()
+            self.save_index()
+        print(f"✅ Imported {imported} detections into {len(self.summaries)} partitions in {time.time() - start:.1f}s")
+        return imported
+    
+    def count(self):
+        with self.lock:
+            return sum(summary['rows'] for summary in self.summaries.values())
+    
+    def query(self, since=None, object_type=None, faster_than=None, limit=None):
+        """Rows that aren't removed, newest first; only partitions overlapping the range are read"""
+        with self.lock:
+            partitions = sorted(((s['max_ts'] or 0, name) for name, s in self.summaries.items()), reverse=True)
+        
+        rows = []
+        for max_ts, name in partitions:
+            if since is not None and max_ts < since.timestamp():
+                break  # this and every older partition end before the range
+            if limit and len(rows) >= limit:
+                break  # partitions don't overlap, so the rest is older than what we have
+            rows.extend(self.read_partition(name, since, object_type, faster_than))
+        
+        rows.sort(key=lambda r: r['timestamp'], reverse=True)
+        return rows[:limit] if limit else rows
+    
+    def mark_removed(self, image_file):
+        return self.mark_removed_many([image_file]) > 0
+    
+    def mark_removed_many(self, image_files):
+        """Flag removed rows with one rewrite per affected partition"""
+        image_files = set(image_files)
+        with self.lock:
+            # Image names start with the detection's date, which names its partition
+            by_partition = {}
+            for image_file in image_files:
+                match = re.match(r'(\d{4})(\d{2})(\d{2})_', image_file)
+                if match:
+                    day = '-'.join(match.groups())
+                    names = [name for name in (day, day[:7]) if name in self.summaries]
+                else:
+                    names = list(self.summaries)
+                for name in names:
+                    by_partition.setdefault(name, set()).add(image_file)
+            
+            updated = 0
+            for name, names_removed in by_partition.items():
+                path = self.partition_path(name)
+                if path.endswith('.npz'):
+                    rows = read_columnar(path, include_removed=True)
+                    changed = [row for row in rows if row['image_file'] in names_removed and row['removed'] == 'False']
+                    for row in changed:
+                        row['removed'] = 'True'
+                    if changed:
+                        write_columnar(path, rows)
+                        updated += len(changed)
+                elif name == self.active_day:
+                    with self.writer.exclusive():
+                        updated += rewrite_removed(path, names_removed)
+                else:
+                    updated += rewrite_removed(path, names_removed)
+                self.summaries[name]['bytes'] = os.path.getsize(path)
+            self.save_index()
+        
+        if self.mirror:
+            self.mirror.mark_removed_many(image_files)
+        return updated
+    
+    def compact(self, now=None):
+        """Merge the day files of every month older than compact_after_days into one columnar file"""
+        now = now or datetime.now()
+        cutoff = (now - timedelta(days=self.config.get('detection_store.compact_after_days', 30))).strftime('%Y-%m')
+        
+        with self.lock:
+            months = sorted({name[:7] for name in self.summaries if len(name) == 10 and name[:7] < cutoff})
+        
+        for month in months:
+            start = time.time()
+            with self.lock:
+                days = sorted(name for name in self.summaries if len(name) == 10 and name[:7] == month)
+                rows = self.read_partition(month, include_removed=True)
+                for day in days:
+                    rows.extend(self.read_partition(day, include_removed=True))
+                rows.sort(key=lambda r: r['timestamp'])
+                
+                size_before = sum(os.path.getsize(self.partition_path(name)) for name in days + [month]
+                                  if os.path.exists(self.partition_path(name)))
+                write_columnar(self.partition_path(month), rows)
+                for day in days:
+                    os.remove(self.partition_path(day))
+                    del self.summaries[day]
+                self.summaries[month] = self.summarize(month)
+                self.save_index()
+            
+            print(f"🗜️ Compacted {month}: {len(days)} day files, {len(rows)} rows, "
+                  f"{size_before / 1024:.0f} KB -> {self.summaries[month]['bytes'] / 1024:.0f} KB "
+                  f"in {time.time() - start:.1f}s")
+        return months
+    
+    def compaction_loop(self):
+        while True:
+            time.sleep(self.config.get('detection_store.compact_interval_hours', 6) * 3600)
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"⚠️ Archive compaction failed: {e}")
+    
+    def get_partitions(self, since=None):
+        """Per-partition summaries, newest first (all of them, or those that end after since)"""
+        with self.lock:
+            partitions = [dict(summary, name=name) for name, summary in self.summaries.items()]
+        if since is not None:
+            partitions = [p for p in partitions if (p['max_ts'] or 0) >= since.timestamp()]
+        for summary in partitions:
+            summary['avg_speed'] = round(summary.pop('speed_sum') / summary['rows'], 1) if summary['rows'] else 0.0
+        return sorted(partitions, key=lambda p: p['name'], reverse=True)
+    
+    def get_stats(self):
+        partitions = self.get_partitions()
+        return {
+            'backend': self.backend,
+            'path': self.root,
+            'rows': sum(p['rows'] for p in partitions),
+            'partitions': len(partitions),
+            'compacted': sum(1 for p in partitions if len(p['name']) == 7),
+            'csv_imported': self.meta.get('csv_imported'),
+            'csv_mirror': self.mirror.get_stats() if self.mirror else None
+        }
+
+detection_stores = {}
+detection_stores_lock = threading.Lock()
+
+def open_detection_store(config=None, output_dir='detections'):
+    """The process-wide detection store selected by detection_store.backend ('csv', 'sqlite' or 'partitioned')"""
+    config = config or config_manager
+    backend = config.get('detection_store.backend', 'csv')
+    csv_path = os.path.join(output_dir, 'object_detections.csv')
+    
+    with detection_stores_lock:
+        key = (backend, os.path.abspath(output_dir))
+        if key not in detection_stores:
+            if backend == 'sqlite':
+                db_path = config.get('detection_store.sqlite_path', os.path.join(output_dir, 'detections.db'))
+                detection_stores[key] = SQLiteDetectionStore(db_path, csv_path, config)
+            elif backend == 'partitioned':
+                archive_dir = config.get('detection_store.archive_dir', os.path.join(output_dir, 'archive'))
+                detection_stores[key] = PartitionedDetectionStore(archive_dir, csv_path, config)
+            else:
+                detection_stores[key] = CSVDetectionStore(csv_path, config)
+        return detection_stores[key]
+
+def main():
+    parser = argparse.ArgumentParser(description="Import the detection CSV into the SQLite store, or compact the archive")
+    parser.add_argument('--csv', default=os.path.join('detections', 'object_detections.csv'))
+    parser.add_argument('--db', default=config_manager.get('detection_store.sqlite_path', os.path.join('detections', 'detections.db')))
+    parser.add_argument('--force', action='store_true', help="replace the database contents with the CSV again")
+    parser.add_argument('--compact', action='store_true', help="compact old months of the partitioned archive now")
+    args = parser.parse_args()
+    
+    if args.compact:
+        store = PartitionedDetectionStore(config_manager.get('detection_store.archive_dir', os.path.join('detections', 'archive')))
+        months = store.compact()
+        print(f"✅ Compacted {len(months)} month(s)" if months else "ℹ️ Nothing to compact")
+        return
+    
+    store = SQLiteDetectionStore(args.db, None)
+    if store.get_meta('csv_imported'):
+        if not args.force:
+            print(f"ℹ️ Already imported on {store.get_meta('csv_imported')} (use --force to import again)")
+            return
+        with store.connection() as connection:
+            connection.execute('DELETE FROM detections')
+    store.import_csv(args.csv)
+
+if __name__ == "__main__":
+    main()
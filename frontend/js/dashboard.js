@@ -222,7 +222,7 @@ async function updateLatestDetection() {
         latestDiv.innerHTML = `
             <div style="text-align: center; width: 100%;">
                 ${latest.has_image ? 
-                    `<img src="/images/${latest.image_file}" 
+                    `<img src="${latest.thumbnail_url || `/images/${latest.image_file}`}" 
                           style="width: 100%; max-width: 300px; height: 200px; object-fit: cover; border-radius: 8px; margin-bottom: 15px; cursor: pointer;" 
                           onclick="showImage('/images/${latest.image_file}', '${getImageTitle(latest)}')"
                           alt="Latest detection">` :
@@ -259,8 +259,11 @@ function displayDetections(detections) {
                     <button onclick="downloadImage('${v.image_file}')" 
                             style="background: rgba(0,0,0,0.7); color: white; border: none; border-radius: 4px; padding: 5px 8px; cursor: pointer; font-size: 12px;"
                             title="Download Image">📥</button>
+                    ${v.clip_url ? `<a href="${v.clip_url}" target="_blank"
+                            style="background: rgba(0,0,0,0.7); color: white; border-radius: 4px; padding: 5px 8px; font-size: 12px; text-decoration: none;"
+                            title="Play Clip">🎬</a>` : ''}
                 </div>
-                <img src="/images/${v.image_file}" 
+                <img src="${v.thumbnail_url || `/images/${v.image_file}`}" loading="lazy"
                       style="width: 100%; height: 200px; object-fit: cover; border-radius: 8px; cursor: pointer; margin-bottom: 10px;" 
                       onclick="showImage('/images/${v.image_file}', '${getImageTitle(v)}')"
                       alt="${getImageTitle(v)}">` :
@@ -353,13 +356,14 @@ async function downloadImage(filename) {
 // View all images in a gallery
 async function viewAllImages() {
     try {
-        // Fetch image data with file sizes from API
-        const response = await fetch('/api/images');
+        // Fetch the newest images with file sizes from API (one page; the total is in a header)
+        const response = await fetch('/api/images?limit=200');
         if (!response.ok) {
             throw new Error('Failed to fetch image data');
         }
         
         const imageData = await response.json();
+        const totalImages = parseInt(response.headers.get('X-Total-Count')) || imageData.length;
         
         if (imageData.length === 0) {
             showNotification('No images found', 'info');
@@ -379,7 +383,7 @@ async function viewAllImages() {
         
         modalContent.innerHTML = `
             <span class="close" onclick="closeModal()">&times;</span>
-            <h3>Detection Images Gallery (${imageData.length} images)</h3>
+            <h3>Detection Images Gallery (${totalImages > imageData.length ? `newest ${imageData.length} of ${totalImages}` : imageData.length} images)</h3>
             <div style="display: grid; grid-template-columns: repeat(auto-fill, minmax(220px, 1fr)); gap: 15px; margin-top: 20px;">
                 ${imageData.map(img => {
                     // Find matching detection data for additional info
@@ -388,7 +392,7 @@ async function viewAllImages() {
                     
                     return `
                         <div style="text-align: center; background: #1f2937; border-radius: 8px; padding: 10px;">
-                            <img src="${img.path}" 
+                            <img src="${img.thumbnail_url || img.path}" loading="lazy"
                                  style="width: 100%; height: 150px; object-fit: cover; border-radius: 4px; cursor: pointer;" 
                                  onclick="showImage('${img.path}', '${imageTitle}')"
                                  alt="${imageTitle}">
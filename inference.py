@@ -0,0 +1,728 @@
+#!/usr/bin/env python3
+import os
+import time
+import glob
+import shutil
+import queue
+import random
+import threading
+import argparse
+from collections import OrderedDict
+from concurrent.futures import Future
+import cv2
+import numpy as np
+from config_manager import config_manager
+from resource_governor import resource_governor
+from detection_output import RENDITIONS
+
+def letterbox(image, size, pad_value=114):
+    """Resize keeping aspect ratio and pad to a size x size square"""
+    h, w = image.shape[:2]
+    scale = size / max(h, w)
+    new_w, new_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    
+    canvas = np.full((size, size, 3), pad_value, dtype=np.uint8)
+    top = (size - new_h) // 2
+    left = (size - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return canvas
+
+def parse_yolo_result(result, names, confidence_threshold):
+    """List of (class_name, confidence) above the threshold, in YOLO's box order"""
+    detections = []
+    if result.boxes is None or len(result.boxes) == 0:
+        return detections
+    
+    class_ids = result.boxes.cls.cpu().numpy().astype(int)
+    confidences = result.boxes.conf.cpu().numpy()
+    for class_id, conf in zip(class_ids, confidences):
+        if conf >= confidence_threshold:
+            detections.append((names[int(class_id)], float(conf)))
+    return detections
+
+def parse_yolo_boxes(result, names, confidence_threshold):
+    """List of (class_name, confidence, [x1, y1, x2, y2]) above the threshold"""
+    detections = []
+    if result.boxes is None or len(result.boxes) == 0:
+        return detections
+    
+    class_ids = result.boxes.cls.cpu().numpy().astype(int)
+    confidences = result.boxes.conf.cpu().numpy()
+    boxes = result.boxes.xyxy.cpu().numpy()
+    for class_id, conf, box in zip(class_ids, confidences, boxes):
+        if conf >= confidence_threshold:
+            detections.append((names[int(class_id)], float(conf), [float(v) for v in box]))
+    return detections
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU of (N, 4) and (M, 4) xyxy boxes, returned as (N, M)"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-6)
+
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+
+def exported_model_path(model_path, backend, imgsz=320, int8=False):
+    """Where the exported copy of model_path is cached for a backend"""
+    stem = f"{os.path.splitext(model_path)[0]}_{imgsz}{'_int8' if int8 else ''}"
+    if backend == 'onnx':
+        return f"{stem}.onnx"
+    if backend == 'openvino':
+        return f"{stem}_openvino_model"
+    return model_path
+
+def export_model(model_path, backend, imgsz=320, int8=False):
+    """Export a .pt model for a CPU backend once and return the cached artifact"""
+    target = exported_model_path(model_path, backend, imgsz, int8)
+    if os.path.exists(target):
+        return target
+    
+    from ultralytics import YOLO
+    
+    print(f"📦 Exporting {model_path} to {backend}{' (INT8)' if int8 else ''} - this only happens once...")
+    start = time.time()
+    model = YOLO(model_path)
+    if backend == 'onnx':
+        exported = model.export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            # Ultralytics has no INT8 ONNX export, so quantize the weights with ONNX Runtime
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(exported, target, weight_type=QuantType.QUInt8)
+            os.remove(exported)
+        else:
+            shutil.move(exported, target)
+    elif backend == 'openvino':
+        exported = model.export(format='openvino', imgsz=imgsz, dynamic=True, int8=int8)
+        shutil.move(exported, target)
+    else:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    
+    print(f"✅ Exported {target} in {time.time() - start:.1f}s")
+    return target
+
+def load_model(model_path, backend='pytorch', imgsz=320, int8=False):
+    """YOLO model running on the requested backend.
+    
+    ONNX Runtime and OpenVINO models are loaded through Ultralytics as well, so
+    results keep the same boxes/classes/names interface as the PyTorch model.
+    """
+    from ultralytics import YOLO
+    
+    if backend == 'pytorch':
+        return YOLO(model_path)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    return YOLO(export_model(model_path, backend, imgsz, int8), task='detect')
+
+class ModelRegistry:
+    """Process-wide cache of loaded, warmed-up YOLO models.
+    
+    Camera instances created by /api/start share the model loaded by the first
+    one, so a stop/start cycle does not reload weights or pay first-inference
+    initialisation again. Each model has a lock that serialises calls into it.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+    
+    def get(self, model_path, backend='pytorch', imgsz=320, int8=False, device='cpu', warmup_batch=8):
+        key = (os.path.abspath(model_path), backend, imgsz if backend != 'pytorch' else None,
+               int8 and backend != 'pytorch', device)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry['uses'] += 1
+                print(f"♻️ Reusing loaded model: {model_path} ({backend}, {device})")
+                return entry['model']
+            
+            rss_before = process_memory_mb()
+            start = time.time()
+            model = load_model(model_path, backend, imgsz, int8)
+            load_seconds = time.time() - start
+            
+            start = time.time()
+            warmup_model(model, imgsz, device, warmup_batch)
+            warmup_seconds = time.time() - start
+            
+            self.entries[key] = {
+                'model': model,
+                'lock': threading.Lock(),
+                'path': model_path,
+                'backend': backend,
+                'device': device,
+                'int8': key[3],
+                'load_seconds': round(load_seconds, 2),
+                'warmup_seconds': round(warmup_seconds, 2),
+                'memory_mb': round(max(0.0, process_memory_mb() - rss_before), 1),
+                'loaded_at': time.time(),
+                'uses': 1
+            }
+            print(f"✅ Model ready in {load_seconds + warmup_seconds:.1f}s "
+                  f"(load {load_seconds:.1f}s, warm-up {warmup_seconds:.1f}s)")
+            return model
+    
+    def lock_for(self, model):
+        """Lock shared by everything that calls into this model"""
+        with self.lock:
+            for entry in self.entries.values():
+                if entry['model'] is model:
+                    return entry['lock']
+        return threading.Lock()
+    
+    def release(self, model_path=None):
+        """Drop cached models (all of them, or every variant of one path)"""
+        with self.lock:
+            for key in list(self.entries):
+                if model_path is None or key[0] == os.path.abspath(model_path):
+                    del self.entries[key]
+    
+    def get_stats(self):
+        with self.lock:
+            return [{k: v for k, v in entry.items() if k not in ('model', 'lock')}
+                    for entry in self.entries.values()]
+
+def process_memory_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 ** 2)
+    except Exception:
+        return 0.0
+
+def warmup_model(model, imgsz=320, device='cpu', batch=8):
+    """Run dummy inputs through both the crop batch path and the full-size path"""
+    dummy = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    model([dummy] * max(1, batch), imgsz=imgsz, device=device, verbose=False)
+    model(np.full((480, 640, 3), 114, dtype=np.uint8), device=device, verbose=False)
+
+# Global model registry instance
+model_registry = ModelRegistry()
+
+class InferenceBusy(RuntimeError):
+    """Raised through a Future when a classifier sheds load instead of queueing it"""
+
+def appearance_fingerprint(crop):
+    """64-bit difference hash of a crop; views of the same vehicle differ in only a few bits"""
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+class ClassificationCache:
+    """TTL + LRU cache of YOLO results keyed by crop fingerprint and size.
+    
+    A crop matches an entry when its fingerprint is within max_hamming bits and
+    its width/height within max_size_change of the cached crop, so a vehicle
+    that reaches classification again within ttl_seconds (stop-and-go traffic,
+    a fragmented track) reuses the earlier result. Entries are evicted
+    least-recently-used first once their estimated size exceeds max_memory_kb.
+    """
+    
+    ENTRY_BYTES = 256
+    DETECTION_BYTES = 96
+    
+    def __init__(self, config=None):
+        self.config = config or config_manager
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # id -> (fingerprint, width, height, detections, expires, size_bytes)
+        self.next_id = 0
+        self.memory_bytes = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0
+        }
+    
+    @property
+    def enabled(self):
+        return self.config.get('detection_settings.classification_cache.enabled', True)
+    
+    def lookup(self, fingerprint, width, height):
+        max_hamming = self.config.get('detection_settings.classification_cache.max_hamming', 6)
+        max_size_change = self.config.get('detection_settings.classification_cache.max_size_change', 0.25)
+        now = time.time()
+        
+        with self.lock:
+            for entry_id in [i for i, entry in self.entries.items() if entry[4] < now]:
+                self.remove(entry_id)
+                self.stats['expired'] += 1
+            
+            for entry_id, (cached_fingerprint, cached_w, cached_h, detections, _, _) in reversed(self.entries.items()):
+                if abs(width - cached_w) > max_size_change * cached_w or abs(height - cached_h) > max_size_change * cached_h:
+                    continue
+                if bin(fingerprint ^ cached_fingerprint).count('1') > max_hamming:
+                    continue
+                self.entries.move_to_end(entry_id)
+                self.stats['hits'] += 1
+                return list(detections)
+            
+            self.stats['misses'] += 1
+            return None
+    
+    def store(self, fingerprint, width, height, detections):
+        ttl = self.config.get('detection_settings.classification_cache.ttl_seconds', 5)
+        max_bytes = self.config.get('detection_settings.classification_cache.max_memory_kb', 256) * 1024
+        size_bytes = self.ENTRY_BYTES + self.DETECTION_BYTES * len(detections)
+        
+        with self.lock:
+            self.entries[self.next_id] = (fingerprint, width, height, tuple(detections), time.time() + ttl, size_bytes)
+            self.next_id += 1
+            self.memory_bytes += size_bytes
+            while self.memory_bytes > max_bytes and self.entries:
+                self.remove(next(iter(self.entries)))
+                self.stats['evictions'] += 1
+    
+    def remove(self, entry_id):
+        self.memory_bytes -= self.entries.pop(entry_id)[5]
+    
+    def get_stats(self):
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats,
+                        entries=len(self.entries),
+                        memory_kb=round(self.memory_bytes / 1024, 1),
+                        hit_ratio=round(self.stats['hits'] / lookups, 3) if lookups else None)
+
+DEFAULT_CASCADE_RULES = [
+    {"label": "person", "max_speed_kmh": 12, "max_width_m": 1.2, "min_aspect": 1.2},
+    {"label": "bicycle", "min_speed_kmh": 8, "max_speed_kmh": 40, "max_width_m": 2.2, "min_aspect": 0.6},
+    {"label": "car", "min_speed_kmh": 25, "min_width_m": 3.2, "max_width_m": 6.0, "max_aspect": 0.8},
+    {"label": "truck", "min_width_m": 8.0, "max_aspect": 0.9}
+]
+
+class CascadeClassifier:
+    """Rule-based pre-classifier that answers the obvious cases without YOLO.
+    
+    Each rule in detection_settings.cascade.rules names a label and min_/max_
+    bounds on the track features (speed_kmh, width_m, height_m, aspect = h/w,
+    area_px). A track is decided only when every matching rule agrees on the
+    label. Otherwise the cascade is uncertain and YOLO runs. A sample of
+    decisions (audit_rate) still goes to YOLO to measure agreement.
+    """
+    
+    def __init__(self, config=None):
+        self.config = config or config_manager
+        self.lock = threading.Lock()
+        self.stats = {
+            'evaluated': 0,
+            'decided': 0,
+            'skipped_yolo': 0,
+            'audited': 0,
+            'agreed': 0,
+            'labels': {}
+        }
+    
+    @property
+    def enabled(self):
+        return self.config.get('detection_settings.cascade.enabled', False)
+    
+    def classify(self, features):
+        """(label, confidence) when the rules are unambiguous, otherwise None"""
+        rules = self.config.get('detection_settings.cascade.rules', DEFAULT_CASCADE_RULES)
+        matches = [rule for rule in rules if self.rule_matches(rule, features)]
+        labels = {rule['label'] for rule in matches}
+        
+        with self.lock:
+            self.stats['evaluated'] += 1
+            if len(labels) != 1:
+                return None
+            label = labels.pop()
+            self.stats['decided'] += 1
+            self.stats['labels'][label] = self.stats['labels'].get(label, 0) + 1
+        
+        return label, min(rule.get('confidence', 0.8) for rule in matches)
+    
+    def rule_matches(self, rule, features):
+        for key, bound in rule.items():
+            if key.startswith('min_') and features.get(key[4:], float('-inf')) < bound:
+                return False
+            if key.startswith('max_') and features.get(key[4:], float('inf')) > bound:
+                return False
+        return True
+    
+    def needs_yolo(self, label):
+        """Whether a decided track still goes to YOLO (validation required, or audit sample)"""
+        if label in self.config.get('detection_settings.cascade.yolo_required_labels', []):
+            return True
+        return random.random() < self.config.get('detection_settings.cascade.audit_rate', 0.1)
+    
+    def record_skip(self):
+        with self.lock:
+            self.stats['skipped_yolo'] += 1
+    
+    def record_agreement(self, cascade_label, yolo_label):
+        with self.lock:
+            self.stats['audited'] += 1
+            self.stats['agreed'] += cascade_label == yolo_label
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats, labels=dict(self.stats['labels']))
+        stats['hit_rate'] = round(stats['decided'] / max(1, stats['evaluated']), 3)
+        stats['skip_rate'] = round(stats['skipped_yolo'] / max(1, stats['evaluated']), 3)
+        stats['agreement'] = round(stats['agreed'] / stats['audited'], 3) if stats['audited'] else None
+        return stats
+
+class BatchClassifier:
+    """Micro-batching front end for a YOLO model.
+    
+    Crops submitted within detection_settings.batch_max_wait_ms of each other
+    (up to detection_settings.batch_size) are letterboxed to a common size and
+    run through the model in one forward pass. Each submit() returns a Future
+    that resolves to the list of (class_name, confidence) for that crop.
+    
+    submit_detection() queues a full-size detection pass on the same worker,
+    so the model is never called from two threads at once.
+    """
+    
+    def __init__(self, model, device='cpu', config=None, model_lock=None):
+        self.model = model
+        self.device = device
+        self.config = config or config_manager
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.model_lock = model_lock or threading.Lock()
+        
+        self.stats = {
+            'crops': 0,
+            'batches': 0,
+            'detections': 0,
+            'errors': 0,
+            'total_inference_ms': 0.0,
+            'max_batch': 0
+        }
+        
+        self.running = True
+        self.worker = threading.Thread(target=self.worker_loop, daemon=True, name='batch-classifier')
+        self.worker.start()
+    
+    def submit(self, crop):
+        future = Future()
+        if crop is None or crop.size == 0:
+            future.set_result([])
+            return future
+        self.requests.put(('classify', crop, future))
+        return future
+    
+    def submit_detection(self, image):
+        """Future resolving to (class_name, confidence, box) for every object in image"""
+        future = Future()
+        self.requests.put(('detect', image, future))
+        return future
+    
+    def classify(self, crop, timeout=None):
+        return self.submit(crop).result(timeout=timeout)
+    
+    @property
+    def busy(self):
+        # The in-process queue is bounded by max_pending_classifications in SpeedCamera
+        return False
+    
+    def worker_loop(self):
+        resource_governor.apply_thread('inference')
+        while self.running:
+            try:
+                first = self.requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
+            if first[0] == 'detect':
+                self.run_detection(first)
+                continue
+            
+            batch_size = max(1, int(self.config.get('detection_settings.batch_size', 8)))
+            max_wait = self.config.get('detection_settings.batch_max_wait_ms', 20) / 1000.0
+            deadline = time.time() + max_wait
+            
+            batch = [first]
+            deferred = []
+            while len(batch) < batch_size:
+                remaining = deadline - time.time()
+                try:
+                    item = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.running = False
+                    break
+                if item[0] == 'detect':
+                    deferred.append(item)
+                    continue
+                batch.append(item)
+            
+            self.run_batch(batch)
+            for item in deferred:
+                self.run_detection(item)
+        
+        # Fail anything still waiting so callers don't hang
+        while True:
+            try:
+                item = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[2].set_exception(RuntimeError("Classifier stopped"))
+    
+    def run_batch(self, batch):
+        imgsz = int(self.config.get('detection_settings.batch_imgsz', 320))
+        confidence_threshold = self.config.get('detection_settings.confidence_threshold', 0.5)
+        
+        start = time.time()
+        try:
+            images = [letterbox(crop, imgsz) for _, crop, _ in batch]
+            with self.model_lock:
+                results = self.model(images, imgsz=imgsz, device=self.device, verbose=False)
+            names = self.model.names
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(parse_yolo_result(result, names, confidence_threshold))
+        except Exception as e:
+            with self.lock:
+                self.stats['errors'] += 1
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        
+        elapsed_ms = (time.time() - start) * 1000
+        with self.lock:
+            self.stats['crops'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['total_inference_ms'] += elapsed_ms
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+    
+    def run_detection(self, item):
+        _, image, future = item
+        confidence_threshold = self.config.get('detection_settings.confidence_threshold', 0.5)
+        try:
+            with self.model_lock:
+                results = self.model(image, device=self.device, verbose=False)
+            future.set_result(parse_yolo_boxes(results[0], self.model.names, confidence_threshold))
+        except Exception as e:
+            with self.lock:
+                self.stats['errors'] += 1
+            future.set_exception(e)
+        with self.lock:
+            self.stats['detections'] += 1
+    
+    def get_stats(self):
+        with self.lock:
+            batches = max(1, self.stats['batches'])
+            return {
+                'crops': self.stats['crops'],
+                'batches': self.stats['batches'],
+                'detections': self.stats['detections'],
+                'errors': self.stats['errors'],
+                'avg_batch_size': round(self.stats['crops'] / batches, 2),
+                'max_batch_size': self.stats['max_batch'],
+                'avg_batch_ms': round(self.stats['total_inference_ms'] / batches, 1),
+                'pending': self.requests.qsize()
+            }
+    
+    def stop(self):
+        self.running = False
+        self.requests.put(None)
+        self.worker.join(timeout=5)
+
+def benchmark_batching(model, crops, batch_sizes=(1, 2, 4, 8), imgsz=320, device='cpu', repeats=3):
+    """Crops/second for sequential per-crop calls versus batched calls"""
+    images = [letterbox(crop, imgsz) for crop in crops]
+    results = {}
+    
+    # Warm-up so lazy initialisation isn't measured
+    model(images[:1], imgsz=imgsz, device=device, verbose=False)
+    
+    start = time.time()
+    for _ in range(repeats):
+        for crop in crops:
+            model(crop, device=device, verbose=False)
+    elapsed = time.time() - start
+    results['sequential_original_size'] = len(crops) * repeats / elapsed
+    
+    for batch_size in batch_sizes:
+        start = time.time()
+        for _ in range(repeats):
+            for i in range(0, len(images), batch_size):
+                model(images[i:i + batch_size], imgsz=imgsz, device=device, verbose=False)
+        elapsed = time.time() - start
+        results[f'batch_{batch_size}'] = len(images) * repeats / elapsed
+    
+    return results
+
+def top_detection(detections):
+    return max(detections, key=lambda d: d[1]) if detections else None
+
+def compare_backends(model_path, crops, backends=('onnx', 'openvino'), imgsz=320, int8=False, repeats=3):
+    """Per-crop latency of each backend and how often its top class agrees with PyTorch"""
+    images = [letterbox(crop, imgsz) for crop in crops]
+    confidence_threshold = config_manager.get('detection_settings.confidence_threshold', 0.5)
+    report = {}
+    reference = None
+    
+    for backend in ('pytorch',) + tuple(b for b in backends if b != 'pytorch'):
+        model = load_model(model_path, backend, imgsz, int8)
+        model(images[0], imgsz=imgsz, device='cpu', verbose=False)
+        
+        outputs = []
+        start = time.time()
+        for _ in range(repeats):
+            outputs = [parse_yolo_result(model(image, imgsz=imgsz, device='cpu', verbose=False)[0],
+                                         model.names, confidence_threshold) for image in images]
+        latency_ms = (time.time() - start) * 1000 / (len(images) * repeats)
+        
+        if reference is None:
+            reference = outputs
+        
+        agree = 0
+        confidence_diffs = []
+        for expected, actual in zip(reference, outputs):
+            expected_top, actual_top = top_detection(expected), top_detection(actual)
+            if expected_top is None or actual_top is None:
+                agree += expected_top is None and actual_top is None
+            elif expected_top[0] == actual_top[0]:
+                agree += 1
+                confidence_diffs.append(abs(expected_top[1] - actual_top[1]))
+        
+        report[backend] = {
+            'latency_ms': round(latency_ms, 2),
+            'agreement': round(agree / len(images), 3),
+            'mean_confidence_diff': round(float(np.mean(confidence_diffs)), 4) if confidence_diffs else 0.0
+        }
+    
+    return report
+
+def detect_color_ranges(detector, image):
+    """Original per-range mask color detection, the reference for VehicleColorDetector.detect_color"""
+    if image is None or image.size == 0:
+        return "unknown"
+    
+    try:
+        # Convert to HSV
+        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        
+        # Calculate color percentages
+        color_percentages = {}
+        total_pixels = hsv.shape[0] * hsv.shape[1]
+        
+        for color_name, ranges in detector.color_ranges.items():
+            mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+            
+            for lower, upper in ranges:
+                color_mask = cv2.inRange(hsv, lower, upper)
+                mask = cv2.bitwise_or(mask, color_mask)
+            
+            percentage = (np.sum(mask > 0) / total_pixels) * 100
+            color_percentages[color_name] = percentage
+        
+        # Return the color with highest percentage (minimum 15% to be considered)
+        dominant_color = max(color_percentages, key=color_percentages.get)
+        if color_percentages[dominant_color] > 15:
+            return dominant_color
+        else:
+            return "unknown"
+    except Exception as e:
+        print(f"⚠️ Color detection error: {e}")
+        return "unknown"
+
+def benchmark_color_detection(crops, repeats=20):
+    """Speed of the lookup-table color detector against the per-range masks, and agreement"""
+    from speed_camera import VehicleColorDetector
+    detector = VehicleColorDetector(use_gpu=False)
+    variants = {
+        'ranges': lambda crop: detect_color_ranges(detector, crop),
+        'lookup': lambda crop: detector.detect_color(crop, 1, False),
+        'lookup_subsample_2': lambda crop: detector.detect_color(crop, 2, False),
+        'lookup_subsample_2_weighted': lambda crop: detector.detect_color(crop, 2, True)
+    }
+    reference = [detect_color_ranges(detector, crop) for crop in crops]
+    
+    results = {}
+    for name, detect in variants.items():
+        start = time.time()
+        for _ in range(repeats):
+            colors = [detect(crop) for crop in crops]
+        results[name] = {
+            'ms_per_crop': round((time.time() - start) * 1000 / (len(crops) * repeats), 3),
+            'agreement': round(sum(a == b for a, b in zip(colors, reference)) / len(crops), 3)
+        }
+    return results
+
+def load_sample_crops(count=16, source_dir='detections'):
+    """Vehicle-sized crops from saved detection images, or random noise if there are none"""
+    crops = []
+    rng = np.random.default_rng(0)
+    renditions = tuple(os.path.join(source_dir, kind) + os.sep for kind in RENDITIONS)
+    paths = [path for path in glob.glob(os.path.join(source_dir, '**', '*.jpg'), recursive=True)
+             if not path.startswith(renditions)]
+    for path in sorted(paths)[:count]:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        h, w = image.shape[:2]
+        cw, ch = min(w, 320), min(h, 180)
+        x = int(rng.integers(0, w - cw + 1))
+        y = int(rng.integers(0, h - ch + 1))
+        crops.append(image[y:y + ch, x:x + cw].copy())
+    
+    while len(crops) < count:
+        w, h = int(rng.integers(120, 400)), int(rng.integers(80, 220))
+        crops.append(rng.integers(0, 255, (h, w, 3), dtype=np.uint8))
+    return crops
+
+def main():
+    parser = argparse.ArgumentParser(description="YOLO batching throughput and backend comparison benchmark")
+    parser.add_argument('--model', default=os.path.join('models', config_manager.get('detection_settings.yolo_model', 'yolov8n.pt')))
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--crops', type=int, default=16)
+    parser.add_argument('--imgsz', type=int, default=320)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--compare', nargs='+', choices=BACKENDS, help="compare CPU backends against PyTorch instead")
+    parser.add_argument('--int8', action='store_true', help="use INT8 exports for --compare")
+    parser.add_argument('--color', action='store_true', help="benchmark color detection instead")
+    args = parser.parse_args()
+    
+    if args.color:
+        crops = load_sample_crops(args.crops)
+        print(f"⏱️ Benchmarking color detection on {len(crops)} crops (repeats={args.repeats * 10})")
+        results = benchmark_color_detection(crops, args.repeats * 10)
+        baseline = results['ranges']['ms_per_crop']
+        for name, result in results.items():
+            print(f"   {name:<28} {result['ms_per_crop']:7.3f} ms/crop  ({baseline / result['ms_per_crop']:.2f}x) | "
+                  f"agreement {result['agreement'] * 100:.1f}%")
+        return
+    
+    from ultralytics import YOLO
+    
+    if args.compare:
+        crops = load_sample_crops(args.crops)
+        print(f"⏱️ Comparing backends on {len(crops)} crops (imgsz={args.imgsz}, int8={args.int8})")
+        report = compare_backends(args.model, crops, tuple(args.compare), args.imgsz, args.int8, args.repeats)
+        baseline = report['pytorch']['latency_ms']
+        for backend, result in report.items():
+            print(f"   {backend:<10} {result['latency_ms']:7.1f} ms/crop  ({baseline / result['latency_ms']:.2f}x) | "
+                  f"agreement {result['agreement'] * 100:.1f}% | conf diff {result['mean_confidence_diff']:.3f}")
+        return
+    
+    print(f"🤖 Loading YOLO model: {args.model}")
+    model = YOLO(args.model)
+    crops = load_sample_crops(args.crops)
+    
+    print(f"⏱️ Benchmarking {len(crops)} crops on {args.device} (imgsz={args.imgsz}, repeats={args.repeats})")
+    results = benchmark_batching(model, crops, imgsz=args.imgsz, device=args.device, repeats=args.repeats)
+    baseline = results['sequential_original_size']
+    for name, crops_per_second in results.items():
+        print(f"   {name:<26} {crops_per_second:7.1f} crops/s  ({crops_per_second / baseline:.2f}x)")
+
+if __name__ == "__main__":
+    main()
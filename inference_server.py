@@ -0,0 +1,600 @@
+#!/usr/bin/env python3
+import os
+import sys
+import math
+import time
+import secrets
+import queue
+import threading
+import argparse
+import subprocess
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import Listener, Client
+import cv2
+import numpy as np
+from config_manager import config_manager
+from inference import letterbox, parse_yolo_result, parse_yolo_boxes, model_registry, InferenceBusy
+from resource_governor import resource_governor
+
+def server_address(config=None):
+    config = config or config_manager
+    return (config.get('inference_server.host', '127.0.0.1'), int(config.get('inference_server.port', 6001)))
+
+AUTHKEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference_server.key')
+
+def server_authkey(config=None):
+    """inference_server.authkey, or a random key generated once per install (readable only by its owner).
+    
+    Connections exchange pickles, so anyone with the key can run code in the
+    server; 'speed-camera', the key older versions shipped with, counts as unset.
+    """
+    config = config or config_manager
+    configured = str(config.get('inference_server.authkey', '') or '')
+    if configured and configured != 'speed-camera':
+        return configured.encode()
+    
+    try:
+        fd = os.open(AUTHKEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Created by the server or another camera; it may still be writing it
+        for _ in range(50):
+            with open(AUTHKEY_FILE, 'rb') as f:
+                key = f.read().strip()
+            if key:
+                return key
+            time.sleep(0.02)
+        raise RuntimeError(f"Inference server key file {AUTHKEY_FILE} is empty")
+    key = secrets.token_hex(32).encode()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+def attach_shared_memory(name):
+    """Open a client's segment without letting this process unlink it on exit"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+class ClientSession:
+    """Server-side state of one connected pipeline"""
+    
+    def __init__(self, conn, name, shm, slot_bytes, model, spec):
+        self.conn = conn
+        self.name = name
+        self.shm = shm
+        self.slot_bytes = slot_bytes
+        self.model = model
+        self.spec = spec
+        self.requests = deque()
+        self.send_lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'completed': 0,
+            'rejected': 0
+        }
+    
+    def image(self, slot, shape):
+        """Copy of the image a client wrote into one of its slots"""
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes).copy()
+    
+    def send(self, message):
+        with self.send_lock:
+            try:
+                self.conn.send(message)
+            except (OSError, EOFError):
+                pass
+
+class InferenceServer:
+    """Owns the YOLO models and classifies crops for pipelines in other processes.
+    
+    Clients write images into their own shared-memory slots and send only the
+    slot number over a local connection. Crops from all clients are batched
+    together, taking one request per client in turn so a busy camera cannot
+    starve the others. A client with more than inference_server.max_client_pending
+    queued requests gets an immediate 'busy' reply instead of a longer queue.
+    
+    The server runs as its own process, so the web app can restart without
+    reloading the model.
+    """
+    
+    def __init__(self, config=None):
+        self.config = config or config_manager
+        self.sessions = []
+        self.condition = threading.Condition()
+        self.next_session = 0
+        self.running = False
+        self.stats = {
+            'batches': 0,
+            'crops': 0,
+            'detections': 0,
+            'errors': 0
+        }
+    
+    def load_model(self, spec):
+        try:
+            return model_registry.get(spec['model_path'], spec['backend'], spec['imgsz'], spec['int8'],
+                                      spec['device'], spec.get('warmup_batch', 8))
+        except Exception as e:
+            if spec['backend'] == 'pytorch':
+                raise
+            print(f"⚠️ {spec['backend']} backend unavailable ({e}), falling back to PyTorch")
+            spec['backend'] = 'pytorch'
+            return model_registry.get(spec['model_path'], 'pytorch', spec['imgsz'], False,
+                                      spec['device'], spec.get('warmup_batch', 8))
+    
+    def serve_forever(self):
+        self.running = True
+        threading.Thread(target=self.scheduler_loop, daemon=True, name='inference-scheduler').start()
+        
+        address = server_address(self.config)
+        with Listener(address, authkey=server_authkey(self.config)) as listener:
+            print(f"🧠 Inference server listening on {address[0]}:{address[1]} (pid {os.getpid()})")
+            while self.running:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"⚠️ Inference server: rejected connection ({e})")
+                    continue
+                threading.Thread(target=self.handle_client, args=(conn,), daemon=True).start()
+    
+    def handle_client(self, conn):
+        session = None
+        try:
+            message = conn.recv()
+            if message[0] != 'hello':
+                return
+            _, name, shm_name, slot_bytes, spec = message
+            model = self.load_model(spec)
+            session = ClientSession(conn, name, attach_shared_memory(shm_name), slot_bytes, model, spec)
+            with self.condition:
+                self.sessions.append(session)
+            session.send(('ready', {'pid': os.getpid(), 'backend': spec['backend']}))
+            print(f"🔌 Inference client connected: {name} ({spec['model_path']}, {spec['backend']})")
+            
+            max_pending = int(self.config.get('inference_server.max_client_pending', 16))
+            while True:
+                message = conn.recv()
+                if message[0] == 'bye':
+                    break
+                
+                with self.condition:
+                    busy = len(session.requests) >= max_pending
+                    if not busy:
+                        session.requests.append(message)
+                        session.stats['requests'] += 1
+                        self.condition.notify()
+                    pending = self.pending_count()
+                
+                if busy:
+                    session.stats['rejected'] += 1
+                    session.send(('busy', message[1], pending))
+        except (EOFError, OSError):
+            pass
+        except Exception as e:
+            print(f"⚠️ Inference client error: {e}")
+            try:
+                conn.send(('error', None, str(e)))
+            except (OSError, EOFError):
+                pass
+        finally:
+            if session is not None:
+                with self.condition:
+                    self.sessions.remove(session)
+                    session.requests.clear()
+                    session.shm.close()
+                print(f"🔌 Inference client disconnected: {session.name} "
+                      f"({session.stats['completed']} done, {session.stats['rejected']} rejected)")
+            conn.close()
+    
+    def pending_count(self):
+        return sum(len(session.requests) for session in self.sessions)
+    
+    def next_batch(self):
+        """Next unit of work, visiting clients round-robin (call with the condition held)"""
+        sessions = list(self.sessions)
+        count = len(sessions)
+        start = next((i for i in range(count) if sessions[(self.next_session + i) % count].requests), None)
+        if start is None:
+            return []
+        start = (self.next_session + start) % count
+        self.next_session = (start + 1) % count
+        
+        first = sessions[start]
+        if first.requests[0][0] == 'detect':
+            message = first.requests.popleft()
+            return [(first, message, first.image(message[2], message[3]))]
+        
+        # One crop per client per pass, from every client using the same model and size
+        batch_size = max(1, int(self.config.get('detection_settings.batch_size', 8)))
+        batch = []
+        while len(batch) < batch_size:
+            added = False
+            for i in range(count):
+                session = sessions[(start + i) % count]
+                if len(batch) >= batch_size or not session.requests:
+                    continue
+                if session.requests[0][0] != 'classify' or session.model is not first.model:
+                    continue
+                if session.spec['imgsz'] != first.spec['imgsz']:
+                    continue
+                message = session.requests.popleft()
+                batch.append((session, message, session.image(message[2], message[3])))
+                added = True
+            if not added:
+                break
+        return batch
+    
+    def scheduler_loop(self):
+        resource_governor.apply_thread('inference')
+        last_report = time.time()
+        while self.running:
+            with self.condition:
+                while self.running and not self.pending_count():
+                    self.condition.wait(0.5)
+                pending = self.pending_count()
+            
+            # Give other pipelines a moment to add crops to this batch
+            batch_size = max(1, int(self.config.get('detection_settings.batch_size', 8)))
+            if pending < batch_size:
+                time.sleep(self.config.get('detection_settings.batch_max_wait_ms', 20) / 1000.0)
+            
+            with self.condition:
+                batch = self.next_batch()
+            if batch:
+                self.run_batch(batch)
+            
+            if time.time() - last_report > 60:
+                last_report = time.time()
+                stats = self.get_stats()
+                print(f"📊 Inference server: {stats['clients']} clients | {stats['crops']} crops in "
+                      f"{stats['batches']} batches | {stats['detections']} detections | pending {stats['pending']}")
+    
+    def run_batch(self, batch):
+        first, first_message, _ = batch[0]
+        model = first.model
+        confidence_threshold = self.config.get('detection_settings.confidence_threshold', 0.5)
+        
+        try:
+            with model_registry.lock_for(model):
+                if first_message[0] == 'detect':
+                    results = model(batch[0][2], device=first.spec['device'], verbose=False)
+                    outputs = [parse_yolo_boxes(results[0], model.names, confidence_threshold)]
+                else:
+                    images = [image for _, _, image in batch]
+                    results = model(images, imgsz=first.spec['imgsz'], device=first.spec['device'], verbose=False)
+                    outputs = [parse_yolo_result(result, model.names, confidence_threshold) for result in results]
+        except Exception as e:
+            self.stats['errors'] += 1
+            for session, message, _ in batch:
+                session.send(('error', message[1], str(e)))
+            return
+        
+        if first_message[0] == 'detect':
+            self.stats['detections'] += 1
+        else:
+            self.stats['batches'] += 1
+            self.stats['crops'] += len(batch)
+        
+        with self.condition:
+            pending = self.pending_count()
+        for (session, message, _), output in zip(batch, outputs):
+            session.stats['completed'] += 1
+            session.send(('result', message[1], output, pending))
+    
+    def get_stats(self):
+        with self.condition:
+            clients = {session.name: dict(session.stats, pending=len(session.requests)) for session in self.sessions}
+            pending = self.pending_count()
+        return dict(self.stats, clients=len(clients), pending=pending, per_client=clients,
+                    avg_batch_size=round(self.stats['crops'] / max(1, self.stats['batches']), 2))
+
+class InferenceClient:
+    """BatchClassifier replacement that sends crops to a shared InferenceServer.
+    
+    Crops are letterboxed here and written into a shared-memory slot; only the
+    slot number goes over the connection. With no free slot, or when the
+    server reports this client's queue as full, the Future fails with
+    InferenceBusy so the caller can log the track without YOLO. The same
+    happens while the server is unreachable: the client reconnects with
+    backoff (restarting the server if autostart is on) in the background.
+    """
+    
+    def __init__(self, spec, name, config=None):
+        self.config = config or config_manager
+        self.name = name
+        self.spec = dict(spec)
+        self.imgsz = spec['imgsz']
+        self.slot_bytes = int(self.config.get('inference_server.slot_bytes', 4 * 1024 * 1024))
+        slots = int(self.config.get('inference_server.slots', 16))
+        
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_bytes * slots)
+        self.free_slots = queue.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+        
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.futures = {}  # request id -> (future, slot, scale, submitted)
+        self.next_id = 0
+        self.server_pending = 0
+        self.conn = None
+        self.connected = False
+        self.stopped = threading.Event()
+        self.stats = {
+            'crops': 0,
+            'detections': 0,
+            'completed': 0,
+            'busy': 0,
+            'errors': 0,
+            'reconnects': 0,
+            'total_latency_ms': 0.0
+        }
+        
+        try:
+            self.connect()
+        except Exception:
+            self.shm.close()
+            self.shm.unlink()
+            raise
+        
+        self.running = True
+        self.receiver = threading.Thread(target=self.receive_loop, daemon=True, name='inference-client')
+        self.receiver.start()
+    
+    def connect(self):
+        """Open a connection and register this client's shared memory with the server"""
+        conn = Client(server_address(self.config), authkey=server_authkey(self.config))
+        try:
+            conn.send(('hello', self.name, self.shm.name, self.slot_bytes, self.spec))
+            reply = conn.recv()
+            if reply[0] != 'ready':
+                raise RuntimeError(f"Inference server refused connection: {reply[-1]}")
+        except Exception:
+            conn.close()
+            raise
+        with self.send_lock:
+            self.conn = conn
+        with self.lock:
+            self.server_pending = 0
+            self.connected = True
+    
+    def submit(self, crop):
+        future = Future()
+        if crop is None or crop.size == 0:
+            future.set_result([])
+            return future
+        with self.lock:
+            self.stats['crops'] += 1
+        return self.send_image('classify', letterbox(crop, self.imgsz), future)
+    
+    def submit_detection(self, image):
+        future = Future()
+        scale = 1.0
+        if image.nbytes > self.slot_bytes:
+            scale = math.sqrt(self.slot_bytes / image.nbytes) * 0.99
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        with self.lock:
+            self.stats['detections'] += 1
+        return self.send_image('detect', image, future, scale)
+    
+    def classify(self, crop, timeout=None):
+        return self.submit(crop).result(timeout=timeout)
+    
+    def send_image(self, kind, image, future, scale=1.0):
+        if not self.running:
+            future.set_exception(RuntimeError("Inference client stopped"))
+            return future
+        if not self.connected:
+            future.set_exception(InferenceBusy("Inference server disconnected"))
+            return future
+        try:
+            slot = self.free_slots.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                self.stats['busy'] += 1
+            future.set_exception(InferenceBusy("No free shared-memory slots"))
+            return future
+        
+        image = np.ascontiguousarray(image)
+        np.ndarray(image.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)[...] = image
+        with self.lock:
+            # Checked again under the lock: fail_pending() may have run since
+            if not self.connected:
+                self.free_slots.put(slot)
+                future.set_exception(InferenceBusy("Inference server disconnected"))
+                return future
+            request_id = self.next_id
+            self.next_id += 1
+            self.futures[request_id] = (future, slot, scale, time.time())
+        
+        try:
+            with self.send_lock:
+                self.conn.send((kind, request_id, slot, image.shape))
+        except (OSError, EOFError):
+            # The receive loop notices the lost connection and fails whatever is still pending
+            with self.lock:
+                entry = self.futures.pop(request_id, None)
+            if entry is not None:
+                self.free_slots.put(slot)
+                future.set_exception(InferenceBusy("Inference server disconnected"))
+        return future
+    
+    def receive_loop(self):
+        while self.running:
+            self.receive_messages()
+            if not self.running:
+                break
+            print("⚠️ Lost connection to inference server - logging vehicles without YOLO until it is back")
+            self.fail_pending(InferenceBusy("Inference server disconnected"))
+            self.reconnect()
+        self.fail_pending(RuntimeError("Inference client stopped"))
+    
+    def fail_pending(self, error):
+        with self.lock:
+            self.connected = False
+            entries = list(self.futures.values())
+            self.futures.clear()
+        for future, slot, _, _ in entries:
+            self.free_slots.put(slot)
+            future.set_exception(error)
+    
+    def reconnect(self):
+        """Retry with backoff until the server is back or the client is stopped"""
+        backoff = 1.0
+        started_server = False
+        while not self.stopped.wait(backoff):
+            try:
+                self.connect()
+            except ConnectionRefusedError:
+                # Nothing listening: the server process is gone, so start a new one (once)
+                if not started_server and self.config.get('inference_server.autostart', True):
+                    start_server_process()
+                    started_server = True
+            except Exception as e:
+                print(f"⚠️ Inference server reconnect failed: {e}")
+            else:
+                if not self.running:
+                    self.conn.close()
+                    return
+                with self.lock:
+                    self.stats['reconnects'] += 1
+                print("🔌 Reconnected to inference server")
+                return
+            backoff = min(backoff * 2, 30)
+    
+    def receive_messages(self):
+        while self.running:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                return
+            
+            with self.lock:
+                entry = self.futures.pop(message[1], None)
+            if entry is None:
+                continue
+            future, slot, scale, submitted = entry
+            self.free_slots.put(slot)
+            
+            if message[0] == 'result':
+                output = message[2]
+                self.server_pending = message[3]
+                if scale != 1.0:
+                    output = [(name, conf, [v / scale for v in box]) for name, conf, box in output]
+                with self.lock:
+                    self.stats['completed'] += 1
+                    self.stats['total_latency_ms'] += (time.time() - submitted) * 1000
+                future.set_result(output)
+            elif message[0] == 'busy':
+                self.server_pending = message[2]
+                with self.lock:
+                    self.stats['busy'] += 1
+                future.set_exception(InferenceBusy("Inference server busy"))
+            else:
+                with self.lock:
+                    self.stats['errors'] += 1
+                future.set_exception(RuntimeError(message[2]))
+    
+    @property
+    def busy(self):
+        """Back-pressure signal: the server is unreachable, its queue for this client is full or no slot is free"""
+        max_pending = int(self.config.get('inference_server.max_client_pending', 16))
+        return not self.connected or self.server_pending >= max_pending or self.free_slots.empty()
+    
+    def get_stats(self):
+        with self.lock:
+            completed = max(1, self.stats['completed'])
+            return {
+                'server': f"{server_address(self.config)[0]}:{server_address(self.config)[1]}",
+                'connected': self.connected,
+                'reconnects': self.stats['reconnects'],
+                'crops': self.stats['crops'],
+                'detections': self.stats['detections'],
+                'completed': self.stats['completed'],
+                'busy': self.stats['busy'],
+                'errors': self.stats['errors'],
+                'avg_latency_ms': round(self.stats['total_latency_ms'] / completed, 1),
+                'in_flight': len(self.futures),
+                'server_pending': self.server_pending
+            }
+    
+    def stop(self):
+        if self.running:
+            self.running = False
+            self.stopped.set()
+            try:
+                with self.send_lock:
+                    self.conn.send(('bye',))
+            except (OSError, EOFError):
+                pass
+        self.conn.close()
+        self.receiver.join(timeout=5)
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+def start_server_process():
+    # Own session, so the server keeps running (with its model loaded) when the web app restarts
+    print("🚀 Starting inference server process...")
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    subprocess.Popen([sys.executable, os.path.join(base_dir, 'inference_server.py')],
+                     cwd=base_dir, start_new_session=True)
+
+def connect_inference_server(spec, name, config=None):
+    """InferenceClient for the shared server, starting the server process if needed"""
+    config = config or config_manager
+    try:
+        return InferenceClient(spec, name, config)
+    except ConnectionRefusedError:
+        if not config.get('inference_server.autostart', True):
+            raise
+    
+    start_server_process()
+    deadline = time.time() + float(config.get('inference_server.startup_timeout', 30))
+    while True:
+        time.sleep(0.5)
+        try:
+            return InferenceClient(spec, name, config)
+        except ConnectionRefusedError:
+            if time.time() > deadline:
+                raise
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared YOLO inference server for speed camera pipelines")
+    parser.add_argument('--preload', action='store_true', help="load the configured model before accepting clients")
+    args = parser.parse_args()
+    
+    resource_governor.apply_startup()
+    server = InferenceServer()
+    if args.preload:
+        model_name = config_manager.get('detection_settings.yolo_model', 'yolov8x.pt')
+        use_gpu = config_manager.get('detection_settings.use_gpu', True)
+        try:
+            import torch
+            use_gpu = use_gpu and torch.cuda.is_available()
+        except ImportError:
+            use_gpu = False
+        server.load_model({
+            'model_path': os.path.abspath(os.path.join('models', model_name)),
+            'backend': config_manager.get('detection_settings.inference_backend', 'pytorch'),
+            'imgsz': int(config_manager.get('detection_settings.batch_imgsz', 320)),
+            'int8': config_manager.get('detection_settings.inference_int8', False),
+            'device': 'cuda:0' if use_gpu else 'cpu',
+            'warmup_batch': int(config_manager.get('detection_settings.batch_size', 8))
+        })
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Inference server stopped")
+
+if __name__ == "__main__":
+    main()
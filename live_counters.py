@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import time
+import threading
+from config_manager import config_manager
+
+COUNTERS = ('detections', 'images', 'image_bytes', 'frames', 'decode_errors', 'errors')
+
+class LiveCounters:
+    """Running totals behind /api/status.
+    
+    The code that writes or deletes something adds to the counters as it goes,
+    so reading them never touches the disk. A background thread samples memory
+    use every status.sample_interval seconds and, every status.reconcile_interval
+    seconds, resets the counters from their registered sources (the detection
+    store, a walk of the image folder) to correct any drift.
+    """
+    
+    def __init__(self, config=None):
+        self.config = config or config_manager
+        self.lock = threading.Lock()
+        self.values = {name: 0 for name in COUNTERS}
+        self.memory_percent = 0.0
+        self.sources = {}
+        self.reconciled = {'at': None, 'ms': 0.0, 'drift': {}}
+        self.thread = None
+    
+    def add(self, name, amount=1):
+        with self.lock:
+            self.values[name] = self.values.get(name, 0) + amount
+    
+    def register(self, name, source):
+        """source() returns the true values of some counters, e.g. {'detections': 1234}"""
+        with self.lock:
+            self.sources[name] = source
+    
+    def reconcile(self):
+        started = time.time()
+        with self.lock:
+            sources = dict(self.sources)
+        
+        drift = {}
+        for name, source in sources.items():
+            try:
+                values = source()
+            except Exception as e:
+                print(f"⚠️ Could not reconcile {name} counters: {e}")
+                continue
+            with self.lock:
+                for counter, value in values.items():
+                    if self.values.get(counter, 0) != value:
+                        drift[counter] = value - self.values.get(counter, 0)
+                    self.values[counter] = value
+        
+        with self.lock:
+            self.reconciled = {'at': time.time(), 'ms': round((time.time() - started) * 1000, 1), 'drift': drift}
+    
+    def sample(self):
+        import psutil
+        self.memory_percent = psutil.virtual_memory().percent
+    
+    def start(self):
+        """Reconcile right away, then keep sampling and reconciling in the background"""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, daemon=True, name='live-counters')
+        self.thread.start()
+    
+    def run(self):
+        next_reconcile = 0.0
+        while True:
+            try:
+                self.sample()
+                if time.time() >= next_reconcile:
+                    self.reconcile()
+                    next_reconcile = time.time() + self.config.get('status.reconcile_interval', 300)
+            except Exception as e:
+                print(f"⚠️ Live counters: {e}")
+            time.sleep(self.config.get('status.sample_interval', 5))
+    
+    def snapshot(self):
+        with self.lock:
+            return {**self.values, 'memory_percent': self.memory_percent, 'reconciled': dict(self.reconciled)}
+
+# Global live counters instance
+live_counters = LiveCounters()
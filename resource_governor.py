@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import os
+import threading
+import cv2
+from config_manager import config_manager
+
+STAGES = ('decode', 'motion', 'inference', 'classify', 'encoding', 'web')
+
+class ResourceGovernor:
+    """Thread counts, CPU affinity and nice levels for each pipeline stage.
+    
+    resource_governor.stages.<stage> may set 'threads', 'cpus' (list of core
+    ids) and 'nice'. Thread pools are sized once by apply_startup(). Affinity
+    and nice are per thread on Linux, so every stage calls apply_thread() from
+    its own thread; threads it starts afterwards inherit them.
+    """
+    
+    def __init__(self, config=None):
+        self.config = config or config_manager
+        self.lock = threading.Lock()
+        self.started = False
+        self.startup_errors = []
+        self.applied = {stage: {'threads': [], 'errors': []} for stage in STAGES}
+    
+    @property
+    def enabled(self):
+        return self.config.get('resource_governor.enabled', False)
+    
+    def stage(self, name):
+        return self.config.get(f'resource_governor.stages.{name}', {}) or {}
+    
+    def threads(self, name, default=None):
+        """Configured thread count for a stage, or default when unset or disabled"""
+        if not self.enabled:
+            return default
+        return self.stage(name).get('threads') or default
+    
+    def apply_startup(self):
+        """Size the process-wide thread pools (call before the first frame or model load)"""
+        with self.lock:
+            if self.started or not self.enabled:
+                return
+            self.started = True
+        
+        # Read by OpenCV's FFmpeg backend whenever a capture is opened
+        decode_threads = self.stage('decode').get('threads')
+        if decode_threads and 'OPENCV_FFMPEG_CAPTURE_OPTIONS' not in os.environ:
+            os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = f"threads;{int(decode_threads)}"
+        
+        motion_threads = self.stage('motion').get('threads')
+        if motion_threads is not None:
+            cv2.setNumThreads(int(motion_threads))
+        
+        inference = self.stage('inference')
+        if inference.get('threads') or inference.get('interop_threads'):
+            try:
+                import torch
+                if inference.get('threads'):
+                    torch.set_num_threads(int(inference['threads']))
+                if inference.get('interop_threads'):
+                    torch.set_num_interop_threads(int(inference['interop_threads']))
+            except ImportError:
+                pass
+            except RuntimeError as e:
+                # Interop threads can only be set before Torch runs anything in parallel
+                self.startup_errors.append(f"torch: {e}")
+        
+        process = self.get_info()['process']
+        print(f"⚙️ Resource governor: OpenCV {process['cv2_threads']} threads | "
+              f"Torch {process.get('torch_threads', '-')} threads | "
+              f"FFmpeg {process['ffmpeg_capture_options'] or 'default'}")
+    
+    def apply_thread(self, name):
+        """Pin the calling thread to its stage's cores and nice level"""
+        if not self.enabled:
+            return
+        settings = self.stage(name)
+        errors = []
+        
+        cpus = settings.get('cpus')
+        if cpus and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, set(cpus))  # 0 is the calling thread on Linux
+            except OSError as e:
+                errors.append(f"affinity {cpus}: {e}")
+        
+        nice = settings.get('nice')
+        if nice is not None and hasattr(os, 'setpriority'):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), int(nice))
+            except OSError as e:
+                # Lowering nice below the current value needs CAP_SYS_NICE
+                errors.append(f"nice {nice}: {e}")
+        
+        with self.lock:
+            applied = self.applied.setdefault(name, {'threads': [], 'errors': []})
+            thread_name = threading.current_thread().name
+            if thread_name not in applied['threads']:
+                applied['threads'] = (applied['threads'] + [thread_name])[-16:]
+            applied['errors'] = (applied['errors'] + errors)[-16:]
+        
+        for error in errors:
+            print(f"⚠️ Resource governor ({name}): {error}")
+    
+    def get_info(self):
+        """Configured and effective settings, for /api/system/info"""
+        process = {
+            'cv2_threads': cv2.getNumThreads(),
+            'ffmpeg_capture_options': os.environ.get('OPENCV_FFMPEG_CAPTURE_OPTIONS', ''),
+            'errors': list(self.startup_errors)
+        }
+        try:
+            import torch
+            process['torch_threads'] = torch.get_num_threads()
+            process['torch_interop_threads'] = torch.get_num_interop_threads()
+        except ImportError:
+            pass
+        
+        with self.lock:
+            stages = {name: {
+                'configured': self.stage(name),
+                'threads': list(applied['threads']),
+                'errors': list(applied['errors'])
+            } for name, applied in self.applied.items()}
+        
+        return {
+            'enabled': self.enabled,
+            'cpu_count': os.cpu_count(),
+            'available_cpus': sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None,
+            'process': process,
+            'stages': stages
+        }
+
+# Global resource governor instance
+resource_governor = ResourceGovernor()
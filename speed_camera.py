@@ -9,10 +9,18 @@ import torch
 import threading
 import queue
 from datetime import datetime
-from ultralytics import YOLO
+from dataclasses import dataclass, asdict
 import torch
 from concurrent.futures import ThreadPoolExecutor
 from config_manager import config_manager
+from inference import (BatchClassifier, CascadeClassifier, ClassificationCache, InferenceBusy,
+                       appearance_fingerprint, box_iou, model_registry)
+from inference_server import connect_inference_server
+from resource_governor import resource_governor
+from detection_output import DETECTION_CSV_HEADERS, ImageJob, ImageWriterPool, clip_filename, upgrade_csv_header
+from detection_store import open_detection_store
+from live_counters import live_counters
+from clip_recorder import ClipRecorder
 
 class FrameBuffer:
     def __init__(self, maxsize=30):
@@ -39,6 +47,7 @@ class FrameBuffer:
     def add_error(self):
         with self.lock:
             self.error_count += 1
+        live_counters.add('decode_errors')
     
     def get_stats(self):
         with self.lock:
@@ -49,9 +58,419 @@ class FrameBuffer:
                 'error_rate': self.error_count / max(1, self.total_frames) * 100
             }
 
+# Track lifecycle events published by SpeedCamera
+@dataclass(frozen=True)
+class TrackEvent:
+    track_id: int
+    timestamp: float
+    
+    event_type = 'track_event'
+    
+    def to_dict(self):
+        data = asdict(self)
+        data['event'] = self.event_type
+        return data
+
+@dataclass(frozen=True)
+class TrackCreated(TrackEvent):
+    x: int = 0
+    y: int = 0
+    w: int = 0
+    h: int = 0
+    stitched: bool = False
+    
+    event_type = 'track_created'
+
+@dataclass(frozen=True)
+class LineCrossed(TrackEvent):
+    line_name: str = ''
+    direction: str = ''
+    
+    event_type = 'line_crossed'
+
+@dataclass(frozen=True)
+class SpeedMeasured(TrackEvent):
+    speed_kmh: float = 0.0
+    speed_mph: float = 0.0
+    direction: str = ''
+    
+    event_type = 'speed_measured'
+
+@dataclass(frozen=True)
+class Classified(TrackEvent):
+    object_type: str = ''
+    object_color: str = ''
+    confidence: float = 0.0
+    
+    event_type = 'classified'
+
+@dataclass(frozen=True)
+class TrackClosed(TrackEvent):
+    reason: str = ''  # logged, rejected, timeout, lost
+    logged: bool = False
+    image_file: str = ''
+    
+    event_type = 'track_closed'
+
+class EventSubscription:
+    
+    def __init__(self, name, event_types=None, maxsize=256):
+        self.name = name
+        self.event_types = set(event_types) if event_types else None
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.maxsize = maxsize
+        self.delivered = 0
+        self.dropped = 0
+    
+    def wants(self, event):
+        return self.event_types is None or event.event_type in self.event_types
+    
+    def offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+            self.delivered += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+    
+    def get(self, timeout=1.0):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def get_stats(self):
+        return {
+            'name': self.name,
+            'event_types': sorted(self.event_types) if self.event_types else 'all',
+            'queue_size': self.queue.qsize(),
+            'maxsize': self.maxsize,
+            'delivered': self.delivered,
+            'dropped': self.dropped
+        }
+
+class EventBus:
+    """Fan-out of track events to bounded subscriber queues.
+    
+    publish() never blocks: when a subscriber's queue is full the event is
+    dropped for that subscriber and counted, so a slow consumer cannot stall
+    the frame loop.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = ()
+        self.published = 0
+    
+    def subscribe(self, name, event_types=None, maxsize=256):
+        subscription = EventSubscription(name, event_types, maxsize)
+        with self.lock:
+            self.subscriptions = self.subscriptions + (subscription,)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions = tuple(s for s in self.subscriptions if s is not subscription)
+    
+    def publish(self, event):
+        self.published += 1
+        for subscription in self.subscriptions:
+            if subscription.wants(event):
+                subscription.offer(event)
+    
+    def get_stats(self):
+        subscriptions = [s.get_stats() for s in self.subscriptions]
+        return {
+            'published': self.published,
+            'dropped': sum(s['dropped'] for s in subscriptions),
+            'subscribers': subscriptions
+        }
+
+class GroundPlaneCalibration:
+    """Maps image pixels to road-plane metres through a homography.
+    
+    The homography is fitted from four or more image/ground point pairs in
+    calibration_settings.homography_points and every pixel of the detection
+    area is converted up front, so looking up a track point is a single
+    array index.
+    """
+    
+    def __init__(self, config=None):
+        self.config = config or config_manager
+        self.homography = None
+        self.lut = None
+        self.origin = (0, 0)
+        self._signature = None
+        self.refresh()
+    
+    @property
+    def enabled(self):
+        return self.lut is not None
+    
+    def refresh(self):
+        """Rebuild the lookup table if the calibration or detection area changed"""
+        mode = self.config.get('calibration_settings.mode', 'scalar')
+        points = self.config.get('calibration_settings.homography_points', [])
+        area = (
+            self.config.get('detection_zones.detection_area_top', 300),
+            self.config.get('detection_zones.detection_area_bottom', 590),
+            self.config.get('detection_zones.detection_area_left', 100),
+            self.config.get('detection_zones.detection_area_right', 1820)
+        )
+        
+        signature = (mode, repr(points), area)
+        if signature == self._signature:
+            return self.enabled
+        self._signature = signature
+        
+        self.homography = None
+        self.lut = None
+        
+        if mode != 'homography':
+            return False
+        
+        if len(points) < 4:
+            print(f"⚠️ Homography calibration needs at least 4 point pairs, got {len(points)} - using scalar calibration")
+            return False
+        
+        try:
+            src = np.float32([p['image'] for p in points])
+            dst = np.float32([p['ground'] for p in points])
+            homography, _ = cv2.findHomography(src, dst)
+            if homography is None:
+                print("⚠️ Homography calibration failed (degenerate points) - using scalar calibration")
+                return False
+            
+            top, bottom, left, right = area
+            xs, ys = np.meshgrid(np.arange(left, right, dtype=np.float32),
+                                 np.arange(top, bottom, dtype=np.float32))
+            pixels = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2)
+            ground = cv2.perspectiveTransform(pixels, homography)
+            
+            self.homography = homography
+            self.lut = ground.reshape(bottom - top, right - left, 2).astype(np.float32)
+            self.origin = (left, top)
+            print(f"📐 Homography calibration ready: {len(points)} points, "
+                  f"{right - left}x{bottom - top}px lookup table ({self.lut.nbytes / 1e6:.1f} MB)")
+        except Exception as e:
+            print(f"⚠️ Homography calibration error: {e}")
+            self.homography = None
+            self.lut = None
+        
+        return self.enabled
+    
+    def to_ground(self, x, y):
+        """Ground coordinates in metres for an image point (clamped to the detection area)"""
+        height, width = self.lut.shape[:2]
+        ix = min(max(int(round(x)) - self.origin[0], 0), width - 1)
+        iy = min(max(int(round(y)) - self.origin[1], 0), height - 1)
+        return self.lut[iy, ix]
+    
+    def to_ground_many(self, points):
+        """Vectorised to_ground for an (N, 2) array of image points"""
+        points = np.asarray(points)
+        height, width = self.lut.shape[:2]
+        ix = np.clip(np.rint(points[:, 0]).astype(np.int32) - self.origin[0], 0, width - 1)
+        iy = np.clip(np.rint(points[:, 1]).astype(np.int32) - self.origin[1], 0, height - 1)
+        return self.lut[iy, ix]
+    
+    def ground_distance(self, p1, p2):
+        """Distance in metres between two image points"""
+        g1 = self.to_ground(p1[0], p1[1])
+        g2 = self.to_ground(p2[0], p2[1])
+        return float(np.hypot(g2[0] - g1[0], g2[1] - g1[1]))
+
+class CountingLine:
+    
+    DIRECTIONS = ('L2R', 'R2L', 'T2B', 'B2T', 'any')
+    
+    def __init__(self, name, points, direction='any', color=(0, 255, 255)):
+        self.name = name
+        self.points = [(int(x), int(y)) for x, y in points]
+        self.direction = direction if direction in self.DIRECTIONS else 'any'
+        self.color = tuple(color)
+        
+        self.count = 0
+        self.speed_count = 0
+        self.speed_sum = 0.0
+        self.max_speed = 0.0
+        self.last_speed = 0.0
+    
+    def record_crossing(self):
+        self.count += 1
+    
+    def record_speed(self, speed_kmh):
+        self.speed_count += 1
+        self.speed_sum += speed_kmh
+        self.max_speed = max(self.max_speed, speed_kmh)
+        self.last_speed = speed_kmh
+    
+    def get_stats(self):
+        return {
+            'name': self.name,
+            'direction': self.direction,
+            'crossings': self.count,
+            'measured': self.speed_count,
+            'avg_speed_kmh': round(self.speed_sum / self.speed_count, 1) if self.speed_count else 0,
+            'max_speed_kmh': round(self.max_speed, 1),
+            'last_speed_kmh': round(self.last_speed, 1)
+        }
+
+class CountingLineSet:
+    """All counting lines of a camera, tested against every track in one pass.
+    
+    Lines come from detection_zones.counting_lines (each a polyline with an
+    optional direction filter). Without that list the legacy vertical
+    l2r_line_x / r2l_line_x lines are used.
+    """
+    
+    def __init__(self, config=None):
+        self.config = config or config_manager
+        self.lines = []
+        self._seg_start = np.zeros((0, 2), dtype=np.float32)
+        self._seg_end = np.zeros((0, 2), dtype=np.float32)
+        self._seg_line = np.zeros(0, dtype=np.int32)
+        self._signature = None
+        self.refresh()
+    
+    def refresh(self):
+        """Rebuild the line set when the zone configuration changed"""
+        zones = self.config.get('detection_zones', {}) or {}
+        custom_lines = zones.get('counting_lines') or []
+        signature = repr(custom_lines) if custom_lines else repr(sorted(zones.items()))
+        if signature == self._signature:
+            return
+        self._signature = signature
+        
+        # Keep counters for lines that survive a config edit
+        previous = {line.name: line for line in self.lines}
+        lines = []
+        
+        if custom_lines:
+            for i, spec in enumerate(custom_lines):
+                if not spec.get('enabled', True) or len(spec.get('points', [])) < 2:
+                    continue
+                name = spec.get('name', f"line_{i + 1}")
+                lines.append(CountingLine(name, spec['points'], spec.get('direction', 'any'),
+                                          spec.get('color', (0, 255, 255))))
+        else:
+            top = zones.get('detection_area_top', 300)
+            bottom = zones.get('detection_area_bottom', 590)
+            if zones.get('l2r_enabled', True):
+                x = zones.get('l2r_line_x', 400)
+                lines.append(CountingLine('L2R', [(x, top), (x, bottom)], 'L2R', (0, 255, 255)))
+            if zones.get('r2l_enabled', True):
+                x = zones.get('r2l_line_x', 1400)
+                lines.append(CountingLine('R2L', [(x, top), (x, bottom)], 'R2L', (255, 0, 255)))
+        
+        for line in lines:
+            old = previous.get(line.name)
+            if old is not None:
+                line.count, line.speed_count, line.speed_sum = old.count, old.speed_count, old.speed_sum
+                line.max_speed, line.last_speed = old.max_speed, old.last_speed
+        
+        seg_start, seg_end, seg_line = [], [], []
+        for idx, line in enumerate(lines):
+            for a, b in zip(line.points[:-1], line.points[1:]):
+                seg_start.append(a)
+                seg_end.append(b)
+                seg_line.append(idx)
+        
+        self.lines = lines
+        self._seg_start = np.array(seg_start, dtype=np.float32).reshape(-1, 2)
+        self._seg_end = np.array(seg_end, dtype=np.float32).reshape(-1, 2)
+        self._seg_line = np.array(seg_line, dtype=np.int32)
+    
+    def detect_crossings(self, tracks, timestamp):
+        """Test the latest movement of every track against every line segment.
+        
+        Crossings are recorded on the track as line_crossings[name] = (timestamp, direction).
+        Returns a list of (track, line, direction) for crossings that happened this frame.
+        """
+        moving = [t for t in tracks if len(t.positions) >= 2 and t.positions[-1][2] == timestamp]
+        if not moving or not self.lines:
+            return []
+        
+        prev = np.array([t.positions[-2][:2] for t in moving], dtype=np.float32)
+        curr = np.array([t.positions[-1][:2] for t in moving], dtype=np.float32)
+        motion = curr - prev
+        
+        # Orientation tests broadcast to (tracks, segments)
+        seg_vec = self._seg_end - self._seg_start
+        rel_prev = prev[:, None, :] - self._seg_start[None, :, :]
+        rel_curr = curr[:, None, :] - self._seg_start[None, :, :]
+        side_prev = seg_vec[None, :, 0] * rel_prev[..., 1] - seg_vec[None, :, 1] * rel_prev[..., 0]
+        side_curr = seg_vec[None, :, 0] * rel_curr[..., 1] - seg_vec[None, :, 1] * rel_curr[..., 0]
+        
+        rel_a = self._seg_start[None, :, :] - prev[:, None, :]
+        rel_b = self._seg_end[None, :, :] - prev[:, None, :]
+        side_a = motion[:, None, 0] * rel_a[..., 1] - motion[:, None, 1] * rel_a[..., 0]
+        side_b = motion[:, None, 0] * rel_b[..., 1] - motion[:, None, 1] * rel_b[..., 0]
+        
+        # Start strictly on one side, end on or beyond the line
+        hits = (side_prev != 0) & (side_prev * side_curr <= 0) & (side_a * side_b <= 0)
+        
+        # Label by the side of the line the track came from: the segment normal signed by
+        # side_prev -> side_curr. The step's own motion isn't used, since centroid jitter
+        # (a blob growing as the vehicle enters) can make the wrong axis dominate
+        normal = np.stack([-seg_vec[:, 1], seg_vec[:, 0]], axis=1)
+        across = np.sign(side_curr - side_prev)[..., None] * normal[None, :, :]
+        horizontal = np.abs(across[..., 0]) >= np.abs(across[..., 1])
+        labels = np.where(horizontal,
+                          np.where(across[..., 0] > 0, 'L2R', 'R2L'),
+                          np.where(across[..., 1] > 0, 'T2B', 'B2T'))
+        
+        crossings = []
+        for track_idx, seg_idx in zip(*np.nonzero(hits)):
+            track = moving[track_idx]
+            line = self.lines[self._seg_line[seg_idx]]
+            label = str(labels[track_idx, seg_idx])
+            if line.direction != 'any' and line.direction != label:
+                continue
+            if line.name in track.line_crossings:
+                continue
+            track.line_crossings[line.name] = (timestamp, label)
+            line.record_crossing()
+            crossings.append((track, line, label))
+        
+        return crossings
+    
+    def record_speed(self, track):
+        for name in track.line_crossings:
+            for line in self.lines:
+                if line.name == name:
+                    line.record_speed(track.speed_kmh)
+    
+    def get_stats(self):
+        return [line.get_stats() for line in self.lines]
+
+def appearance_signature(crop):
+    """Small normalised hue/saturation histogram used to re-identify a track"""
+    if crop is None or crop.size == 0:
+        return None
+    hsv = cv2.cvtColor(crop[::2, ::2], cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [8, 4], [0, 180, 0, 256])
+    cv2.normalize(hist, hist, 1.0, 0, cv2.NORM_L1)
+    return hist
+
+def crop_quality(crop, box, area, edge_margin=40, sharpness_ref=100.0):
+    """How good a crop is for classification: large, sharp and clear of the zone edges"""
+    x, y, w, h = box
+    left, top, right, bottom = area
+    margin = min(x - left, y - top, right - (x + w), bottom - (y + h))
+    edge_factor = min(1.0, max(0.05, margin / max(1, edge_margin)))
+    upper_bound = w * h * edge_factor
+    if crop is None or crop.size == 0:
+        return 0.0, upper_bound
+    
+    gray = cv2.cvtColor(crop[::2, ::2], cv2.COLOR_BGR2GRAY)
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return upper_bound * sharpness / (sharpness + sharpness_ref), upper_bound
+
 class VehicleTrack:
     
-    def __init__(self, track_id, x, y, w, h, timestamp, config=None):
+    def __init__(self, track_id, x, y, w, h, timestamp, config=None, calibration=None):
         self.track_id = track_id
         self.start_x = x + w/2  # Use center coordinates
         self.start_y = y + h/2
@@ -65,12 +484,24 @@ class VehicleTrack:
         self.speed_kmh = 0
         self.speed_mph = 0
         self.speed_calculated = False
+        self.measured_at = None  # frame timestamp of the successful speed measurement
         self.crossed_line = False
         self.direction = None
         self.vehicle_type = "vehicle"
         self.vehicle_color = "unknown"
         self.confidence = 0.5
         self.config = config or config_manager
+        self.calibration = calibration
+        self.line_crossings = {}  # line name -> (timestamp, direction)
+        self.appearance = None
+        self.closed = False
+        self.classifying = False  # set while the async classification stage owns the track
+        self.label_votes = {}  # class name -> [summed confidence, best confidence] from full-frame passes
+        self.best_crop = None  # padded copy of the best view so far, the only pixels a track keeps
+        self.best_crop_box = None  # vehicle (x, y, w, h) inside best_crop
+        self.best_crop_score = 0.0
+        self.best_frame = None  # whole frame at the best view, for the saved image (output_settings.image_view)
+        self.best_frame_box = None  # vehicle (x, y, w, h) inside best_frame
         
         self._debug_logged = False
         self._failure_logged = False
@@ -90,45 +521,130 @@ class VehicleTrack:
         self.width = w
         self.height = h
         
-        if abs(self.current_x - self.start_x) > 20:
+        # Provisional until a line is crossed; after that the crossing decides
+        if not self.line_crossings and not self.speed_calculated and abs(self.current_x - self.start_x) > 20:
             if self.current_x > self.start_x:
                 self.direction = 'L2R'
             else:
                 self.direction = 'R2L'
     
+    def update_appearance(self, crop):
+        signature = appearance_signature(crop)
+        if signature is None:
+            return
+        if self.appearance is None:
+            self.appearance = signature
+        else:
+            # Blend so a single bad crop (partial occlusion) doesn't replace the signature
+            self.appearance = cv2.addWeighted(self.appearance, 0.7, signature, 0.3, 0)
+    
+    def consider_crop(self, frame, x, y, w, h, area):
+        """Keep this view if it beats the best crop so far (see crop_quality)"""
+        if frame is None:
+            return
+        edge_margin = self.config.get('detection_settings.best_crop_edge_margin', 40)
+        
+        # Cheap bound first so sharpness is only measured for possible improvements
+        _, upper_bound = crop_quality(None, (x, y, w, h), area, edge_margin)
+        if upper_bound <= self.best_crop_score:
+            return
+        score, _ = crop_quality(frame[y:y+h, x:x+w], (x, y, w, h), area, edge_margin)
+        if score <= self.best_crop_score:
+            return
+        
+        padding = self.config.get('detection_settings.best_crop_padding', 0.5)
+        pad_x, pad_y = int(w * padding), int(h * padding)
+        x1, y1 = max(0, x - pad_x), max(0, y - pad_y)
+        x2, y2 = min(frame.shape[1], x + w + pad_x), min(frame.shape[0], y + h + pad_y)
+        self.best_crop = frame[y1:y2, x1:x2].copy()
+        self.best_crop_box = (x - x1, y - y1, w, h)
+        self.best_crop_score = score
+        
+        if self.config.get('output_settings.image_view', 'frame') == 'frame':
+            max_width = self.config.get('output_settings.frame_image_max_width', 0)
+            scale = max_width / frame.shape[1] if max_width and frame.shape[1] > max_width else 1.0
+            if scale < 1.0:
+                self.best_frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            else:
+                self.best_frame = frame.copy()
+            self.best_frame_box = tuple(int(round(v * scale)) for v in (x, y, w, h))
+    
+    def vehicle_crop(self):
+        """Tight view of the vehicle inside best_crop"""
+        if self.best_crop is None:
+            return None
+        x, y, w, h = self.best_crop_box
+        return self.best_crop[y:y+h, x:x+w]
+    
+    def size_m(self):
+        """Approximate blob (width, height) in metres from the calibration"""
+        if self.calibration is not None and self.calibration.enabled:
+            bottom = self.current_y + self.height/2
+            width_m = self.calibration.ground_distance((self.current_x - self.width/2, bottom),
+                                                       (self.current_x + self.width/2, bottom))
+            metres_per_px = width_m / max(1, self.width)
+        else:
+            side = 'l2r' if self.direction in ('L2R', 'T2B') else 'r2l'
+            cal_obj_px = self.config.get(f'calibration_settings.cal_obj_px_{side}', 261)
+            cal_obj_mm = self.config.get(f'calibration_settings.cal_obj_mm_{side}', 4127)
+            metres_per_px = cal_obj_mm / cal_obj_px / 1000.0
+        return self.width * metres_per_px, self.height * metres_per_px
+    
+    def features(self):
+        """Geometry and speed the pre-classifier cascade decides on"""
+        width_m, height_m = self.size_m()
+        return {
+            'speed_kmh': self.speed_kmh,
+            'width_m': width_m,
+            'height_m': height_m,
+            'aspect': self.height / max(1, self.width),
+            'area_px': self.width * self.height
+        }
+    
+    def box_at(self, timestamp):
+        """Bounding box (x1, y1, x2, y2) at a stored timestamp, or the current one"""
+        center_x, center_y = self.current_x, self.current_y
+        for x, y, t in reversed(self.positions):
+            if t == timestamp:
+                center_x, center_y = x, y
+                break
+        return [center_x - self.width/2, center_y - self.height/2,
+                center_x + self.width/2, center_y + self.height/2]
+    
+    def add_label(self, object_type, confidence):
+        votes = self.label_votes.setdefault(object_type, [0.0, 0.0])
+        votes[0] += confidence
+        votes[1] = max(votes[1], confidence)
+    
+    def cached_detections(self):
+        """Full-frame labels as (class_name, confidence), most supported first"""
+        ranked = sorted(self.label_votes.items(), key=lambda item: item[1][0], reverse=True)
+        return [(object_type, votes[1]) for object_type, votes in ranked]
+    
+    def velocity(self):
+        """Average velocity in px/s over the stored positions"""
+        first_x, first_y, first_t = self.positions[0]
+        last_x, last_y, last_t = self.positions[-1]
+        dt = last_t - first_t
+        if dt <= 0:
+            return 0.0, 0.0
+        return (last_x - first_x) / dt, (last_y - first_y) / dt
+    
     def calculate_speed(self):
         if len(self.positions) < 2 or self.speed_calculated:
             return False
         
-        l2r_enabled = self.config.get('detection_zones.l2r_enabled', True)
-        r2l_enabled = self.config.get('detection_zones.r2l_enabled', True)
-        l2r_line_x = self.config.get('detection_zones.l2r_line_x', 400)
-        r2l_line_x = self.config.get('detection_zones.r2l_line_x', 1400)
-        
-        line_crossed = False
-        
-        if self.direction == 'L2R' and l2r_enabled:
-            for i in range(len(self.positions) - 1):
-                x1, _, _ = self.positions[i]
-                x2, _, _ = self.positions[i + 1]
-                if x1 < l2r_line_x <= x2:
-                    line_crossed = True
-                    break
-        elif self.direction == 'R2L' and r2l_enabled:
-            for i in range(len(self.positions) - 1):
-                x1, _, _ = self.positions[i]
-                x2, _, _ = self.positions[i + 1]
-                if x1 > r2l_line_x >= x2:
-                    line_crossed = True
-                    break
-        
-        if not line_crossed:
+        # Crossings are recorded per frame by CountingLineSet.detect_crossings
+        if not self.line_crossings:
             if not self._failure_logged:
                 import logging
                 logging.debug(f"❌ Track {self.track_id}: No line crossing - Path: {self.positions[0][0]:.0f}px → {self.positions[-1][0]:.0f}px")
                 self._failure_logged = True
             return False
         
+        # Measure in the direction of the most recent crossing
+        _, self.direction = max(self.line_crossings.values())
+        
         start_pos = self.positions[0]
         end_pos = self.positions[-1]
         
@@ -138,7 +654,14 @@ class VehicleTrack:
             start_pos = self.positions[quarter_idx]
             end_pos = self.positions[three_quarter_idx]
         
-        distance_px = abs(end_pos[0] - start_pos[0])
+        use_homography = self.calibration is not None and self.calibration.enabled
+        if use_homography:
+            # Perspective-corrected calibration measures along the actual path
+            distance_px = math.hypot(end_pos[0] - start_pos[0], end_pos[1] - start_pos[1])
+        elif self.direction in ('T2B', 'B2T'):
+            distance_px = abs(end_pos[1] - start_pos[1])
+        else:
+            distance_px = abs(end_pos[0] - start_pos[0])
         time_diff = end_pos[2] - start_pos[2]
         
         min_time_diff = self.config.get('speed_settings.min_time_diff', 0.3)
@@ -149,20 +672,24 @@ class VehicleTrack:
             self._debug_logged = True
         
         if time_diff > min_time_diff and distance_px > min_track_length:
-            cal_obj_px_l2r = self.config.get('calibration_settings.cal_obj_px_l2r', 261)
-            cal_obj_mm_l2r = self.config.get('calibration_settings.cal_obj_mm_l2r', 4127)
-            cal_obj_px_r2l = self.config.get('calibration_settings.cal_obj_px_r2l', 261)
-            cal_obj_mm_r2l = self.config.get('calibration_settings.cal_obj_mm_r2l', 4127)
-            
-            pixels_to_mm_ratio_l2r = cal_obj_mm_l2r / cal_obj_px_l2r
-            pixels_to_mm_ratio_r2l = cal_obj_mm_r2l / cal_obj_px_r2l
-            
-            if self.direction == 'L2R':
-                distance_mm = distance_px * pixels_to_mm_ratio_l2r
+            if use_homography:
+                distance_m = self.calibration.ground_distance(start_pos, end_pos)
             else:
-                distance_mm = distance_px * pixels_to_mm_ratio_r2l
+                cal_obj_px_l2r = self.config.get('calibration_settings.cal_obj_px_l2r', 261)
+                cal_obj_mm_l2r = self.config.get('calibration_settings.cal_obj_mm_l2r', 4127)
+                cal_obj_px_r2l = self.config.get('calibration_settings.cal_obj_px_r2l', 261)
+                cal_obj_mm_r2l = self.config.get('calibration_settings.cal_obj_mm_r2l', 4127)
+                
+                pixels_to_mm_ratio_l2r = cal_obj_mm_l2r / cal_obj_px_l2r
+                pixels_to_mm_ratio_r2l = cal_obj_mm_r2l / cal_obj_px_r2l
+                
+                if self.direction in ('L2R', 'T2B'):
+                    distance_mm = distance_px * pixels_to_mm_ratio_l2r
+                else:
+                    distance_mm = distance_px * pixels_to_mm_ratio_r2l
+                
+                distance_m = distance_mm / 1000.0
             
-            distance_m = distance_mm / 1000.0
             speed_ms = distance_m / time_diff
             self.speed_kmh = speed_ms * 3.6
             self.speed_mph = self.speed_kmh * 0.621371
@@ -177,6 +704,7 @@ class VehicleTrack:
             
             if min_speed_over <= speed_check <= max_speed_over:
                 self.speed_calculated = True
+                self.measured_at = self.positions[-1][2]
                 self.crossed_line = True
                 return True
             else:
@@ -202,8 +730,9 @@ class VehicleTrack:
 
 class VehicleColorDetector:
     
-    def __init__(self, use_gpu=True):
+    def __init__(self, use_gpu=True, config=None):
         self.use_gpu = use_gpu and torch.cuda.is_available()
+        self.config = config or config_manager
         
         self.color_ranges = {
             'red': [
@@ -220,31 +749,69 @@ class VehicleColorDetector:
             'silver': [(np.array([0, 0, 100]), np.array([180, 50, 200]))],
             'brown': [(np.array([10, 50, 20]), np.array([20, 255, 200]))]
         }
+        self.build_lookup_tables()
         
         if self.use_gpu:
             print("🚀 GPU color detection enabled")
     
-    def detect_color(self, image):
+    def build_lookup_tables(self):
+        """Per-channel tables mapping an H, S or V value to the ranges that contain it.
+        
+        ANDing the three lookups gives each pixel a code with one bit per range,
+        and code_colors maps every possible code to the colors it counts towards.
+        Ranges overlap (e.g. gray/silver), so a pixel can count for several colors
+        exactly like the separate inRange masks did.
+        """
+        ranges = [(name, lower, upper) for name, color_ranges in self.color_ranges.items()
+                  for lower, upper in color_ranges]
+        self.color_names = list(self.color_ranges)
+        
+        values = np.arange(256)
+        self.channel_luts = np.zeros((3, 256), dtype=np.int16)
+        for bit, (_, lower, upper) in enumerate(ranges):
+            for channel in range(3):
+                inside = (values >= lower[channel]) & (values <= upper[channel])
+                self.channel_luts[channel, inside] |= 1 << bit
+        
+        codes = np.arange(1 << len(ranges))
+        self.code_colors = np.zeros((len(codes), len(self.color_names)))
+        for bit, (name, _, _) in enumerate(ranges):
+            self.code_colors[(codes >> bit) & 1 == 1, self.color_names.index(name)] = 1
+    
+    def color_percentages(self, image, subsample=1, center_weighting=False):
+        """Percentage of pixels inside each color's ranges, from one pass over the crop"""
+        if subsample > 1:
+            image = image[::subsample, ::subsample]
+        h, s, v = cv2.split(cv2.cvtColor(image, cv2.COLOR_BGR2HSV))
+        codes = cv2.bitwise_and(cv2.bitwise_and(cv2.LUT(h, self.channel_luts[0]),
+                                                cv2.LUT(s, self.channel_luts[1])),
+                                cv2.LUT(v, self.channel_luts[2]))
+        
+        if center_weighting:
+            # Pixels near the crop border (road, neighbours) count half as much as the centre
+            rows = 1 - 0.5 * np.abs(np.linspace(-1, 1, codes.shape[0]))
+            cols = 1 - 0.5 * np.abs(np.linspace(-1, 1, codes.shape[1]))
+            weights = np.outer(rows, cols)
+            counts = np.bincount(codes.ravel(), weights=weights.ravel(), minlength=len(self.code_colors))
+            total = weights.sum()
+        else:
+            counts = np.bincount(codes.ravel(), minlength=len(self.code_colors))
+            total = codes.size
+        
+        percentages = counts @ self.code_colors / total * 100
+        return dict(zip(self.color_names, percentages))
+    
+    def detect_color(self, image, subsample=None, center_weighting=None):
         if image is None or image.size == 0:
             return "unknown"
         
+        if subsample is None:
+            subsample = int(self.config.get('detection_settings.color_subsample', 1))
+        if center_weighting is None:
+            center_weighting = self.config.get('detection_settings.color_center_weighting', False)
+        
         try:
-            # Convert to HSV
-            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-            
-            # Calculate color percentages
-            color_percentages = {}
-            total_pixels = hsv.shape[0] * hsv.shape[1]
-            
-            for color_name, ranges in self.color_ranges.items():
-                mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
-                
-                for lower, upper in ranges:
-                    color_mask = cv2.inRange(hsv, lower, upper)
-                    mask = cv2.bitwise_or(mask, color_mask)
-                
-                percentage = (np.sum(mask > 0) / total_pixels) * 100
-                color_percentages[color_name] = percentage
+            color_percentages = self.color_percentages(image, max(1, subsample), center_weighting)
             
             # Return the color with highest percentage (minimum 15% to be considered)
             dominant_color = max(color_percentages, key=color_percentages.get)
@@ -256,6 +823,32 @@ class VehicleColorDetector:
             print(f"⚠️ Color detection error: {e}")
             return "unknown"
 
+def find_motion(bg_subtractor, crop, blur_size=10, min_area=500, downscale=1):
+    """Moving blobs in crop as (x, y, w, h) in crop pixels.
+    
+    With downscale > 1 the background model runs on a crop that many times
+    smaller; blur and area limits are scaled to match and boxes scaled back.
+    """
+    if downscale > 1:
+        crop = cv2.resize(crop, (crop.shape[1] // downscale, crop.shape[0] // downscale),
+                          interpolation=cv2.INTER_AREA)
+    fg_mask = bg_subtractor.apply(crop)
+    
+    blur_size = max(1, blur_size // downscale)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (blur_size, blur_size))
+    fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, kernel)
+    fg_mask = cv2.dilate(fg_mask, kernel)
+    
+    contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    
+    detections = []
+    for contour in contours:
+        area = cv2.contourArea(contour) * downscale * downscale
+        if min_area <= area <= 50000:
+            x, y, w, h = cv2.boundingRect(contour)
+            detections.append((x * downscale, y * downscale, w * downscale, h * downscale))
+    return detections
+
 class RTSPDecoder:
     
     def __init__(self, rtsp_url, frame_buffer, max_retries=5):
@@ -321,6 +914,7 @@ class RTSPDecoder:
         return False
     
     def decode_loop(self):
+        resource_governor.apply_thread('decode')
         consecutive_errors = 0
         max_consecutive_errors = 10
         
@@ -380,7 +974,7 @@ class RTSPDecoder:
     
     def start(self):
         self.running = True
-        self.decode_thread = threading.Thread(target=self.decode_loop, daemon=True)
+        self.decode_thread = threading.Thread(target=self.decode_loop, daemon=True, name='rtsp-decode')
         self.decode_thread.start()
         print("🎬 RTSP decoder started")
     
@@ -396,6 +990,7 @@ class SpeedCamera:
     
     def __init__(self):
         self.config = config_manager
+        resource_governor.apply_startup()
         
         yolo_model_name = self.config.get('detection_settings.yolo_model', 'yolov8x.pt')
         yolo_model_path = os.path.join('models', yolo_model_name)
@@ -409,24 +1004,75 @@ class SpeedCamera:
             else:
                 raise FileNotFoundError(f"No YOLO models found in models/ directory")
         
-        print(f"🤖 Loading YOLO model: {yolo_model_path}")
-        self.yolo_model = YOLO(yolo_model_path)
-        
         self.setup_gpu()
         
+        # ONNX Runtime / OpenVINO exports are CPU-only; on a GPU box stay with PyTorch
+        self.inference_backend = self.config.get('detection_settings.inference_backend', 'pytorch')
+        if self.use_gpu:
+            self.inference_backend = 'pytorch'
+        
+        device = 'cuda:0' if self.use_gpu else 'cpu'
+        imgsz = int(self.config.get('detection_settings.batch_imgsz', 320))
+        warmup_batch = int(self.config.get('detection_settings.batch_size', 8))
+        inference_int8 = self.config.get('detection_settings.inference_int8', False)
+        
+        # The shared inference server keeps the model out of this process entirely
+        self.yolo_model = None
+        self.classifier = None
+        if self.config.get('inference_server.enabled', False):
+            spec = {
+                'model_path': os.path.abspath(yolo_model_path),
+                'backend': self.inference_backend,
+                'imgsz': imgsz,
+                'int8': inference_int8,
+                'device': device,
+                'warmup_batch': warmup_batch
+            }
+            try:
+                self.classifier = connect_inference_server(spec, f"camera-{os.getpid()}-{id(self):x}", self.config)
+                print(f"🔌 Using shared inference server for {yolo_model_path}")
+            except Exception as e:
+                print(f"⚠️ Inference server unavailable ({e}), loading the model in this process")
+        
+        if self.classifier is None:
+            # Loaded and warmed up once per process, then shared by every camera instance
+            print(f"🤖 Loading YOLO model: {yolo_model_path} ({self.inference_backend})")
+            try:
+                self.yolo_model = model_registry.get(yolo_model_path, self.inference_backend, imgsz,
+                                                     inference_int8, device, warmup_batch)
+            except Exception as e:
+                print(f"⚠️ {self.inference_backend} backend unavailable ({e}), falling back to PyTorch")
+                self.inference_backend = 'pytorch'
+                self.yolo_model = model_registry.get(yolo_model_path, 'pytorch', imgsz, False, device, warmup_batch)
+            
+            self.classifier = BatchClassifier(self.yolo_model, device, self.config,
+                                              model_registry.lock_for(self.yolo_model))
+        
         self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=True)
-        self.color_detector = VehicleColorDetector(self.use_gpu)
+        self.motion_shape = None
+        self.color_detector = VehicleColorDetector(self.use_gpu, self.config)
+        self.cascade = CascadeClassifier(self.config)
+        self.classification_cache = ClassificationCache(self.config)
+        self.calibration = GroundPlaneCalibration(self.config)
+        self.counting_lines = CountingLineSet(self.config)
+        self.events = EventBus()
         
         self.tracks = {}
+        self.lost_tracks = {}  # recently lost or finished tracks, candidates for stitching
         self.track_id_counter = 0
         self.frame_count = 0
+        self.last_analysis = 0.0
+        self.frame_samples = None  # detection-area copies requested by sample_frames()
+        self.frame_samples_target = 0
+        self.frame_samples_ready = threading.Event()
         
         self.stats = {
             'frames_processed': 0,
             'moving_logged': 0,
             'stationary_ignored': 0,
             'l2r_count': 0,
-            'r2l_count': 0
+            'r2l_count': 0,
+            'tracks_stitched': 0
         }
         
         self.running = False
@@ -438,61 +1084,56 @@ class SpeedCamera:
         
         rtsp_url = rtsp_urls[0]
         self.rtsp_decoder = RTSPDecoder(rtsp_url, self.frame_buffer)
+        self.clip_recorder = ClipRecorder(rtsp_url, self.config)
+        
+        # Async classification stage (see submit_classification)
+        self.executor = ThreadPoolExecutor(max_workers=resource_governor.threads('classify', 4),
+                                           thread_name_prefix='classify',
+                                           initializer=resource_governor.apply_thread, initargs=('classify',))
+        self.stats_lock = threading.Lock()
+        self.classification_stats = {
+            'submitted': 0,
+            'skipped': 0,
+            'completed': 0,
+            'pending': 0,
+            'max_pending': 0,
+            'cached': 0,
+            'total_latency_ms': 0.0
+        }
         
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # Full-frame detection mode (see update_full_frame_detection)
+        self.full_frame_pending = None
+        self.full_frame_stats = {
+            'passes': 0,
+            'boxes': 0,
+            'associated': 0
+        }
         
         self.output_dir = 'detections'
         os.makedirs(self.output_dir, exist_ok=True)
+        self.image_writer = ImageWriterPool(self.config)
+        self.gpu_name = torch.cuda.get_device_name(0) if self.use_gpu else ''
         
         csv_filename = 'object_detections.csv'
         self.csv_file = os.path.join(self.output_dir, csv_filename)
         print(f"📄 CSV file path: {self.csv_file}")
         
-        csv_headers = ['timestamp', 'object_type', 'object_color', 'direction', 'speed_kmh', 'speed_mph', 'confidence', 'image_file', 'removed']
         if not os.path.exists(self.csv_file):
             with open(self.csv_file, 'w', newline='') as f:
                 writer = csv.writer(f)
-                writer.writerow(csv_headers)
+                writer.writerow(DETECTION_CSV_HEADERS)
                 print(f"✅ CSV file created: {self.csv_file}")
         else:
             print(f"✅ CSV file exists, preserving data: {self.csv_file}")
             self.migrate_csv_if_needed()
-            try:
-                with open(self.csv_file, 'r') as f:
-                    reader = csv.reader(f)
-                    next(reader)
-                    existing_count = sum(1 for row in reader)
-                print(f"📊 Found {existing_count} existing detections in CSV")
-            except Exception as e:
-                print(f"⚠️ Could not count existing records: {e}")
+        
+        self.detection_store = open_detection_store(self.config, self.output_dir)
+        print(f"📊 Found {self.detection_store.count()} existing detections ({self.detection_store.backend})")
     
     def migrate_csv_if_needed(self):
-        """Add 'removed' column to existing CSV if it doesn't exist"""
+        """Add the columns newer versions write ('removed', 'clip_file') to an existing CSV"""
         try:
-            with open(self.csv_file, 'r', newline='') as f:
-                reader = csv.DictReader(f)
-                fieldnames = reader.fieldnames
-                
-                # Check if 'removed' column already exists
-                if 'removed' in fieldnames:
-                    return  # No migration needed
-                
-                print("🔄 Migrating CSV file to add 'removed' column...")
-                rows = list(reader)
-            
-            # Add 'removed' column with default value False for all existing rows
-            new_fieldnames = list(fieldnames) + ['removed']
-            for row in rows:
-                row['removed'] = 'False'
-            
-            # Write back to file with new structure
-            with open(self.csv_file, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=new_fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
-            
-            print(f"✅ CSV migration completed - added 'removed' column to {len(rows)} existing records")
-            
+            upgrade_csv_header(self.csv_file)
         except Exception as e:
             print(f"⚠️ CSV migration failed: {e}")
         print("🚗 Speed Camera System Initialized")
@@ -511,108 +1152,98 @@ class SpeedCamera:
         else:
             print("⚠️ GPU not available, using CPU")
     
+    def detection_area(self):
+        """(left, top, right, bottom) of the configured detection area"""
+        return (self.config.get('detection_zones.detection_area_left', 100),
+                self.config.get('detection_zones.detection_area_top', 300),
+                self.config.get('detection_zones.detection_area_right', 1820),
+                self.config.get('detection_zones.detection_area_bottom', 590))
+    
     def detect_motion(self, frame):
         try:
-            crop_y_upper = self.config.get('detection_zones.detection_area_top', 300)
-            crop_y_lower = self.config.get('detection_zones.detection_area_bottom', 590)
-            crop_x_left = self.config.get('detection_zones.detection_area_left', 100)
-            crop_x_right = self.config.get('detection_zones.detection_area_right', 1820)
+            crop_x_left, crop_y_upper, crop_x_right, crop_y_lower = self.detection_area()
             
             crop = frame[crop_y_upper:crop_y_lower, crop_x_left:crop_x_right]
             
-            fg_mask = self.bg_subtractor.apply(crop)
-            
-            blur_size = self.config.get('detection_settings.blur_size', 10)
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (blur_size, blur_size))
-            fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, kernel)
-            fg_mask = cv2.dilate(fg_mask, kernel)
-            
-            contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            detections = []
-            min_area = self.config.get('detection_settings.min_area', 500)
-            
-            for contour in contours:
-                area = cv2.contourArea(contour)
-                if min_area <= area <= 50000:
-                    x, y, w, h = cv2.boundingRect(contour)
-                    x += crop_x_left
-                    y += crop_y_upper
-                    detections.append((x, y, w, h))
+            downscale = max(1, int(self.config.get('detection_settings.motion_downscale', 1)))
+            motion_shape = (crop.shape[0] // downscale, crop.shape[1] // downscale)
+            if motion_shape != self.motion_shape:
+                # The background model is per resolution; start over when the area or scale changes
+                self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=True)
+                self.motion_shape = motion_shape
             
-            return detections
+            detections = find_motion(self.bg_subtractor, crop,
+                                     self.config.get('detection_settings.blur_size', 10),
+                                     self.config.get('detection_settings.min_area', 500), downscale)
+            return [(x + crop_x_left, y + crop_y_upper, w, h) for x, y, w, h in detections]
             
         except Exception as e:
             print(f"⚠️ Motion detection error: {e}")
             return []
     
-    def classify_and_detect_color(self, frame, x, y, w, h):
-        try:
-            crop = frame[y:y+h, x:x+w]
-            if crop.size == 0:
-                return "vehicle", "unknown", 0.5
-            
-            device = 'cuda:0' if self.use_gpu else 'cpu'
-            confidence_threshold = self.config.get('detection_settings.confidence_threshold', 0.5)
-            
-            results = self.yolo_model(crop, device=device, verbose=False)
-            
-            vehicle_type = "vehicle"
-            confidence = 0.5
-            detected_objects = []
-            
-            vehicle_classes = self.config.get('vehicle_settings.vehicle_classes', [])
-            ignore_yolo_validation = self.config.get('vehicle_settings.ignore_yolo_validation', False)
-            
-            highest_conf_object = None
-            highest_conf = 0.0
+    def sample_frames(self, count=20, timeout=10.0):
+        """Copies of the detection area from the next count analysed frames (for the auto-tuner)"""
+        self.frame_samples_ready.clear()
+        self.frame_samples_target = count
+        self.frame_samples = []
+        self.frame_samples_ready.wait(timeout)
+        samples, self.frame_samples = self.frame_samples, None
+        return samples or []
+    
+    def collect_frame_sample(self, frame):
+        samples = self.frame_samples
+        if samples is None or len(samples) >= self.frame_samples_target:
+            return
+        left, top, right, bottom = self.detection_area()
+        samples.append(frame[top:bottom, left:right].copy())
+        if len(samples) >= self.frame_samples_target:
+            self.frame_samples_ready.set()
+    
+    def interpret_detections(self, detected_objects):
+        """Pick object type and confidence from YOLO's (class_name, confidence) list"""
+        confidence_threshold = self.config.get('detection_settings.confidence_threshold', 0.5)
+        
+        vehicle_type = "vehicle"
+        confidence = 0.5
+        
+        vehicle_classes = self.config.get('vehicle_settings.vehicle_classes', [])
+        ignore_yolo_validation = self.config.get('vehicle_settings.ignore_yolo_validation', False)
+        
+        highest_conf_object = None
+        highest_conf = 0.0
+        
+        for class_name, conf in detected_objects:
+            if conf > highest_conf:
+                highest_conf = conf
+                highest_conf_object = class_name
             
-            for result in results:
-                if result.boxes is not None:
-                    for box in result.boxes:
-                        class_id = int(box.cls.cpu().numpy()[0])
-                        conf = float(box.conf.cpu().numpy()[0])
-                        
-                        if conf >= confidence_threshold:
-                            class_name = self.yolo_model.names[class_id]
-                            detected_objects.append((class_name, conf))
-                            
-                            if conf > highest_conf:
-                                highest_conf = conf
-                                highest_conf_object = class_name
-                            
-                            if class_name in vehicle_classes:
-                                vehicle_type = class_name
-                                confidence = conf
-                                break
-            
-            if ignore_yolo_validation and highest_conf_object and vehicle_type == "vehicle" and highest_conf_object not in vehicle_classes:
-                vehicle_type = "unknown"
-                confidence = highest_conf
-                print(f"🔍 YOLO: Detected {highest_conf_object} ({highest_conf:.2f}) - categorized as 'unknown'")
-            
-            if detected_objects:
-                obj_summary = ", ".join([f"{name}({conf:.2f})" for name, conf in detected_objects[:3]])
-                print(f"🔍 YOLO: {obj_summary}")
-            else:
-                if hasattr(self, '_last_no_objects_log'):
-                    if time.time() - self._last_no_objects_log > 10:
-                        print(f"🔍 YOLO: No objects detected above {confidence_threshold:.2f} confidence")
-                        self._last_no_objects_log = time.time()
-                else:
+            if class_name in vehicle_classes:
+                vehicle_type = class_name
+                confidence = conf
+                break
+        
+        if ignore_yolo_validation and highest_conf_object and vehicle_type == "vehicle" and highest_conf_object not in vehicle_classes:
+            vehicle_type = "unknown"
+            confidence = highest_conf
+            print(f"🔍 YOLO: Detected {highest_conf_object} ({highest_conf:.2f}) - categorized as 'unknown'")
+        
+        if detected_objects:
+            obj_summary = ", ".join([f"{name}({conf:.2f})" for name, conf in detected_objects[:3]])
+            print(f"🔍 YOLO: {obj_summary}")
+        else:
+            if hasattr(self, '_last_no_objects_log'):
+                if time.time() - self._last_no_objects_log > 10:
                     print(f"🔍 YOLO: No objects detected above {confidence_threshold:.2f} confidence")
                     self._last_no_objects_log = time.time()
-            
-            vehicle_color = self.color_detector.detect_color(crop)
-            
-            return vehicle_type, vehicle_color, confidence
-            
-        except Exception as e:
-            print(f"⚠️ YOLO Classification error: {e}")
-            return "vehicle", "unknown", 0.3
+            else:
+                print(f"🔍 YOLO: No objects detected above {confidence_threshold:.2f} confidence")
+                self._last_no_objects_log = time.time()
+        
+        return vehicle_type, confidence
     
-    def update_tracks(self, detections, timestamp):
+    def update_tracks(self, detections, timestamp, frame=None):
         current_tracks = {}
+        area = self.detection_area()
         
         for x, y, w, h in detections:
             center_x = x + w/2
@@ -630,141 +1261,345 @@ class SpeedCamera:
                     min_distance = distance
                     best_match = track_id
             
-            if best_match:
+            crop = frame[y:y+h, x:x+w] if frame is not None else None
+            
+            if best_match is not None:
                 track = self.tracks[best_match]
                 track.update_position(x, y, w, h, timestamp)
+                track.update_appearance(crop)
+                track.consider_crop(frame, x, y, w, h, area)
                 current_tracks[best_match] = track
+                continue
+            
+            appearance = appearance_signature(crop)
+            stitched = self.stitch_track(center_x, center_y, timestamp, appearance)
+            if stitched is not None:
+                stitched.update_position(x, y, w, h, timestamp)
+                stitched.update_appearance(crop)
+                stitched.consider_crop(frame, x, y, w, h, area)
+                current_tracks[stitched.track_id] = stitched
             else:
-                new_track = VehicleTrack(self.track_id_counter, x, y, w, h, timestamp, self.config)
+                new_track = VehicleTrack(self.track_id_counter, x, y, w, h, timestamp, self.config, self.calibration)
+                new_track.appearance = appearance
+                new_track.consider_crop(frame, x, y, w, h, area)
                 current_tracks[self.track_id_counter] = new_track
                 self.track_id_counter += 1
+                self.events.publish(TrackCreated(new_track.track_id, timestamp, x, y, w, h))
+        
+        # Tracks that disappeared this frame may come back after a short occlusion
+        for track_id, track in self.tracks.items():
+            if track_id not in current_tracks:
+                self.lost_tracks[track_id] = track
+        
+        # A track is finished once it can no longer be stitched
+        stitch_window = self.config.get('tracking_settings.stitch_window', 1.0)
+        for track_id in [tid for tid, t in self.lost_tracks.items() if timestamp - t.last_update > stitch_window]:
+            self.finish_track(self.lost_tracks.pop(track_id), 'lost')
         
         self.tracks = current_tracks
     
-    def process_tracks(self, frame):
+    def update_full_frame_detection(self, frame, timestamp):
+        """Run YOLO over the whole detection area every full_frame_interval frames.
+        
+        Boxes are matched to the tracks by IoU against each track's box at the
+        frame the pass was run on, and their labels are cached on the track, so
+        classification cost is fixed per second instead of growing with traffic.
+        Only one pass is in flight at a time.
+        """
+        if self.full_frame_pending is not None and self.full_frame_pending[0].done():
+            future, detection_timestamp = self.full_frame_pending
+            self.full_frame_pending = None
+            try:
+                self.associate_detections(future.result(), detection_timestamp)
+            except Exception as e:
+                print(f"⚠️ Full-frame detection error: {e}")
+        
+        interval = max(1, int(self.config.get('detection_settings.full_frame_interval', 10)))
+        if self.full_frame_pending is None and self.frame_count % interval == 0 and self.tracks:
+            left, top, right, bottom = self.detection_area()
+            future = self.classifier.submit_detection(frame[top:bottom, left:right])
+            self.full_frame_pending = (future, timestamp)
+            self.full_frame_stats['passes'] += 1
+    
+    def associate_detections(self, detections, detection_timestamp):
+        """Cache full-frame labels on the tracks they overlap best"""
+        self.full_frame_stats['boxes'] += len(detections)
+        tracks = list(self.tracks.values()) + [t for t in self.lost_tracks.values() if not t.classifying]
+        if not detections or not tracks:
+            return
+        
+        left, top, _, _ = self.detection_area()
+        boxes = [[x1 + left, y1 + top, x2 + left, y2 + top] for _, _, (x1, y1, x2, y2) in detections]
+        iou = box_iou([track.box_at(detection_timestamp) for track in tracks], boxes)
+        
+        # Greedy one-to-one assignment, best overlaps first
+        min_iou = self.config.get('detection_settings.full_frame_iou_threshold', 0.3)
+        used_tracks, used_boxes = set(), set()
+        for flat_index in np.argsort(-iou, axis=None):
+            track_idx, box_idx = np.unravel_index(flat_index, iou.shape)
+            if iou[track_idx, box_idx] < min_iou:
+                break
+            if track_idx in used_tracks or box_idx in used_boxes:
+                continue
+            used_tracks.add(track_idx)
+            used_boxes.add(box_idx)
+            object_type, confidence, _ = detections[box_idx]
+            tracks[track_idx].add_label(object_type, confidence)
+            self.full_frame_stats['associated'] += 1
+    
+    def stitch_track(self, center_x, center_y, timestamp, appearance):
+        """Find a recently lost track that a newly born blob continues"""
+        if not self.lost_tracks or not self.config.get('tracking_settings.stitching_enabled', True):
+            return None
+        
+        stitch_window = self.config.get('tracking_settings.stitch_window', 1.0)
+        max_distance = self.config.get('tracking_settings.stitch_max_distance', 150)
+        max_appearance = self.config.get('tracking_settings.stitch_max_appearance_distance', 0.5)
+        
+        best_track = None
+        best_score = float('inf')
+        
+        for track in self.lost_tracks.values():
+            dt = timestamp - track.last_update
+            if dt <= 0 or dt > stitch_window:
+                continue
+            
+            # Position must match where the lost track would be by now
+            vx, vy = track.velocity()
+            distance = math.hypot(center_x - (track.current_x + vx * dt),
+                                  center_y - (track.current_y + vy * dt))
+            if distance > max_distance:
+                continue
+            
+            appearance_distance = 0.0
+            if appearance is not None and track.appearance is not None:
+                appearance_distance = cv2.compareHist(track.appearance, appearance, cv2.HISTCMP_BHATTACHARYYA)
+                if appearance_distance > max_appearance:
+                    continue
+            
+            score = distance / max_distance + appearance_distance / max_appearance
+            if score < best_score:
+                best_score = score
+                best_track = track
+        
+        if best_track is None:
+            return None
+        
+        del self.lost_tracks[best_track.track_id]
+        self.stats['tracks_stitched'] += 1
+        print(f"🧵 Track {best_track.track_id}: stitched after {timestamp - best_track.last_update:.2f}s gap")
+        return best_track
+    
+    def process_tracks(self):
         tracks_to_remove = []
         
+        now = time.time()
+        track_counter = self.config.get('speed_settings.track_counter', 5)
+        max_time_diff = self.config.get('speed_settings.max_time_diff', 10)
+        
         for track_id, track in self.tracks.items():
-            track_counter = self.config.get('speed_settings.track_counter', 5)
-            if not track.speed_calculated and len(track.positions) >= track_counter:
-                if track.calculate_speed():
-                    object_type, object_color, confidence = self.classify_and_detect_color(
-                        frame, 
-                        int(track.current_x - track.width/2),
-                        int(track.current_y - track.height/2),
-                        int(track.width),
-                        int(track.height)
-                    )
-                    track.vehicle_type = object_type
-                    track.vehicle_color = object_color
-                    track.confidence = confidence
-                    
-                    # Log moving vehicle - ADD DEBUG INFO
-                    print(f"🔍 Track {track_id}: speed_calc={track.speed_calculated}, track_len={abs(track.current_x - track.start_x):.1f}px, crossed={track.crossed_line}, direction={track.direction}")
-                    
-                    # Check if YOLO validation is required
-                    ignore_yolo_validation = self.config.get('vehicle_settings.ignore_yolo_validation', False)
-                    
-                    if ignore_yolo_validation:
-                        # Log all moving objects regardless of YOLO validation
-                        # Objects not in vehicle classes are categorized as "other"
-                        print(f"✅ LOGGING ALL MOVING OBJECTS: {track.direction} {track.vehicle_color} {track.vehicle_type}")
-                        should_log = True
-                    else:
-                        # Use YOLO validation
-                        require_yolo_validation = self.config.get('detection_settings.require_yolo_validation', True)
-                        accept_generic_vehicle = self.config.get('detection_settings.accept_generic_vehicle', True)
-                        vehicle_classes = self.config.get('vehicle_settings.vehicle_classes', [])
-                        
-                        should_log = True
-                        if require_yolo_validation:
-                            # Check if object is in our vehicle classes OR is generic "vehicle" (if enabled)
-                            valid_object = object_type in vehicle_classes
-                            if not valid_object and accept_generic_vehicle and object_type == 'vehicle':
-                                valid_object = True
-                            
-                            should_log = valid_object and confidence > 0.3
-                            if not should_log:
-                                print(f"❌ NOT LOGGING: YOLO validation failed - {object_type} (conf: {confidence:.2f}) not in vehicle classes or confidence too low")
-                            else:
-                                print(f"✅ YOLO VALIDATED: {track.direction} {track.vehicle_color} {track.vehicle_type} (conf: {confidence:.2f})")
-                        else:
-                            print(f"✅ LOGGING WITHOUT YOLO VALIDATION: {track.direction} {track.vehicle_color} {track.vehicle_type}")
-                    
-                    if should_log:
-                        self.log_vehicle_detection(track, frame)
-                        self.stats['moving_logged'] += 1
-                        
-                        if track.direction == 'L2R':
-                            self.stats['l2r_count'] += 1
-                        else:
-                            self.stats['r2l_count'] += 1
-                    
+            if not track.speed_calculated:
+                if len(track.positions) >= track_counter:
+                    if track.calculate_speed():
+                        # Keep tracking; classification waits for the track to finish with its best crop
+                        self.events.publish(SpeedMeasured(track_id, now, track.speed_kmh,
+                                                          track.speed_mph, track.direction))
+                elif now - track.start_time > max_time_diff:
+                    # Too few positions to ever be measured
+                    self.stats['stationary_ignored'] += 1
+                    self.finish_track(track, 'timeout')
                     tracks_to_remove.append(track_id)
             
-            elif (time.time() - track.start_time) > self.config.get('speed_settings.max_time_diff', 10):
-                if not track.speed_calculated:
-                    self.stats['stationary_ignored'] += 1
+            elif now - track.measured_at > max_time_diff:
+                # A measured track normally finishes when it leaves the view (the lost-track
+                # sweep); one that stays in view is finished max_time_diff after its measurement
+                self.finish_track(track, 'timeout')
                 tracks_to_remove.append(track_id)
         
         for track_id in tracks_to_remove:
             if track_id in self.tracks:
                 del self.tracks[track_id]
     
-    def log_vehicle_detection(self, track, frame):
+    def finish_track(self, track, reason):
+        """Classify a measured track once from its best crop, close anything else"""
+        if track.speed_calculated:
+            self.submit_classification(track)
+        else:
+            self.close_track(track, reason)
+    
+    def submit_classification(self, track):
+        """Hand a finished, measured track to the async classification stage.
+        
+        The track's best crop is the only image handed over, so the frame loop
+        continues immediately. Beyond detection_settings.max_pending_classifications
+        the track is completed without YOLO instead of growing the backlog.
+        """
+        if track.classifying or track.closed:
+            return
+        crop = track.vehicle_crop()
+        max_pending = self.config.get('detection_settings.max_pending_classifications', 16)
+        
+        # In full-frame mode the labels cached from periodic passes replace the per-track call
+        cached = None
+        if self.config.get('detection_settings.classification_mode', 'crop') == 'full_frame':
+            cached = track.cached_detections()
+            if not cached and self.config.get('detection_settings.full_frame_fallback_to_crop', False):
+                cached = None
+        
+        # The same vehicle again within seconds (stop-and-go, fragmented track) reuses its result
+        fingerprint = None
+        if cached is None and crop is not None and crop.size and self.classification_cache.enabled:
+            fingerprint = appearance_fingerprint(crop)
+            cached = self.classification_cache.lookup(fingerprint, crop.shape[1], crop.shape[0])
+        
+        # Obvious cases (by size, speed and shape) skip YOLO unless it has to confirm them
+        cascade_label = None
+        if cached is None and self.cascade.enabled:
+            decision = self.cascade.classify(track.features())
+            if decision is not None:
+                if self.cascade.needs_yolo(decision[0]):
+                    cascade_label = decision[0]
+                else:
+                    self.cascade.record_skip()
+                    cached = [decision]
+        
+        with self.stats_lock:
+            stats = self.classification_stats
+            backlog_full = cached is None and (stats['pending'] >= max_pending or self.classifier.busy)
+            stats['pending'] += 1
+            stats['max_pending'] = max(stats['max_pending'], stats['pending'])
+            if cached is not None:
+                stats['cached'] += 1
+            elif backlog_full:
+                stats['skipped'] += 1
+            else:
+                stats['submitted'] += 1
+        
+        if backlog_full:
+            print(f"⚠️ Classification backlog full ({max_pending}) - logging track {track.track_id} without YOLO")
+        
+        # Batched across every track submitted within the classifier's wait window
+        future = None if backlog_full or cached is not None else self.classifier.submit(crop)
+        track.classifying = True
+        self.executor.submit(self.finish_classification, track, crop, future, time.time(),
+                             cached, cascade_label, fingerprint)
+    
+    def finish_classification(self, track, crop, future, submitted, cached=None, cascade_label=None, fingerprint=None):
+        try:
+            if cached is not None:
+                object_type, confidence = self.interpret_detections(cached)
+            elif future is None:
+                object_type, confidence = "vehicle", 0.5
+            else:
+                detected_objects = future.result()
+                object_type, confidence = self.interpret_detections(detected_objects)
+                if fingerprint is not None:
+                    self.classification_cache.store(fingerprint, crop.shape[1], crop.shape[0], detected_objects)
+                if cascade_label is not None:
+                    self.cascade.record_agreement(cascade_label, object_type)
+        except InferenceBusy as e:
+            print(f"⚠️ {e} - logging track {track.track_id} without YOLO")
+            object_type, confidence = "vehicle", 0.5
+        except Exception as e:
+            print(f"⚠️ YOLO Classification error: {e}")
+            object_type, confidence = "vehicle", 0.3
+        
+        try:
+            object_color = self.color_detector.detect_color(crop)
+            self.complete_detection(track, object_type, object_color, confidence)
+        except Exception as e:
+            print(f"⚠️ Detection completion error for track {track.track_id}: {e}")
+        finally:
+            track.classifying = False
+            with self.stats_lock:
+                self.classification_stats['pending'] -= 1
+                self.classification_stats['completed'] += 1
+                self.classification_stats['total_latency_ms'] += (time.time() - submitted) * 1000
+    
+    def get_classification_stats(self):
+        with self.stats_lock:
+            stats = dict(self.classification_stats)
+        total_latency_ms = stats.pop('total_latency_ms')
+        stats['avg_latency_ms'] = round(total_latency_ms / max(1, stats['completed']), 1)
+        return stats
+    
+    def complete_detection(self, track, object_type, object_color, confidence):
+        """Apply classification to a measured track and log it if it passes validation"""
+        track_id = track.track_id
+        track.vehicle_type = object_type
+        track.vehicle_color = object_color
+        track.confidence = confidence
+        self.events.publish(Classified(track_id, time.time(), object_type, object_color, confidence))
+        
+        # Log moving vehicle - ADD DEBUG INFO
+        print(f"🔍 Track {track_id}: speed_calc={track.speed_calculated}, track_len={abs(track.current_x - track.start_x):.1f}px, crossed={track.crossed_line}, direction={track.direction}")
+        
+        # Check if YOLO validation is required
+        ignore_yolo_validation = self.config.get('vehicle_settings.ignore_yolo_validation', False)
+        
+        if ignore_yolo_validation:
+            # Log all moving objects regardless of YOLO validation
+            # Objects not in vehicle classes are categorized as "other"
+            print(f"✅ LOGGING ALL MOVING OBJECTS: {track.direction} {track.vehicle_color} {track.vehicle_type}")
+            should_log = True
+        else:
+            # Use YOLO validation
+            require_yolo_validation = self.config.get('detection_settings.require_yolo_validation', True)
+            accept_generic_vehicle = self.config.get('detection_settings.accept_generic_vehicle', True)
+            vehicle_classes = self.config.get('vehicle_settings.vehicle_classes', [])
+            
+            should_log = True
+            if require_yolo_validation:
+                # Check if object is in our vehicle classes OR is generic "vehicle" (if enabled)
+                valid_object = object_type in vehicle_classes
+                if not valid_object and accept_generic_vehicle and object_type == 'vehicle':
+                    valid_object = True
+                
+                should_log = valid_object and confidence > 0.3
+                if not should_log:
+                    print(f"❌ NOT LOGGING: YOLO validation failed - {object_type} (conf: {confidence:.2f}) not in vehicle classes or confidence too low")
+                else:
+                    print(f"✅ YOLO VALIDATED: {track.direction} {track.vehicle_color} {track.vehicle_type} (conf: {confidence:.2f})")
+            else:
+                print(f"✅ LOGGING WITHOUT YOLO VALIDATION: {track.direction} {track.vehicle_color} {track.vehicle_type}")
+        
+        image_file = ''
+        if should_log:
+            image_file = self.log_vehicle_detection(track)
+            with self.stats_lock:
+                self.stats['moving_logged'] += 1
+                self.counting_lines.record_speed(track)
+                
+                if track.direction == 'L2R':
+                    self.stats['l2r_count'] += 1
+                elif track.direction == 'R2L':
+                    self.stats['r2l_count'] += 1
+        
+        self.close_track(track, 'logged' if should_log else 'rejected', image_file)
+    
+    def close_track(self, track, reason, image_file=''):
+        if track.closed:
+            return
+        track.closed = True
+        self.events.publish(TrackClosed(track.track_id, time.time(), reason, reason == 'logged', image_file))
+    
+    def subscribe(self, name, event_types=None, maxsize=256):
+        """Bounded, non-blocking queue of track events (see EventBus)"""
+        return self.events.subscribe(name, event_types, maxsize)
+    
+    def unsubscribe(self, subscription):
+        self.events.unsubscribe(subscription)
+    
+    def log_vehicle_detection(self, track):
         print(f"🔍 log_vehicle_detection called for track {track.track_id}")
-        timestamp = datetime.now()
+        # Logged when the track finishes, seconds after the vehicle was measured; record when it was
+        timestamp = datetime.fromtimestamp(track.measured_at) if track.measured_at else datetime.now()
         speed_mph = self.config.get('speed_settings.speed_mph', False)
         speed_display = track.speed_mph if speed_mph else track.speed_kmh
         speed_unit = "mph" if speed_mph else "km/h"
         
         image_filename = ""
         
-        # Check if image saving is enabled
-        save_images = self.config.get('output_settings.save_images', True)
-        if save_images:
-            # Save image (fix filename for Windows compatibility)
-            speed_str = f"{speed_display:.1f}".replace(".", "_")
-            unit_str = speed_unit.replace("/", "_per_")  # km/h -> km_per_h
-            image_filename = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{track.direction}_{track.vehicle_color}_{track.vehicle_type}_{speed_str}{unit_str}.jpg"
-            image_path = os.path.join(self.output_dir, image_filename)
-            
-            # Draw annotations on image
-            annotated = frame.copy()
-            x = int(track.current_x - track.width/2)
-            y = int(track.current_y - track.height/2)
-            w = int(track.width)
-            h = int(track.height)
-            
-            # Vehicle bounding box
-            cv2.rectangle(annotated, (x, y), (x + w, y + h), (0, 255, 0), 3)
-            
-            # Speed text
-            cv2.putText(annotated, f"{speed_display:.1f} {speed_unit}", 
-                       (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 0), 3)
-            
-            # Object info
-            info_text = f"{track.direction} {track.vehicle_color} {track.vehicle_type}"
-            cv2.putText(annotated, info_text, (x, y + h + 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-            
-            # GPU info
-            if self.use_gpu:
-                gpu_text = f"GPU: {torch.cuda.get_device_name(0)}"
-                cv2.putText(annotated, gpu_text, (10, frame.shape[0] - 10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
-            
-            # Save image with configurable quality
-            try:
-                image_quality = self.config.get('output_settings.image_quality', 95)
-                success = cv2.imwrite(image_path, annotated, [cv2.IMWRITE_JPEG_QUALITY, image_quality])
-                if success:
-                    print(f"✅ Image saved: {image_filename}")
-                else:
-                    print(f"❌ Failed to save image: {image_filename}")
-            except Exception as e:
-                print(f"❌ Error saving image {image_filename}: {e}")
-        
         # Log to CSV with correct column order to match headers
         row = [
             timestamp.isoformat(),
@@ -775,15 +1610,59 @@ class SpeedCamera:
             round(track.speed_mph, 1),
             round(track.confidence, 2),
             image_filename,  # Will be empty string if save_images is False
-            False  # removed column - default to False for new entries
+            False,  # removed column - default to False for new entries
+            ''  # clip_file column - set below when a clip is being recorded
         ]
         
-        with open(self.csv_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
+        # Check if image saving is enabled
+        save_images = self.config.get('output_settings.save_images', True)
+        if save_images and track.best_crop is not None:
+            # Save image (fix filename for Windows compatibility)
+            speed_str = f"{speed_display:.1f}".replace(".", "_")
+            unit_str = speed_unit.replace("/", "_per_")  # km/h -> km_per_h
+            image_filename = f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{track.direction}_{track.vehicle_color}_{track.vehicle_type}_{speed_str}{unit_str}.jpg"
+            
+            # Pre/post-roll video is cut from the clip recorder's ring once the post-roll is in.
+            # The row is stored without waiting for it; the web app links the clip once it exists
+            if self.clip_recorder.request(self.output_dir, clip_filename(image_filename), track.measured_at):
+                row[9] = clip_filename(image_filename)
+            
+            def image_done(success, row=row, image_filename=image_filename):
+                # The row only references the image once it is safely on disk
+                row[7] = image_filename if success else ""
+                self.append_detection_row(row)
+            
+            # The whole scene at the best view, or just the padded crop with image_view 'crop'
+            if track.best_frame is not None:
+                image, box = track.best_frame, track.best_frame_box
+            else:
+                image, box = track.best_crop, track.best_crop_box
+            
+            # Annotation, encoding and fsync happen on the writer pool; the track's
+            # best view is no longer modified, so it is handed over without a copy
+            self.image_writer.submit(ImageJob(
+                output_dir=self.output_dir,
+                filename=image_filename,
+                image=image,
+                box=box,
+                speed_text=f"{speed_display:.1f} {speed_unit}",
+                info_text=f"{track.direction} {track.vehicle_color} {track.vehicle_type}",
+                footer_text=f"GPU: {self.gpu_name}" if self.use_gpu else '',
+                quality=self.config.get('output_settings.image_quality', 95),
+                on_done=image_done))
+        else:
+            self.append_detection_row(row)
         
         print(f"🎯 {timestamp.strftime('%H:%M:%S')} | {track.direction} | "
               f"{track.vehicle_color} {track.vehicle_type} | {speed_display:.1f} {speed_unit} | GPU: {self.use_gpu}")
+        
+        return image_filename
+    
+    def append_detection_row(self, row):
+        # Detections complete on classification and image writer threads; the
+        # CSV writer batches their rows into group commits
+        self.detection_store.append(row)
+        live_counters.add('detections')
     
     def draw_overlay(self, frame):
         overlay = frame.copy()
@@ -793,8 +1672,6 @@ class SpeedCamera:
         crop_y_lower = self.config.get('detection_zones.detection_area_bottom', 590)
         crop_x_left = self.config.get('detection_zones.detection_area_left', 100)
         crop_x_right = self.config.get('detection_zones.detection_area_right', 1820)
-        l2r_line_x = self.config.get('detection_zones.l2r_line_x', 400)
-        r2l_line_x = self.config.get('detection_zones.r2l_line_x', 1400)
         
         # Draw detection area
         cv2.rectangle(overlay, 
@@ -802,12 +1679,13 @@ class SpeedCamera:
                      (crop_x_right, crop_y_lower),
                      (255, 255, 0), 2)
         
-        # Draw tracking lines
-        cv2.line(overlay, (l2r_line_x, crop_y_upper), (l2r_line_x, crop_y_lower), (0, 255, 255), 3)
-        cv2.line(overlay, (r2l_line_x, crop_y_upper), (r2l_line_x, crop_y_lower), (255, 0, 255), 3)
-        
-        cv2.putText(overlay, "L2R", (l2r_line_x + 5, crop_y_upper + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-        cv2.putText(overlay, "R2L", (r2l_line_x + 5, crop_y_upper + 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 255), 2)
+        # Draw counting lines
+        for line in self.counting_lines.lines:
+            points = np.array(line.points, dtype=np.int32).reshape(-1, 1, 2)
+            cv2.polylines(overlay, [points], False, line.color, 3)
+            label_x, label_y = line.points[0]
+            cv2.putText(overlay, f"{line.name}: {line.count}", (label_x + 5, label_y + 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, line.color, 2)
         
         # Draw current tracks
         for track in self.tracks.values():
@@ -828,6 +1706,11 @@ class SpeedCamera:
         buffer_text = f"Frames: {buffer_stats['total_frames']} | Errors: {buffer_stats['error_count']} | Error Rate: {buffer_stats['error_rate']:.1f}%"
         cv2.putText(overlay, buffer_text, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
         
+        # Async classification backlog
+        classify_stats = self.get_classification_stats()
+        classify_text = f"Classify queue: {classify_stats['pending']} | Avg latency: {classify_stats['avg_latency_ms']:.0f} ms | Skipped: {classify_stats['skipped']}"
+        cv2.putText(overlay, classify_text, (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        
         return overlay
     
     def process_frame(self, frame):
@@ -849,68 +1732,90 @@ class SpeedCamera:
         return None
     
     def stop(self):
+        """Ask process_stream to finish; its finally block classifies the remaining
+        tracks and then stops the executor, writers and classifier in order"""
         print("🛑 Stopping speed camera...")
         self.running = False
         if hasattr(self, 'rtsp_decoder'):
             self.rtsp_decoder.stop()
-        if hasattr(self, 'executor'):
-            self.executor.shutdown(wait=True)
-        if self.use_gpu:
-            torch.cuda.empty_cache()
-        print("✅ Speed camera stopped")
     
     def process_stream(self):
         print("🚀 Starting GPU-accelerated processing...")
+        resource_governor.apply_thread('motion')
         
         # Start RTSP decoder
         self.rtsp_decoder.start()
         
-        # Wait for first frame
-        print("⏳ Waiting for first frame...")
-        frame = None
-        for _ in range(50):  # Wait up to 5 seconds
-            frame = self.frame_buffer.get(timeout=0.1)
-            if frame is not None:
-                break
-        
-        if frame is None:
-            print("❌ No frames received!")
-            return
-        
-        print("✅ First frame received! Starting detection...")
-        print("🟡 Yellow line: L2R | 🟣 Magenta line: R2L")
-        
-        # Check logging mode
-        ignore_yolo_validation = self.config.get('vehicle_settings.ignore_yolo_validation', False)
-        if ignore_yolo_validation:
-            print("📊 ALL moving objects will be logged (unknown objects categorized as 'unknown')")
-        else:
-            print("📊 Only moving objects (vehicles/pedestrians/bicycles) will be logged")
-        
-        print("🚀 GPU acceleration enabled" if self.use_gpu else "💻 CPU processing")
-        
+        # Everything after the decoder starts is torn down by the finally block,
+        # including when no frame arrives
         try:
+            # Wait for first frame
+            print("⏳ Waiting for first frame...")
+            frame = None
+            for _ in range(50):  # Wait up to 5 seconds
+                frame = self.frame_buffer.get(timeout=0.1)
+                if frame is not None:
+                    break
+            
+            if frame is None:
+                print("❌ No frames received!")
+                return
+            
+            print("✅ First frame received! Starting detection...")
+            
+            # The clip ring opens its own camera connection, so only once the camera is known to work
+            self.clip_recorder.start()
+            print("🟡 Yellow line: L2R | 🟣 Magenta line: R2L")
+            
+            # Check logging mode
+            ignore_yolo_validation = self.config.get('vehicle_settings.ignore_yolo_validation', False)
+            if ignore_yolo_validation:
+                print("📊 ALL moving objects will be logged (unknown objects categorized as 'unknown')")
+            else:
+                print("📊 Only moving objects (vehicles/pedestrians/bicycles) will be logged")
+            
+            print("🚀 GPU acceleration enabled" if self.use_gpu else "💻 CPU processing")
+            
             while self.running:
                 frame = self.frame_buffer.get(timeout=1.0)
                 if frame is None:
                     continue
                 
+                # Frames beyond the analysis rate are dropped before any work is done on them
+                timestamp = time.time()
+                analysis_fps = self.config.get('detection_settings.analysis_fps', 0)
+                if analysis_fps and timestamp - self.last_analysis < 1.0 / analysis_fps:
+                    continue
+                self.last_analysis = timestamp
+                
                 self.frame_count += 1
                 self.stats['frames_processed'] += 1
-                timestamp = time.time()
+                live_counters.add('frames')
+                self.collect_frame_sample(frame)
                 
                 # GPU memory management
                 if self.use_gpu and self.frame_count % 100 == 0:
                     torch.cuda.empty_cache()
                 
+                # Pick up calibration edits made from the web interface
+                self.calibration.refresh()
+                
                 # Detect motion with GPU acceleration
                 detections = self.detect_motion(frame)
                 
                 # Update tracks
-                self.update_tracks(detections, timestamp)
+                self.update_tracks(detections, timestamp, frame)
+                
+                if self.config.get('detection_settings.classification_mode', 'crop') == 'full_frame':
+                    self.update_full_frame_detection(frame, timestamp)
+                
+                # Test all track movements against all counting lines at once
+                self.counting_lines.refresh()
+                for track, line, direction in self.counting_lines.detect_crossings(self.tracks.values(), timestamp):
+                    self.events.publish(LineCrossed(track.track_id, timestamp, line.name, direction))
                 
                 # Process for speed
-                self.process_tracks(frame)
+                self.process_tracks()
                 
                 # Store latest frame for web streaming
                 self.latest_frame = self.draw_overlay(frame.copy())
@@ -919,7 +1824,9 @@ class SpeedCamera:
                 if self.frame_count % 1000 == 0:
                     print(f"📊 Processed {self.frame_count} frames | "
                           f"Error rate: {self.frame_buffer.get_stats()['error_rate']:.1f}% | "
-                          f"Moving objects: {self.stats['moving_logged']}")
+                          f"Moving objects: {self.stats['moving_logged']} | "
+                          f"Stitched: {self.stats['tracks_stitched']} | "
+                          f"Classify backlog: {self.classification_stats['pending']}")
                 
                 time.sleep(0.01)  # Small delay to prevent CPU overload
                 
@@ -927,7 +1834,15 @@ class SpeedCamera:
             print("\n🛑 Stopping...")
         finally:
             self.rtsp_decoder.stop()
+            
+            # Measured vehicles still in view are classified before the workers stop
+            for track in list(self.tracks.values()) + list(self.lost_tracks.values()):
+                self.finish_track(track, 'stopped')
             self.executor.shutdown(wait=True)
+            self.image_writer.stop()
+            self.clip_recorder.stop()
+            self.detection_store.flush()
+            self.classifier.stop()
             
             if self.use_gpu:
                 torch.cuda.empty_cache()
@@ -936,7 +1851,11 @@ class SpeedCamera:
             print(f"   Frames processed: {self.stats['frames_processed']}")
             print(f"   Moving objects logged: {self.stats['moving_logged']}")
             print(f"   Stationary ignored: {self.stats['stationary_ignored']}")
+            print(f"   Tracks stitched: {self.stats['tracks_stitched']}")
             print(f"   L2R: {self.stats['l2r_count']} | R2L: {self.stats['r2l_count']}")
+            for line_stats in self.counting_lines.get_stats():
+                print(f"   Line {line_stats['name']}: {line_stats['crossings']} crossings | "
+                      f"{line_stats['measured']} measured | avg {line_stats['avg_speed_kmh']} km/h")
             
             buffer_stats = self.frame_buffer.get_stats()
             print(f"   Total frames: {buffer_stats['total_frames']}")
@@ -8,9 +8,14 @@ import os
 import cv2
 import logging
 import subprocess
-import glob
 from datetime import datetime, timedelta
 from speed_camera import SpeedCamera
+from inference import model_registry
+from resource_governor import resource_governor
+from autotune import autotuner, tune_from_stream
+from detection_output import ensure_rendition, image_index, image_path, image_relpath, remove_image
+from detection_store import open_detection_store
+from live_counters import live_counters
 from config_manager import config_manager
 import io
 import base64
@@ -18,7 +23,6 @@ from collections import deque
 import csv
 from io import StringIO
 import numpy as np
-import psutil
 
 app = Flask(__name__)
 
@@ -29,6 +33,7 @@ running = False
 console_logs = []
 console_lock = threading.Lock()
 system_logs = deque(maxlen=500)
+recent_events = deque(maxlen=500)
 
 # Create required directories
 os.makedirs('detections', exist_ok=True)  # Only create detections folder
@@ -39,6 +44,9 @@ startup_time = time.time()
 class WebConsoleHandler(logging.Handler):
     def emit(self, record):
         try:
+            if record.levelno >= logging.ERROR:
+                live_counters.add('errors')
+            
             # Always filter out HTTP requests (too noisy)
             if any(skip in record.getMessage() for skip in [
                 'GET /api/', 'POST /api/', '200 -', '404 -', 
@@ -80,6 +88,9 @@ root_logger.addHandler(web_handler)
 # Also capture print statements from speed camera and other modules
 import sys
 
+# Vehicles turned away by validation: printed as errors but not counted as ones
+REJECTION_MARKERS = (': Failed - ', 'NOT LOGGING:')
+
 class PrintCapture:
     def __init__(self, stream_name='stdout'):
         self.terminal = sys.stdout if stream_name == 'stdout' else sys.stderr
@@ -92,6 +103,8 @@ class PrintCapture:
             level = 'INFO'
             if any(keyword in message for keyword in ['ERROR', 'Error', 'Failed', 'failed']):
                 level = 'ERROR'
+                if not any(marker in message for marker in REJECTION_MARKERS):
+                    live_counters.add('errors')
             elif any(keyword in message for keyword in ['WARNING', 'Warning']):
                 level = 'WARNING'
             elif any(keyword in message for keyword in ['DEBUG', 'Debug']):
@@ -142,6 +155,19 @@ sys.stderr = StderrCapture()
 
 
 
+def start_event_consumer(camera):
+    """Mirror the camera's track events into recent_events for /api/events"""
+    subscription = camera.subscribe('web', maxsize=512)
+    
+    def consume():
+        while speed_camera is camera:
+            event = subscription.get(timeout=1.0)
+            if event is not None:
+                recent_events.append(event.to_dict())
+        camera.unsubscribe(subscription)
+    
+    threading.Thread(target=consume, daemon=True).start()
+
 @app.route('/')
 def dashboard():
     return send_from_directory('frontend', 'index.html')
@@ -206,19 +232,16 @@ def get_status():
         'images_size': "0 MB"
     }
     
+    # Running totals kept by the writers and deleters (and reconciled in the background),
+    # so polling this never reads the disk
+    counters = live_counters.snapshot()
+    status['counters'] = counters
+    status['violations_count'] = counters['detections']
+    
     # Get system stats
     try:
-        status['memory_usage'] = psutil.virtual_memory().percent
-        
-        # Calculate total size of saved images instead of disk usage
-        detections_dir = 'detections'
-        total_size = 0
-        if os.path.exists(detections_dir):
-            for filename in os.listdir(detections_dir):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    file_path = os.path.join(detections_dir, filename)
-                    if os.path.isfile(file_path):
-                        total_size += os.path.getsize(file_path)
+        status['memory_usage'] = counters['memory_percent']
+        total_size = counters['image_bytes']
         
         # Convert to MB or GB
         if total_size > 1024 * 1024 * 1024:  # > 1GB
@@ -250,20 +273,25 @@ def get_status():
     
     # Get speed camera stats if available
     if speed_camera and hasattr(speed_camera, 'stats'):
-        status['violations_count'] = speed_camera.stats.get('moving_logged', 0)
         status['frames_processed'] = speed_camera.stats.get('frames_processed', 0)
+        status['tracks_stitched'] = speed_camera.stats.get('tracks_stitched', 0)
+        if hasattr(speed_camera, 'classifier'):
+            status['classifier'] = speed_camera.classifier.get_stats()
+        if hasattr(speed_camera, 'classification_stats'):
+            status['classification'] = speed_camera.get_classification_stats()
+        if hasattr(speed_camera, 'full_frame_stats'):
+            status['full_frame'] = dict(speed_camera.full_frame_stats)
+        if hasattr(speed_camera, 'cascade'):
+            status['cascade'] = speed_camera.cascade.get_stats()
+        if hasattr(speed_camera, 'classification_cache'):
+            status['classification_cache'] = speed_camera.classification_cache.get_stats()
+        if hasattr(speed_camera, 'image_writer'):
+            status['image_writer'] = speed_camera.image_writer.get_stats()
+        if hasattr(speed_camera, 'clip_recorder'):
+            status['clip_recorder'] = speed_camera.clip_recorder.get_stats()
     
-    # Check if CSV file exists and count detections
-    csv_file = 'object_detections.csv'
-    csv_path = os.path.join('detections', csv_file)
-    if os.path.exists(csv_path):
-        try:
-            with open(csv_path, 'r') as f:
-                lines = f.readlines()
-                # Skip header line
-                status['violations_count'] = max(len(lines) - 1, 0) if len(lines) > 1 else 0
-        except:
-            pass
+    if speed_camera and hasattr(speed_camera, 'counting_lines'):
+        status['counting_lines'] = speed_camera.counting_lines.get_stats()
     
     return jsonify(status)
 
@@ -277,6 +305,7 @@ def start_camera():
     try:
         # Create new speed camera instance
         speed_camera = SpeedCamera()
+        start_event_consumer(speed_camera)
         running = True
         
         def run_camera():
@@ -316,6 +345,17 @@ def stop_camera():
         logging.error(f"Failed to stop camera: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+DETECTION_TIME_FILTERS = {
+    '1h': timedelta(hours=1),
+    '3h': timedelta(hours=3),
+    '1d': timedelta(days=1),
+    '1w': timedelta(weeks=1)
+}
+
+def detection_store():
+    """The configured detection store (CSV or SQLite), shared with the camera"""
+    return open_detection_store(config_manager)
+
 @app.route('/api/detections')
 def get_detections():
     try:
@@ -326,76 +366,46 @@ def get_detections():
         violations_only = request.args.get('violations_only', 'false').lower() == 'true'
         type_filter = request.args.get('type', None)
         
-        detections = []
-        csv_file = 'detections/object_detections.csv'
-        
         # Get speed limit from config for violation filtering
         speed_limit = config_manager.get('speed_settings.speed_limit_kmh', 50)
         
-        if os.path.exists(csv_file):
-            with open(csv_file, 'r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    try:
-                        # Skip removed entries
-                        is_removed = row.get('removed', 'False').lower() == 'true'
-                        if is_removed:
-                            continue
-                        
-                        # Parse timestamp
-                        timestamp = datetime.fromisoformat(row['timestamp'].replace('Z', '+00:00'))
-                        
-                        # Apply time filter
-                        now = datetime.now()
-                        if time_filter == '1h' and (now - timestamp).total_seconds() > 3600:
-                            continue
-                        elif time_filter == '3h' and (now - timestamp).total_seconds() > 10800:
-                            continue
-                        elif time_filter == '1d' and (now - timestamp).total_seconds() > 86400:
-                            continue
-                        elif time_filter == '1w' and (now - timestamp).total_seconds() > 604800:
-                            continue
-                        
-                        speed_kmh = float(row.get('speed_kmh', 0))
-                        is_violation = speed_kmh > speed_limit
-                        
-                        detection = {
-                            'timestamp': row['timestamp'],
-                            'direction': row.get('direction', 'Unknown'),
-                            'speed_kmh': speed_kmh,
-                            'speed_mph': float(row.get('speed_mph', 0)),
-                            'object_type': row.get('object_type', 'vehicle'),
-                            'object_color': row.get('object_color', 'unknown'),
-                            'confidence': float(row.get('confidence', 0)),
-                            'image_file': row.get('image_file', ''),
-                            'has_image': bool(row.get('image_file', '').strip()),
-                            'is_violation': is_violation,
-                            'speed_limit': speed_limit
-                        }
-                        
-                        # Apply violations filter if requested
-                        if violations_only and not is_violation:
-                            continue
-                        
-                        # Apply type filter if requested
-                        if type_filter and detection['object_type'] != type_filter:
-                            continue
-                            
-                        detections.append(detection)
-                    except (ValueError, KeyError) as e:
-                        continue
-        
-        # Sort by timestamp (newest first)
-        detections.sort(key=lambda x: x['timestamp'], reverse=True)
-        
-        # Apply limit
+        # Time, type and violation filters and the limit are applied by the store's query
+        since = None
+        if time_filter in DETECTION_TIME_FILTERS:
+            since = datetime.now() - DETECTION_TIME_FILTERS[time_filter]
+        limit_num = None
         if limit and limit != 'all':
             try:
                 limit_num = int(limit)
-                detections = detections[:limit_num]
             except ValueError:
                 pass
         
+        detections = []
+        rows = detection_store().query(since, type_filter, speed_limit if violations_only else None, limit_num)
+        for row in rows:
+            try:
+                speed_kmh = float(row.get('speed_kmh', 0))
+                image_file = (row.get('image_file') or '').strip()
+                clip_file = (row.get('clip_file') or '').strip()
+                detections.append({
+                    'timestamp': row['timestamp'],
+                    'direction': row.get('direction', 'Unknown'),
+                    'speed_kmh': speed_kmh,
+                    'speed_mph': float(row.get('speed_mph', 0)),
+                    'object_type': row.get('object_type', 'vehicle'),
+                    'object_color': row.get('object_color', 'unknown'),
+                    'confidence': float(row.get('confidence', 0)),
+                    'image_file': image_file,
+                    'has_image': bool(image_file),
+                    **image_urls(image_file),
+                    'clip_file': clip_file,
+                    **clip_urls(clip_file),
+                    'is_violation': speed_kmh > speed_limit,
+                    'speed_limit': speed_limit
+                })
+            except (ValueError, KeyError, TypeError):
+                continue
+        
         if format_type == 'csv':
             # Return CSV format
             if not detections:
@@ -493,6 +503,25 @@ def get_console():
 
 
 
+@app.route('/api/events')
+def get_events():
+    """Recent track lifecycle events (track_created, line_crossed, speed_measured, classified, track_closed)"""
+    try:
+        event_type = request.args.get('type', None)
+        limit = int(request.args.get('limit', '100'))
+        
+        events = list(recent_events)
+        if event_type:
+            events = [e for e in events if e['event'] == event_type]
+        events = events[-limit:]
+        
+        return jsonify({
+            'events': events,
+            'bus': speed_camera.events.get_stats() if speed_camera else None
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/system/info')
 def system_info():
     info = {
@@ -525,48 +554,119 @@ def system_info():
     except:
         pass
     
+    info['models'] = model_registry.get_stats()
+    info['resource_governor'] = resource_governor.get_info()
+    
     return jsonify(info)
 
+@app.route('/api/autotune', methods=['GET'])
+def get_autotune():
+    """Last auto-tune report and whether a run is in progress"""
+    return jsonify(autotuner.get_status())
+
+@app.route('/api/autotune', methods=['POST'])
+def run_autotune():
+    """Calibrate on the next frames of the running camera (or straight from the stream)"""
+    if autotuner.running:
+        return jsonify({'status': 'error', 'message': 'Auto-tune already running'}), 409
+    
+    data = request.get_json(silent=True) or {}
+    apply = data.get('apply', False)
+    count = int(data.get('frames', config_manager.get('autotune.frames', 20)))
+    camera = speed_camera if running else None
+    
+    def calibrate():
+        try:
+            if camera is None:
+                tune_from_stream(apply, count)
+                return
+            frames = camera.sample_frames(count)
+            report = autotuner.run(frames)
+            if apply and report['choice']:
+                autotuner.apply(report['choice'])
+                logging.info("Auto-tune settings saved; model changes apply after a restart")
+        except Exception as e:
+            logging.error(f"Auto-tune failed: {str(e)}")
+    
+    threading.Thread(target=calibrate, daemon=True, name='autotune').start()
+    return jsonify({'status': 'success', 'message': f'Auto-tune started on {count} frames'})
+
 @app.route('/images/<filename>')
 def serve_image(filename):
-    return send_from_directory('detections', filename)
+    # Stored under detections/YYYY/MM/DD, found from the date in the name
+    return send_from_directory('detections', os.path.relpath(image_path('detections', filename), 'detections'))
+
+@app.route('/clips/<filename>')
+def serve_clip(filename):
+    # Recorded next to the detection image
+    return send_from_directory('detections', image_relpath(filename))
+
+def image_urls(filename):
+    """Full image, thumbnail and preview URLs of a detection image (all empty without one)"""
+    if not filename:
+        return {'image_url': '', 'thumbnail_url': '', 'preview_url': ''}
+    return {
+        'image_url': f"/images/{filename}",
+        'thumbnail_url': f"/thumbs/{filename}",
+        'preview_url': f"/previews/{filename}"
+    }
+
+def clip_urls(filename):
+    """Clip URL of a detection, only once the clip has been written (it is cut after the post-roll)"""
+    if not filename or not os.path.isfile(image_path('detections', filename)):
+        return {'clip_url': ''}
+    return {'clip_url': f"/clips/{filename}"}
+
+def serve_rendition(kind, filename):
+    try:
+        path = ensure_rendition('detections', kind, filename)
+    except Exception as e:
+        logging.error(f"Error creating {kind} for {filename}: {e}")
+        path = None
+    if path is None:
+        # Fall back to the full image rather than a broken tile
+        return serve_image(filename)
+    return send_from_directory(os.path.join('detections', kind), image_relpath(filename), max_age=86400)
+
+@app.route('/thumbs/<filename>')
+def serve_thumbnail(filename):
+    return serve_rendition('thumbs', filename)
+
+@app.route('/previews/<filename>')
+def serve_preview(filename):
+    return serve_rendition('previews', filename)
 
 @app.route('/api/images')
 def get_images():
-    """Get all available images from detections folder"""
+    """Get available images from the detections folder, newest first (offset/limit page through them)"""
     images = []
+    index = image_index('detections')
     
     try:
-        output_dir = 'detections'
-        
-        if os.path.exists(output_dir):
-            # Get all image files
-            image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp']
-            for ext in image_extensions:
-                image_files = glob.glob(os.path.join(output_dir, ext))
-                for img_file in image_files:
-                    stat = os.stat(img_file)
-                    images.append({
-                        'filename': os.path.basename(img_file),
-                        'size': stat.st_size,
-                        'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        'path': f"/images/{os.path.basename(img_file)}"
-                    })
-            
-            # Sort by modification time (newest first)
-            images.sort(key=lambda x: x['modified'], reverse=True)
+        offset = max(0, request.args.get('offset', 0, type=int))
+        limit = request.args.get('limit', None, type=int)
+        
+        for image in index.page(offset, limit):
+            images.append({
+                'filename': image['filename'],
+                'size': image['size'],
+                'modified': datetime.fromtimestamp(image['modified']).isoformat(),
+                'path': f"/images/{image['filename']}",
+                **image_urls(image['filename'])
+            })
     
     except Exception as e:
         logging.error(f"Error getting images: {e}")
     
-    return jsonify(images)
+    response = jsonify(images)
+    response.headers['X-Total-Count'] = str(index.get_stats()['count'])
+    return response
 
 @app.route('/api/files/download/<filename>')
 def download_file(filename):
     """Download a file"""
     try:
-        detections_dir = 'detections'  # Use detections folder
-        file_path = os.path.join(detections_dir, filename)
+        file_path = image_path('detections', filename)
         
         if os.path.exists(file_path) and os.path.isfile(file_path):
             return send_file(file_path, as_attachment=True)
@@ -591,16 +691,17 @@ def cleanup_old_files():
         deleted_count = 0
         total_size = 0
         
-        for filename in os.listdir(detections_dir):
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                file_path = os.path.join(detections_dir, filename)
-                if os.path.getmtime(file_path) < cutoff_time:
-                    file_size = os.path.getsize(file_path)
-                    # Mark CSV entry as removed before deleting the file
-                    mark_csv_entry_as_removed(filename)
-                    os.remove(file_path)
-                    deleted_count += 1
-                    total_size += file_size
+        # The image index is kept oldest first, so this stops at the first image to keep
+        expired = image_index(detections_dir).older_than(cutoff_time)
+        
+        # Mark every CSV entry as removed (one tombstone write) before deleting the files
+        mark_csv_entries_as_removed(expired)
+        
+        for filename in expired:
+            file_size = remove_image(detections_dir, filename)
+            if file_size:
+                deleted_count += 1
+                total_size += file_size
         
         size_mb = total_size / (1024 * 1024)
         message = f"Cleaned up {deleted_count} old files, freed {size_mb:.1f} MB of space."
@@ -612,66 +713,31 @@ def cleanup_old_files():
         logging.error(error_msg)
         return jsonify({"status": "error", "message": error_msg})
 
-def mark_csv_entry_as_removed(image_filename):
-    """Mark a CSV entry as removed based on image filename"""
+def mark_csv_entries_as_removed(image_filenames):
+    """Mark the detections of a batch of images as removed"""
     try:
-        csv_file = 'detections/object_detections.csv'
-        if not os.path.exists(csv_file):
-            return False
-        
-        # Read all rows
-        rows = []
-        updated = False
-        
-        with open(csv_file, 'r', newline='') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            
-            # Add 'removed' column if it doesn't exist
-            if 'removed' not in fieldnames:
-                fieldnames = list(fieldnames) + ['removed']
-            
-            for row in reader:
-                # Add 'removed' column if missing
-                if 'removed' not in row:
-                    row['removed'] = 'False'
-                
-                # Mark as removed if this is the file being deleted
-                if row.get('image_file') == image_filename:
-                    row['removed'] = 'True'
-                    updated = True
-                
-                rows.append(row)
-        
-        # Write back to file if we made changes
-        if updated:
-            with open(csv_file, 'w', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
-            
-            logging.info(f"Marked CSV entry as removed for image: {image_filename}")
-            return True
-        
-        return False
+        removed = detection_store().mark_removed_many(image_filenames)
+        if removed:
+            logging.info(f"Marked {removed} CSV entries as removed")
+        return removed
         
     except Exception as e:
-        logging.error(f"Error marking CSV entry as removed: {e}")
-        return False
+        logging.error(f"Error marking CSV entries as removed: {e}")
+        return 0
 
 @app.route('/api/files/delete/<filename>', methods=['DELETE'])
 def delete_file(filename):
     """Delete a file and mark CSV entry as removed"""
     try:
         detections_dir = 'detections'  # Use detections folder
-        file_path = os.path.join(detections_dir, filename)
+        file_path = image_path(detections_dir, filename)
         
         if os.path.exists(file_path) and os.path.isfile(file_path):
             # Mark CSV entry as removed before deleting the file
-            mark_csv_entry_as_removed(filename)
+            mark_csv_entries_as_removed([filename])
             
-            # Delete the actual file
-            os.remove(file_path)
+            # Delete the actual file and its thumbnail/preview
+            remove_image(detections_dir, filename)
             
             return jsonify({'success': True, 'message': f'File {filename} deleted and marked as removed in CSV'})
         else:
@@ -751,7 +817,7 @@ def validate_config():
 
 @app.route('/api/analytics')
 def get_analytics():
-    """Get analytics data from CSV for charts with time filtering"""
+    """Get analytics data from the detection store for charts with time filtering"""
     # Get time filter parameter
     time_filter = request.args.get('time_filter', 'all')  # all, hour, 3hour, day, week
     
@@ -767,11 +833,6 @@ def get_analytics():
     }
     
     try:
-        csv_file = 'detections/object_detections.csv'  # Use detections folder
-        
-        if not os.path.exists(csv_file):
-            return jsonify({'status': 'error', 'message': 'Detections CSV file not found'}), 404
-        
         from collections import defaultdict
         
         speeds = []
@@ -791,82 +852,67 @@ def get_analytics():
         elif time_filter == 'week':
             cutoff_time = now - timedelta(weeks=1)
         
-        with open(csv_file, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    # Skip removed entries
-                    is_removed = row.get('removed', 'False').lower() == 'true'
-                    if is_removed:
-                        continue
-                    
-                    # Parse data
-                    speed = float(row.get('speed_kmh', 0))
-                    obj_type = row.get('object_type', 'unknown').lower()
-                    obj_color = row.get('object_color', 'unknown').lower()
-                    direction = row.get('direction', 'unknown')
-                    timestamp = row.get('timestamp', '')
-                    
-                    # Apply time filtering
-                    if cutoff_time and timestamp:
-                        try:
-                            row_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                            if row_time < cutoff_time:
-                                continue  # Skip this row
-                        except:
-                            continue  # Skip if timestamp parsing fails
-                    
-                    speeds.append(speed)
-                    all_timestamps.append(timestamp)
-                    
-                    # Store speed data with parsed timestamp for averaging
-                    if timestamp:
-                        try:
-                            row_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                            analytics['speed_over_time'].append({
-                                'timestamp': timestamp,
-                                'datetime': row_time,
-                                'speed': speed,
-                                'type': obj_type,
-                                'direction': direction
-                            })
-                        except:
-                            pass
-                    
-                    # Vehicle types
-                    if obj_type in analytics['vehicle_types']:
-                        analytics['vehicle_types'][obj_type] += 1
-                    else:
-                        analytics['vehicle_types'][obj_type] = 1
-                    
-                    # Vehicle colors
-                    if obj_color in analytics['vehicle_colors']:
-                        analytics['vehicle_colors'][obj_color] += 1
-                    else:
-                        analytics['vehicle_colors'][obj_color] = 1
-                    
-                    # Directions
-                    if direction in analytics['directions']:
-                        analytics['directions'][direction] += 1
-                    else:
-                        analytics['directions'][direction] = 1
-                    
-                    # Time-based activity tracking
-                    if timestamp:
-                        try:
-                            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                            hour = dt.hour
-                            hourly_counts[hour] += 1
-                            
-                            # For minute-level granularity
-                            minute_key = f"{hour:02d}:{dt.minute:02d}"
-                            minute_counts[minute_key] += 1
-                        except:
-                            pass
-                    
-                except Exception as e:
-                    logging.warning(f"Error processing row: {e}")
-                    continue
+        # Removed entries and rows before the cutoff are filtered out by the store's query
+        for row in detection_store().query(since=cutoff_time):
+            try:
+                # Parse data
+                speed = float(row.get('speed_kmh', 0))
+                obj_type = row.get('object_type', 'unknown').lower()
+                obj_color = row.get('object_color', 'unknown').lower()
+                direction = row.get('direction', 'unknown')
+                timestamp = row.get('timestamp', '')
+                
+                speeds.append(speed)
+                all_timestamps.append(timestamp)
+                
+                # Store speed data with parsed timestamp for averaging
+                if timestamp:
+                    try:
+                        row_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+                        analytics['speed_over_time'].append({
+                            'timestamp': timestamp,
+                            'datetime': row_time,
+                            'speed': speed,
+                            'type': obj_type,
+                            'direction': direction
+                        })
+                    except:
+                        pass
+                
+                # Vehicle types
+                if obj_type in analytics['vehicle_types']:
+                    analytics['vehicle_types'][obj_type] += 1
+                else:
+                    analytics['vehicle_types'][obj_type] = 1
+                
+                # Vehicle colors
+                if obj_color in analytics['vehicle_colors']:
+                    analytics['vehicle_colors'][obj_color] += 1
+                else:
+                    analytics['vehicle_colors'][obj_color] = 1
+                
+                # Directions
+                if direction in analytics['directions']:
+                    analytics['directions'][direction] += 1
+                else:
+                    analytics['directions'][direction] = 1
+                
+                # Time-based activity tracking
+                if timestamp:
+                    try:
+                        dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+                        hour = dt.hour
+                        hourly_counts[hour] += 1
+                        
+                        # For minute-level granularity
+                        minute_key = f"{hour:02d}:{dt.minute:02d}"
+                        minute_counts[minute_key] += 1
+                    except:
+                        pass
+            
+            except Exception as e:
+                logging.warning(f"Error processing row: {e}")
+                continue
         
         # Calculate average speeds over time intervals
         if analytics['speed_over_time']:
@@ -1077,6 +1123,19 @@ def get_analytics():
     
     return jsonify(analytics)
 
+@app.route('/api/archive')
+def get_archive():
+    """Per-partition summaries (rows, time range, speed stats) of the partitioned detection store"""
+    store = detection_store()
+    if not hasattr(store, 'get_partitions'):
+        return jsonify({'error': 'The detection store is not partitioned'}), 400
+    
+    time_filter = request.args.get('time_filter', 'all')
+    since = None
+    if time_filter in DETECTION_TIME_FILTERS:
+        since = datetime.now() - DETECTION_TIME_FILTERS[time_filter]
+    return jsonify({'partitions': store.get_partitions(since), 'stats': store.get_stats()})
+
 @app.route('/images/')
 def list_images():
     """List all images in detections directory"""
@@ -1085,19 +1144,22 @@ def list_images():
         if not os.path.exists(detections_dir):
             return "<h1>Detections folder not found</h1>"
         
-        files = []
-        for filename in os.listdir(detections_dir):
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                file_path = os.path.join(detections_dir, filename)
-                stat = os.stat(file_path)
-                files.append({
-                    'name': filename,
-                    'size': stat.st_size,
-                    'modified': datetime.fromtimestamp(stat.st_mtime)
-                })
-        
-        # Sort by modification time (newest first)
-        files.sort(key=lambda x: x['modified'], reverse=True)
+        # One page at a time from the image index (newest first)
+        per_page = 200
+        page = max(1, request.args.get('page', 1, type=int))
+        index = image_index(detections_dir)
+        total = index.get_stats()['count']
+        files = [{
+            'name': image['filename'],
+            'size': image['size'],
+            'modified': datetime.fromtimestamp(image['modified'])
+        } for image in index.page((page - 1) * per_page, per_page)]
+        
+        pages = []
+        if page > 1:
+            pages.append(f'<a href="/images/?page={page - 1}">&larr; Newer</a>')
+        if page * per_page < total:
+            pages.append(f'<a href="/images/?page={page + 1}">Older &rarr;</a>')
         
         # Generate HTML
         html = """
@@ -1120,9 +1182,12 @@ def list_images():
         <body>
             <div class="container">
                 <h1>🚗 Speed Camera Detections</h1>
-                <p>Total images: {}</p>
+        """
+        html += f"""
+                <p>Total images: {total} (page {page})</p>
+                <p>{' | '.join(pages)}</p>
                 <div class="file-grid">
-        """.format(len(files))
+        """
         
         for file in files:
             html += f"""
@@ -1336,10 +1401,29 @@ def download_model(model_name):
 
 if __name__ == '__main__':
     os.makedirs('detections', exist_ok=True)
+    # The first reconcile migrates flat images and builds the image index before
+    # the first request needs it; later ones rescan the folder and recount the store
+    def reconcile_images():
+        index = image_index('detections')
+        index.build(rescan=index.entries is not None)
+        stats = index.get_stats()
+        return {'images': stats['count'], 'image_bytes': stats['bytes']}
+    
+    live_counters.register('images', reconcile_images)
+    live_counters.register('detections', lambda: {'detections': detection_store().count()})
+    live_counters.start()
+    resource_governor.apply_startup()
+    
+    if config_manager.get('autotune.run_on_startup', False):
+        try:
+            tune_from_stream()
+        except Exception as e:
+            logging.error(f"Auto-tune failed: {str(e)}")
     
     try:
         logging.info("Initializing Speed Camera System")
         speed_camera = SpeedCamera()
+        start_event_consumer(speed_camera)
         
         def run_camera():
             global running
@@ -1371,4 +1455,6 @@ if __name__ == '__main__':
     
     time.sleep(0.5)
     
+    # Request threads are started from here and inherit the web stage's cores and nice level
+    resource_governor.apply_thread('web')
     app.run(host='0.0.0.0', port=5000, debug=False) 
\ No newline at end of file
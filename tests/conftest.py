@@ -0,0 +1,17 @@
+import os
+import sys
+import json
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_manager import ConfigManager
+
+@pytest.fixture
+def make_config(tmp_path):
+    """A real ConfigManager over a config.json written from a dict"""
+    def make(data=None):
+        path = tmp_path / 'config.json'
+        path.write_text(json.dumps(data or {}))
+        return ConfigManager(str(path))
+    return make
@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+from speed_camera import GroundPlaneCalibration
+
+POINTS = [
+    {'image': [600, 300], 'ground': [0, 0]},
+    {'image': [1300, 300], 'ground': [7, 0]},
+    {'image': [1700, 590], 'ground': [7, 20]},
+    {'image': [200, 590], 'ground': [0, 20]}
+]
+
+def make_calibration(make_config, mode='homography', points=POINTS):
+    return GroundPlaneCalibration(make_config({
+        'calibration_settings': {'mode': mode, 'homography_points': points},
+        'detection_zones': {'detection_area_top': 300, 'detection_area_bottom': 590,
+                            'detection_area_left': 100, 'detection_area_right': 1820}}))
+
+def project(calibration, points):
+    points = np.float32(points).reshape(-1, 1, 2)
+    return cv2.perspectiveTransform(points, calibration.homography).reshape(-1, 2)
+
+def test_lookup_table_matches_direct_projection(make_config):
+    calibration = make_calibration(make_config)
+    assert calibration.enabled
+    
+    rng = np.random.default_rng(0)
+    pixels = np.stack([rng.integers(100, 1820, 500), rng.integers(300, 590, 500)], axis=1)
+    expected = project(calibration, pixels)
+    np.testing.assert_allclose(calibration.to_ground_many(pixels), expected, rtol=1e-5, atol=1e-4)
+    for (x, y), ground in zip(pixels[:20], expected[:20]):
+        np.testing.assert_allclose(calibration.to_ground(x, y), ground, rtol=1e-5, atol=1e-4)
+    
+    # The calibration points themselves land on their ground positions
+    for point in POINTS:
+        x, y = point['image']
+        np.testing.assert_allclose(calibration.to_ground(min(x, 1819), min(y, 589)), point['ground'], atol=0.05)
+
+def test_ground_distance(make_config):
+    calibration = make_calibration(make_config)
+    start, end = (700, 320), (1500, 560)
+    expected = np.linalg.norm(np.subtract(*project(calibration, [end, start])))
+    assert abs(calibration.ground_distance(start, end) - expected) < 1e-3
+
+def test_points_outside_the_area_are_clamped(make_config):
+    calibration = make_calibration(make_config)
+    np.testing.assert_array_equal(calibration.to_ground(0, 0), calibration.to_ground(100, 300))
+    np.testing.assert_array_equal(calibration.to_ground(5000, 5000), calibration.to_ground(1819, 589))
+
+def test_scalar_mode_and_too_few_points_disable_it(make_config):
+    assert not make_calibration(make_config, mode='scalar').enabled
+    assert not make_calibration(make_config, points=POINTS[:3]).enabled
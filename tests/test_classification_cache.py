@@ -0,0 +1,46 @@
+import inference
+from inference import ClassificationCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def time(self):
+        return self.now
+
+def make_cache(make_config, monkeypatch, **settings):
+    clock = FakeClock()
+    monkeypatch.setattr(inference, 'time', clock)
+    config = make_config({'detection_settings': {'classification_cache': settings}})
+    return ClassificationCache(config), clock
+
+CAR = [('car', 0.9)]
+
+def test_similar_crop_hits_until_the_ttl(make_config, monkeypatch):
+    cache, clock = make_cache(make_config, monkeypatch, ttl_seconds=5)
+    cache.store(0b1011, 200, 100, CAR)
+    
+    # A few bits and a little size away still matches
+    assert cache.lookup(0b0011, 210, 95) == CAR
+    assert cache.lookup(0b1011 ^ 0xFFFF, 200, 100) is None
+    assert cache.lookup(0b1011, 300, 100) is None
+    
+    clock.now += 6
+    assert cache.lookup(0b1011, 200, 100) is None
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['expired'], stats['entries']) == (1, 3, 1, 0)
+
+def test_least_recently_used_entry_is_evicted(make_config, monkeypatch):
+    # Room for three entries without detections
+    entry_kb = ClassificationCache.ENTRY_BYTES / 1024
+    cache, _ = make_cache(make_config, monkeypatch, max_memory_kb=3 * entry_kb, max_hamming=2)
+    for fingerprint in (0x0, 0xFF, 0xFF00):
+        cache.store(fingerprint, 200, 100, [])
+    assert cache.lookup(0x0, 200, 100) == []
+    
+    cache.store(0xFF0000, 200, 100, [])
+    assert cache.lookup(0xFF, 200, 100) is None
+    assert cache.lookup(0x0, 200, 100) == []
+    assert cache.lookup(0xFF00, 200, 100) == []
+    assert cache.get_stats()['evictions'] == 1
+    assert cache.memory_bytes == 3 * ClassificationCache.ENTRY_BYTES
@@ -0,0 +1,47 @@
+from speed_camera import CountingLineSet, VehicleTrack
+
+def make_lines(make_config, *lines):
+    return CountingLineSet(make_config({'detection_zones': {'counting_lines': [
+        {'name': name, 'points': points, 'direction': direction} for name, points, direction in lines]}}))
+
+def crossings(lines, start, end):
+    """Labels of the crossings made by a track moving from start to end in one frame"""
+    track = VehicleTrack(1, start[0] - 10, start[1] - 10, 20, 20, 0.0)
+    track.update_position(end[0] - 10, end[1] - 10, 20, 20, 1.0)
+    return [(line.name, label) for _, line, label in lines.detect_crossings([track], 1.0)]
+
+def test_vertical_line(make_config):
+    lines = make_lines(make_config, ('gate', [(500, 0), (500, 1000)], 'any'))
+    assert crossings(lines, (480, 300), (520, 300)) == [('gate', 'L2R')]
+    assert crossings(lines, (520, 300), (480, 300)) == [('gate', 'R2L')]
+    assert crossings(lines, (400, 300), (480, 300)) == []
+
+def test_vertical_line_labels_ignore_the_step_shape(make_config):
+    # Mostly vertical jitter while crossing still counts by the side it came from
+    lines = make_lines(make_config, ('gate', [(500, 0), (500, 1000)], 'any'))
+    assert crossings(lines, (495, 300), (505, 360)) == [('gate', 'L2R')]
+
+def test_horizontal_line(make_config):
+    lines = make_lines(make_config, ('stop', [(0, 500), (1000, 500)], 'any'))
+    assert crossings(lines, (300, 480), (300, 520)) == [('stop', 'T2B')]
+    assert crossings(lines, (300, 520), (300, 480)) == [('stop', 'B2T')]
+
+def test_angled_line(make_config):
+    # y = 0.4x: crossing it is a top-to-bottom move even when the step is mostly sideways
+    lines = make_lines(make_config, ('ramp', [(0, 0), (1000, 400)], 'any'))
+    assert crossings(lines, (400, 150), (560, 240)) == [('ramp', 'T2B')]
+    assert crossings(lines, (560, 240), (400, 150)) == [('ramp', 'B2T')]
+
+def test_direction_filter_and_polyline(make_config):
+    lines = make_lines(make_config, ('bend', [(500, 0), (500, 400), (700, 800)], 'L2R'))
+    assert crossings(lines, (480, 200), (520, 200)) == [('bend', 'L2R')]
+    assert crossings(lines, (520, 200), (480, 200)) == []
+    # Second segment, steep enough to still be a left/right line
+    assert crossings(lines, (560, 600), (640, 600)) == [('bend', 'L2R')]
+    assert lines.lines[0].count == 2
+
+def test_legacy_lines(make_config):
+    lines = CountingLineSet(make_config({'detection_zones': {'l2r_line_x': 400, 'r2l_line_x': 1400}}))
+    assert crossings(lines, (380, 400), (420, 400)) == [('L2R', 'L2R')]
+    assert crossings(lines, (420, 400), (380, 400)) == []
+    assert crossings(lines, (1420, 400), (1380, 400)) == [('R2L', 'R2L')]
@@ -0,0 +1,47 @@
+import os
+from detection_output import DETECTION_CSV_HEADERS, DetectionLogWriter
+from detection_store import read_csv_rows
+
+def make_row(i):
+    return [f"2025-06-14T12:00:{i:02d}", 'car', 'red', 'L2R', 50.0 + i, 31.1, 0.9,
+            f"20250614_1200{i:02d}_L2R_red_car.jpg", False, '']
+
+def open_writer(path, make_config):
+    # A long flush interval leaves committing to the test
+    config = make_config({'output_settings': {'csv_flush_interval_ms': 60000, 'csv_max_batch': 1000}})
+    return DetectionLogWriter(str(path), config)
+
+def test_commit_and_reopen(tmp_path, make_config):
+    path = tmp_path / 'detections.csv'
+    log = open_writer(path, make_config)
+    for i in range(3):
+        log.append(make_row(i))
+    assert log.row_count == 0
+    assert log.commit() == 3
+    assert (log.row_count, log.offset) == (3, os.path.getsize(path))
+    log.append(make_row(3))
+    log.stop()
+    
+    reopened = open_writer(path, make_config)
+    assert (reopened.row_count, reopened.offset) == (4, os.path.getsize(path))
+    reopened.append(make_row(4))
+    reopened.commit()
+    reopened.stop()
+    
+    rows = read_csv_rows(str(path))
+    assert [row['image_file'] for row in rows] == [make_row(i)[7] for i in range(5)]
+    assert list(rows[0]) == DETECTION_CSV_HEADERS
+
+def test_readers_stop_at_the_committed_offset(tmp_path, make_config):
+    path = tmp_path / 'detections.csv'
+    log = open_writer(path, make_config)
+    log.append(make_row(0))
+    log.commit()
+    
+    # A row the writer has only partly written out
+    log.file.write('2025-06-14T12:00:01,car,bl')
+    log.file.flush()
+    
+    rows = read_csv_rows(str(path), log=log)
+    assert [row['image_file'] for row in rows] == [make_row(0)[7]]
+    log.stop()
@@ -0,0 +1,63 @@
+import csv
+import pytest
+import detection_store
+from detection_store import CSVDetectionStore, TombstoneLog, rewrite_removed
+
+def make_row(i):
+    return [f"2025-06-14T12:00:{i:02d}", 'car', 'red', 'L2R', 50.0 + i, 31.1, 0.9,
+            f"20250614_1200{i:02d}_L2R_red_car.jpg", False, '']
+
+def removed_column(path):
+    with open(path, newline='') as f:
+        return {row['image_file']: row['removed'] for row in csv.DictReader(f)}
+
+def test_removals_are_hidden_then_folded(tmp_path, make_config):
+    path = str(tmp_path / 'object_detections.csv')
+    store = CSVDetectionStore(path, make_config())
+    for i in range(4):
+        store.append(make_row(i))
+    store.flush()
+    
+    assert store.mark_removed_many([make_row(1)[7], make_row(2)[7]]) == 2
+    assert store.mark_removed_many([make_row(1)[7]]) == 0
+    assert [row['image_file'] for row in store.query()] == [make_row(3)[7], make_row(0)[7]]
+    # Nothing is rewritten until the fold
+    assert set(removed_column(path).values()) == {'False'}
+    
+    assert store.fold() == 2
+    assert len(store.tombstones) == 0
+    assert removed_column(path) == {make_row(0)[7]: 'False', make_row(1)[7]: 'True',
+                                    make_row(2)[7]: 'True', make_row(3)[7]: 'False'}
+    assert len(store.query()) == 2
+    
+    # Rows appended after the fold land after the rewritten ones
+    store.append(make_row(4))
+    store.flush()
+    assert len(store.query()) == 3
+    assert store.count() == 5
+
+def test_tombstones_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'tombstones.log')
+    log = TombstoneLog(path)
+    log.add(['a.jpg', 'b.jpg', 'a.jpg'])
+    log.discard(['a.jpg'])
+    assert TombstoneLog(path).snapshot() == {'b.jpg'}
+
+def test_failed_rewrite_leaves_the_log_intact(tmp_path, monkeypatch):
+    path = str(tmp_path / 'object_detections.csv')
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(detection_store.DETECTION_CSV_HEADERS)
+        writer.writerows(make_row(i) for i in range(3))
+    with open(path) as f:
+        before = f.read()
+    
+    def crash(self, rows):
+        raise OSError("disk full")
+    monkeypatch.setattr(csv.DictWriter, 'writerows', crash)
+    with pytest.raises(OSError):
+        rewrite_removed(path, {make_row(1)[7]})
+    
+    with open(path) as f:
+        assert f.read() == before
+    assert list(tmp_path.iterdir()) == [tmp_path / 'object_detections.csv']
@@ -0,0 +1,48 @@
+import numpy as np
+from speed_camera import VehicleTrack
+
+def test_direction_follows_movement_until_a_line_is_crossed(make_config):
+    track = VehicleTrack(1, 100, 100, 40, 40, 0.0, config=make_config())
+    track.update_position(60, 100, 40, 40, 0.1)
+    assert track.direction == 'R2L'
+    track.update_position(160, 100, 40, 40, 0.2)
+    assert track.direction == 'L2R'
+
+def test_direction_is_kept_after_a_crossing(make_config):
+    track = VehicleTrack(1, 100, 100, 40, 40, 0.0, config=make_config())
+    track.line_crossings['gate'] = (0.1, 'T2B')
+    track.direction = 'T2B'
+    
+    # Drifting sideways while driving down must not relabel the track
+    track.update_position(160, 180, 40, 40, 0.2)
+    track.update_position(40, 260, 40, 40, 0.3)
+    assert track.direction == 'T2B'
+
+def test_direction_is_kept_after_measurement(make_config):
+    track = VehicleTrack(1, 100, 100, 40, 40, 0.0, config=make_config())
+    track.direction = 'R2L'
+    track.speed_calculated = True
+    track.update_position(200, 100, 40, 40, 0.2)
+    assert track.direction == 'R2L'
+
+def consider_view(config):
+    frame = np.random.default_rng(0).integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    track = VehicleTrack(1, 800, 400, 200, 100, 0.0, config=config)
+    track.consider_crop(frame, 800, 400, 200, 100, (0, 0, 1920, 1080))
+    return track
+
+def test_saved_view_is_the_whole_frame_by_default(make_config):
+    track = consider_view(make_config())
+    assert track.best_frame.shape == (1080, 1920, 3)
+    assert track.best_frame_box == (800, 400, 200, 100)
+    assert track.best_crop.shape == (200, 400, 3)
+
+def test_saved_frame_can_be_shrunk(make_config):
+    track = consider_view(make_config({'output_settings': {'frame_image_max_width': 960}}))
+    assert track.best_frame.shape == (540, 960, 3)
+    assert track.best_frame_box == (400, 200, 100, 50)
+
+def test_crop_view_keeps_no_frame(make_config):
+    track = consider_view(make_config({'output_settings': {'image_view': 'crop'}}))
+    assert track.best_frame is None
+    assert track.best_crop is not None